@@ -11,6 +11,7 @@ from app.core.config import settings
 from app.core.database import Base
 from app.models.user import User # Import models so they are registered
 from app.models.email import Email
+from app.models.sync_checkpoint import SyncCheckpoint
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,29 @@
+"""add_body_fetched_to_email
+
+Revision ID: 4f2d8a91c3b7
+Revises: 9c1e4b7a2f60
+Create Date: 2026-10-18 11:40:03.552917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f2d8a91c3b7'
+down_revision: Union[str, Sequence[str], None] = '9c1e4b7a2f60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing rows were synced with format='full', so they already have their bodies
+    op.add_column('emails', sa.Column('body_fetched', sa.Boolean(), server_default=sa.true(), nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('emails', 'body_fetched')
@@ -0,0 +1,39 @@
+"""add_sync_checkpoints
+
+Revision ID: 7a61f0c2d8e5
+Revises: e3b7c5d9a104
+Create Date: 2026-10-18 16:21:09.604113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a61f0c2d8e5'
+down_revision: Union[str, Sequence[str], None] = 'e3b7c5d9a104'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('sync_checkpoints',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('folder', sa.String(), nullable=False),
+    sa.Column('q_filter', sa.String(), nullable=False),
+    sa.Column('page_token', sa.String(), nullable=True),
+    sa.Column('last_message_id', sa.String(), nullable=True),
+    sa.Column('history_id', sa.String(), nullable=True),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'folder')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('sync_checkpoints')
@@ -0,0 +1,28 @@
+"""add_gmail_history_id_to_user
+
+Revision ID: 9c1e4b7a2f60
+Revises: d6a7fa3d30c1
+Create Date: 2026-10-18 09:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c1e4b7a2f60'
+down_revision: Union[str, Sequence[str], None] = 'd6a7fa3d30c1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('gmail_history_id', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'gmail_history_id')
@@ -0,0 +1,31 @@
+"""add_llm_analyzed_to_email
+
+Revision ID: b8d4e2a6c019
+Revises: f1a9c3e7b5d2
+Create Date: 2026-10-18 21:05:12.481337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8d4e2a6c019'
+down_revision: Union[str, Sequence[str], None] = 'f1a9c3e7b5d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('emails', sa.Column('llm_analyzed', sa.Boolean(), server_default=sa.false(), nullable=False))
+    # Older processed rows cannot tell LLM verdicts from triage skips; only those with an
+    # event certainly came from the LLM (and can only make a sender look relevant)
+    op.execute("UPDATE emails SET llm_analyzed = true WHERE is_processed = true AND event_date IS NOT NULL")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('emails', 'llm_analyzed')
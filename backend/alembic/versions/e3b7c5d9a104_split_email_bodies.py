@@ -0,0 +1,106 @@
+"""split_email_bodies
+
+Revision ID: e3b7c5d9a104
+Revises: 4f2d8a91c3b7
+Create Date: 2026-10-18 15:02:47.118306
+
+"""
+import zlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3b7c5d9a104'
+down_revision: Union[str, Sequence[str], None] = '4f2d8a91c3b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+email_bodies = sa.table(
+    'email_bodies',
+    sa.column('email_id', sa.UUID()),
+    sa.column('body_text', sa.LargeBinary()),
+    sa.column('body_html', sa.LargeBinary()),
+)
+
+
+def _compress(text):
+    return zlib.compress(text.encode('utf-8'), 6) if text is not None else None
+
+
+def _decompress(data):
+    return zlib.decompress(data).decode('utf-8') if data is not None else None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('email_bodies',
+    sa.Column('email_id', sa.UUID(), nullable=False),
+    sa.Column('body_text', sa.LargeBinary(), nullable=True),
+    sa.Column('body_html', sa.LargeBinary(), nullable=True),
+    sa.ForeignKeyConstraint(['email_id'], ['emails.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('email_id')
+    )
+    # Already zlib-compressed: stop TOAST from trying pglz on top of it
+    op.execute("ALTER TABLE email_bodies ALTER COLUMN body_text SET STORAGE EXTERNAL")
+    op.execute("ALTER TABLE email_bodies ALTER COLUMN body_html SET STORAGE EXTERNAL")
+
+    # Backfill in keyset-paginated batches, compressing in Python.
+    # Metadata-only rows (body_fetched = false) only hold the snippet: they get no body row.
+    conn = op.get_bind()
+    last_id = None
+    while True:
+        query = (
+            "SELECT id, body_text, body_html FROM emails WHERE body_fetched "
+            + ("AND id > :last_id " if last_id else "")
+            + "ORDER BY id LIMIT :limit"
+        )
+        params = {"limit": BATCH_SIZE}
+        if last_id:
+            params["last_id"] = last_id
+        rows = conn.execute(sa.text(query), params).fetchall()
+        if not rows:
+            break
+        conn.execute(email_bodies.insert(), [
+            {"email_id": row.id, "body_text": _compress(row.body_text), "body_html": _compress(row.body_html)}
+            for row in rows
+        ])
+        last_id = rows[-1].id
+
+    op.drop_column('emails', 'body_html')
+    op.drop_column('emails', 'body_text')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('emails', sa.Column('body_text', sa.Text(), nullable=True))
+    op.add_column('emails', sa.Column('body_html', sa.Text(), nullable=True))
+
+    conn = op.get_bind()
+    last_id = None
+    while True:
+        query = (
+            "SELECT email_id, body_text, body_html FROM email_bodies "
+            + ("WHERE email_id > :last_id " if last_id else "")
+            + "ORDER BY email_id LIMIT :limit"
+        )
+        params = {"limit": BATCH_SIZE}
+        if last_id:
+            params["last_id"] = last_id
+        rows = conn.execute(sa.text(query), params).fetchall()
+        if not rows:
+            break
+        conn.execute(
+            sa.text("UPDATE emails SET body_text = :body_text, body_html = :body_html WHERE id = :email_id"),
+            [
+                {"email_id": row.email_id, "body_text": _decompress(row.body_text), "body_html": _decompress(row.body_html)}
+                for row in rows
+            ]
+        )
+        last_id = rows[-1].email_id
+
+    op.drop_table('email_bodies')
@@ -0,0 +1,29 @@
+"""add_email_context_lookup_index
+
+Revision ID: f1a9c3e7b5d2
+Revises: 7a61f0c2d8e5
+Create Date: 2026-10-18 19:42:37.218406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1a9c3e7b5d2'
+down_revision: Union[str, Sequence[str], None] = '7a61f0c2d8e5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The context lookup now matches category exactly (it was ILIKE '%cat%')
+    op.execute("UPDATE emails SET category = lower(trim(category)) WHERE category <> lower(trim(category))")
+    op.create_index('ix_emails_context_lookup', 'emails', ['user_id', 'sender', 'category', 'event_date'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_emails_context_lookup', table_name='emails')
@@ -5,6 +5,7 @@ from sqlalchemy.future import select
 from datetime import datetime, timedelta
 
 from app.services.auth_service import auth_service
+from app.services.google_client import google_service_cache
 from app.core.database import get_db
 from app.models.user import User
 
@@ -68,6 +69,9 @@ async def callback_google(code: str, db: AsyncSession = Depends(get_db)):
         await db.commit()
         await db.refresh(user)
 
+        # Tokens were rotated: drop any Gmail/Calendar services built with the old ones
+        google_service_cache.invalidate(user.id)
+
         # Redirect to frontend dashboard with user info (in production use secure cookies/tokens)
         frontend_url = "http://localhost:5173/dashboard"
         return RedirectResponse(
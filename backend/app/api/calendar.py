@@ -26,7 +26,7 @@ async def create_calendar_event(request: CalendarEventRequest, db: AsyncSession
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
-        event = calendar_service.create_event(
+        event = await calendar_service.create_event(
             user=user,
             title=request.title,
             start_time=request.start_time,
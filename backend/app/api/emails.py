@@ -4,7 +4,12 @@ from sqlalchemy.future import select
 from sqlalchemy import func
 from typing import List, Optional
 from app.core.database import get_db
+from app.core.config import settings
 from app.services.gmail_service import gmail_service
+from app.services.sync_pipeline import sync_metrics
+from app.services.body_store import body_store
+from app.services.backfill_service import backfill_service
+from app.services.job_queue import ai_job_queue, PROCESS_EMAILS_JOB
 from app.models.user import User
 from app.models.email import Email
 from app.schemas.email import EmailSendRequest, EmailResponse
@@ -22,11 +27,31 @@ async def get_current_user(user_id: str = Query(...), db: AsyncSession = Depends
 
 from fastapi import BackgroundTasks
 
+async def schedule_ai_processing(background_tasks: BackgroundTasks, email_ids: list, user_id: str):
+    """
+    Hands AI processing to the durable Redis queue (app.worker) when configured,
+    otherwise (or if Redis is down) runs it as a BackgroundTask of this process.
+    In API_ONLY mode it never runs here: unqueued emails stay pending for retry_pending.py.
+    """
+    if settings.JOB_QUEUE_BACKEND == "redis" or settings.API_ONLY:
+        try:
+            job_id = await ai_job_queue.enqueue(PROCESS_EMAILS_JOB, {"email_ids": [str(i) for i in email_ids], "user_id": user_id})
+            print(f"DEBUG: Enqueued AI job {job_id}")
+            return
+        except Exception as e:
+            if settings.API_ONLY:
+                print(f"Job queue unavailable ({e}), {len(email_ids)} emails left pending")
+                return
+            print(f"Job queue unavailable ({e}), processing in this process")
+    background_tasks.add_task(gmail_service.process_emails_background, email_ids, user_id)
+
 @router.post("/sync")
-async def sync_emails(background_tasks: BackgroundTasks, user_id: str, folder: str = "INBOX", limit: int = 50, db: AsyncSession = Depends(get_db)):
-    print(f"DEBUG: sync_emails called for user {user_id}, folder={folder}, limit={limit}")
+async def sync_emails(background_tasks: BackgroundTasks, user_id: str, folder: str = "INBOX", limit: int = 50, mode: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    print(f"DEBUG: sync_emails called for user {user_id}, folder={folder}, limit={limit}, mode={mode}")
     """
     Triggers email synchronization for the user.
+    mode: "full" (bodies + attachments) or "metadata" (headers/snippet/labels only,
+    bodies are hydrated when an email is opened). Defaults to settings.SYNC_MODE.
     """
     # Quick hack to get user for MVP testing
     result = await db.execute(select(User).filter(User.id == user_id))
@@ -35,19 +60,55 @@ async def sync_emails(background_tasks: BackgroundTasks, user_id: str, folder: s
          raise HTTPException(status_code=404, detail="User not found")
 
     try:
-        count, new_email_ids = await gmail_service.fetch_emails(db, user, folder=folder, max_results=limit)
+        metadata_only = (mode or settings.SYNC_MODE).lower() == "metadata"
+        count, new_email_ids = await gmail_service.sync(db, user, folder=folder, max_results=limit, metadata_only=metadata_only)
         
         # Trigger AI processing in background
         if new_email_ids:
             print(f"Scheduling background AI processing for {len(new_email_ids)} emails...")
-            background_tasks.add_task(gmail_service.process_emails_background, new_email_ids, str(user.id))
+            await schedule_ai_processing(background_tasks, new_email_ids, str(user.id))
             
-        return {"message": "Sync complete. AI Agent processing started in background.", "emails_fetched": count}
+        quota = sync_metrics.get(str(user.id), {}).get("quota", {})
+        return {"message": "Sync complete. AI Agent processing started in background.", "emails_fetched": count, "quota_units": quota.get("units")}
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/sync/metrics")
+async def sync_metrics_endpoint(user_id: str):
+    """
+    Per-stage throughput and queue depth of the user's last sync pipeline run,
+    plus the Gmail quota units it used.
+    """
+    metrics = sync_metrics.get(user_id)
+    if not metrics:
+        raise HTTPException(status_code=404, detail="No sync has run for this user yet")
+    return metrics
+
+@router.post("/backfill")
+async def start_backfill(user_id: str, db: AsyncSession = Depends(get_db)):
+    """
+    Starts importing the user's whole mailbox in the background (resumes if interrupted).
+    Historical mail is stored without AI processing.
+    """
+    result = await db.execute(select(User).filter(User.id == user_id))
+    user = result.scalars().first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    job = backfill_service.start(user.id)
+    return job.as_dict()
+
+@router.get("/backfill")
+async def backfill_progress(user_id: str):
+    """
+    Progress of the user's mailbox backfill: scanned/stored counts, messages/sec, ETA.
+    """
+    progress = backfill_service.progress(user_id)
+    if not progress:
+        raise HTTPException(status_code=404, detail="No backfill has run for this user yet")
+    return progress
+
 @router.post("/send")
 async def send_email_endpoint(
     request: EmailSendRequest,
@@ -88,11 +149,8 @@ async def list_emails(
     """
     Lists processed emails with optional search and pagination.
     """
-    # Optimized Query: Defer loading of heavy body text/html fields
-    from sqlalchemy.orm import defer
-    
+    # Heavy body text/html live in email_bodies, so this never touches them
     query = select(Email).filter(Email.user_id == user_id).order_by(Email.received_at.desc())
-    query = query.options(defer(Email.body_text), defer(Email.body_html))
     
     # ... (Search and Filters kept same) ...
     # Search Filter
@@ -218,6 +276,16 @@ async def get_email_details(email_id: str, user_id: str = Query(...), db: AsyncS
     
     if not email:
         raise HTTPException(status_code=404, detail="Email not found")
+
+    # Metadata-only sync: download and persist the body on first open
+    if not email.body_fetched:
+        user = await db.get(User, email.user_id)
+        try:
+            await gmail_service.hydrate_emails(db, user, [email])
+        except Exception as e:
+            print(f"Error hydrating email {email_id}: {e}") # Fall back to the snippet
+
+    body_text, body_html = await body_store.get(db, email.id)
     
     # Return full details including body
     return {
@@ -228,8 +296,8 @@ async def get_email_details(email_id: str, user_id: str = Query(...), db: AsyncS
         "sender": email.sender,
         "recipient": email.recipient,
         "snippet": email.snippet,
-        "body_text": email.body_text, # Full body
-        "body_html": email.body_html, # Full Html
+        "body_text": body_text or email.snippet, # Full body
+        "body_html": body_html, # Full Html
         "received_at": email.received_at, 
         "is_processed": email.is_processed,
         "event_title": email.event_title,
@@ -58,6 +58,85 @@ class Settings(BaseSettings):
 
     # AI
     GOOGLE_API_KEY: str = ""
+    LLM_PROVIDER: str = "gemini" # "gemini" or "fake" (local stand-in: recorded / synthetic answers)
+    LLM_MODEL: str = "gemini-flash-latest"
+    LLM_RECORD: bool = False # Append Gemini answers to LLM_RECORDINGS_PATH for offline replay
+    LLM_RECORDINGS_PATH: str = ".cache/llm_recordings.jsonl"
+    LLM_FAKE_LATENCY_SECONDS: float = 1.5 # Median latency of the fake provider
+    LLM_FAKE_RATE_LIMIT_RATE: float = 0.0 # Share of fake calls failing with a 429
+    AI_REQUESTS_PER_MINUTE: int = 15 # Gemini free tier RPM
+    AI_TOKENS_PER_MINUTE: int = 250_000 # Gemini free tier TPM
+    AI_OUTPUT_TOKENS_ESTIMATE: int = 256 # Completion tokens budgeted per call
+    AI_RATE_LIMIT_BACKEND: str = "local" # "local" (per process) or "redis" (shared across workers)
+    AI_BATCH_MAX_EMAILS: int = 10 # Emails analyzed per LLM call
+    AI_BATCH_TOKEN_BUDGET: int = 8000 # Estimated prompt tokens per batched LLM call
+    AI_CONCURRENCY: int = 0 # LLM calls in flight; 0 = derived from the RPM quota and the expected latency
+    AI_EXPECTED_LATENCY_SECONDS: float = 8.0 # Typical duration of one (batched) LLM call
+    AI_MAX_CONCURRENCY: int = 8 # Cap of the derived value (each in-flight batch holds a DB connection)
+    AI_TRIAGE_ENABLED: bool = True # Skip clearly irrelevant mail before the LLM
+    AI_TRIAGE_SENDER_MIN_HISTORY: int = 5 # Analyzed emails without any event before a sender is skipped
+    AI_PROMPT_COMPACTION: bool = True # Strip quotes/signatures/footers and cap each email before the LLM
+    AI_PROMPT_MAX_TOKENS_PER_EMAIL: int = 1500 # Date-bearing sentences and PDF rows are kept first
+    DATE_RESOLVER_CACHE_SIZE: int = 4096 # Memoized dateparser resolutions (text, received_at date)
+    AI_CACHE_ENABLED: bool = True # Reuse LLM results for identical (normalized) email content
+    AI_CACHE_PATH: str = ".cache/analysis_results.sqlite3" # Raw LLM JSON, keyed by content hash + prompt version + model
+    AI_CACHE_TTL_HOURS: int = 7 * 24 # Cached results older than this are re-analyzed
+    AI_CACHE_MAX_ENTRIES: int = 20_000 # LRU-evicted beyond this
+    AI_CACHE_MEMORY_ENTRIES: int = 1024 # In-process LRU in front of the file
+
+    # AI job queue
+    JOB_QUEUE_BACKEND: str = "local" # "local" (BackgroundTasks in the API process) or "redis" (durable queue + app.worker)
+    JOB_QUEUE_NAME: str = "jobs:ai"
+    JOB_VISIBILITY_TIMEOUT_SECONDS: float = 300 # Unacked jobs are delivered again after this
+    JOB_MAX_ATTEMPTS: int = 6 # Then the job goes to the dead-letter list
+    JOB_BACKOFF_BASE_SECONDS: float = 30.0 # First retry delay (rate limited / failed jobs)
+    JOB_BACKOFF_MAX_SECONDS: float = 600.0
+    WORKER_CONCURRENCY: int = 4 # Jobs run at once per worker process
+    WORKER_POLL_SECONDS: float = 1.0 # Idle wait between reserve attempts
+    API_ONLY: bool = False # API process never loads the AI stack: AI jobs always go to the Redis queue
+
+    # Google API I/O
+    GOOGLE_API_MAX_WORKERS: int = 16 # Thread pool for blocking googleapiclient calls
+    GOOGLE_SERVICE_CACHE_SIZE: int = 256 # Cached Gmail/Calendar service objects (LRU)
+    GOOGLE_SERVICE_CACHE_TTL: int = 1800 # Seconds before a cached service is rebuilt
+
+    # MIME parsing
+    MIME_MAX_BODY_CHARS: int = 200_000 # Text/HTML kept per message
+    MIME_MAX_DEPTH: int = 20 # Nested multipart levels walked
+    BODY_COMPRESSION_LEVEL: int = 6 # zlib level for email_bodies (1 = fastest, 9 = smallest)
+
+    # PDF attachments
+    PDF_MAX_WORKERS: int = 2 # Processes for PDF text extraction
+    PDF_MAX_BYTES: int = 10 * 1024 * 1024 # Larger attachments are skipped
+    PDF_MAX_PAGES: int = 30 # Only the first N pages are extracted
+    PDF_MAX_CHARS: int = 100_000 # Extracted text cap per document
+    PDF_TIMEOUT_SECONDS: float = 20.0 # Per-document parse time (queueing for a worker not counted)
+    PDF_SPOOL_BYTES: int = 1024 * 1024 # Larger PDFs go to the worker via a temp file
+    ATTACHMENT_CACHE_PATH: str = ".cache/attachment_text.sqlite3" # Content-addressed extracted text
+    ATTACHMENT_CACHE_MAX_ENTRIES: int = 5000 # LRU-evicted beyond this
+    ATTACHMENT_CACHE_MEMORY_ENTRIES: int = 256 # In-process LRU in front of the file
+
+    # Gmail Sync
+    SYNC_MODE: str = "full" # "full" or "metadata" (headers only, bodies hydrated on open)
+    GMAIL_BATCH_SIZE: int = 100 # Sub-requests per batch HTTP call (Gmail max: 100)
+    GMAIL_BATCH_MAX_RETRIES: int = 3 # Retries for individually failed sub-requests
+    GMAIL_USER_QUOTA_PER_SECOND: float = 250 # Gmail per-user limit: 15,000 units/min
+    GMAIL_USER_QUOTA_BURST: float = 250 # Units a user may spend at once before waiting
+    GMAIL_GLOBAL_QUOTA_PER_SECOND: float = 20_000 # Gmail per-project limit: 1,200,000 units/min
+    GMAIL_RATE_LIMIT_MAX_RETRIES: int = 5 # Retries of a 429 / 5xx / rate-limit 403 call
+    GMAIL_BACKOFF_MAX_SECONDS: float = 32.0 # Cap of the exponential backoff
+    SYNC_FETCH_CONCURRENCY: int = 4 # Concurrent batch detail fetchers
+    SYNC_PARSE_CONCURRENCY: int = 4 # Concurrent MIME/PDF parsers
+    SYNC_FETCH_QUEUE_SIZE: int = 4 # Pending id batches between lister and fetchers
+    SYNC_QUEUE_SIZE: int = 200 # Messages buffered between fetch/parse/write stages
+    SYNC_WRITE_BATCH_SIZE: int = 100 # Rows per bulk upsert + commit
+    SYNC_WRITE_FLUSH_SECONDS: float = 0.5 # Flush a partial batch after this much idle time
+    SYNC_CHECKPOINT_TTL_HOURS: int = 24 # Older unfinished syncs restart instead of resuming (page tokens expire)
+
+    # Mailbox backfill
+    BACKFILL_FOLDERS: List[str] = ["INBOX", "SENT"] # Labels walked by the historical backfill
+    BACKFILL_QUOTA_SHARE: float = 0.5 # Max share of the per-user Gmail quota the backfill may use
+    BACKFILL_AI_WINDOW_DAYS: int = 14 # Backfilled mail older than this is stored as processed (never sent to the AI)
 
     class Config:
         case_sensitive = True
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, String, DateTime, Boolean, Text, ForeignKey, UUID, Index
+from sqlalchemy import Column, String, DateTime, Boolean, ForeignKey, UUID, Index, LargeBinary
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, true, false
 import uuid
 from app.core.database import Base
 
@@ -18,12 +18,12 @@ class Email(Base):
     sender = Column(String, nullable=True) # From header
     recipient = Column(String, nullable=True) # To header
     
-    body_text = Column(Text, nullable=True)
-    body_html = Column(Text, nullable=True)
     snippet = Column(String, nullable=True)
+    body_fetched = Column(Boolean, default=True, server_default=true(), nullable=False) # False = metadata-only sync, hydrate on open (no email_bodies row yet)
     
     received_at = Column(DateTime(timezone=True), nullable=True)
     is_processed = Column(Boolean, default=False) # For AI processing status
+    llm_analyzed = Column(Boolean, default=False, server_default=false(), nullable=False) # True = processed by the LLM (not triage-skipped, not failed)
     folder = Column(String, index=True) # INBOX, SENT, DRAFTS
     label_ids = Column(String, nullable=True) # JSON or comma-separated list of Gmail Label IDs
     
@@ -49,4 +49,18 @@ class Email(Base):
     # Validation / Indexes
     __table_args__ = (
         Index('ix_emails_search_vector', search_vector, postgresql_using='gin'),
+        # Agent context lookup: a sender's next event of a category ("before the exam")
+        Index('ix_emails_context_lookup', user_id, sender, category, event_date),
     )
+
+
+class EmailBody(Base):
+    """
+    Heavy body columns, split off the emails row (1:1) so list queries, scans and
+    vacuum never touch them. Stored compressed, see app.services.body_store.
+    """
+    __tablename__ = "email_bodies"
+
+    email_id = Column(UUID(as_uuid=True), ForeignKey("emails.id", ondelete="CASCADE"), primary_key=True)
+    body_text = Column(LargeBinary, nullable=True) # zlib-compressed UTF-8
+    body_html = Column(LargeBinary, nullable=True) # zlib-compressed UTF-8
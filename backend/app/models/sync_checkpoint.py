@@ -0,0 +1,22 @@
+from sqlalchemy import Column, String, DateTime, ForeignKey, UUID
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class SyncCheckpoint(Base):
+    """
+    Progress of an unfinished folder sync. Written in the same transaction as each
+    batch of emails and deleted when the sync completes, so a crashed or retried
+    /sync resumes from here instead of listing from the start.
+    """
+    __tablename__ = "sync_checkpoints"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    folder = Column(String, primary_key=True) # INBOX, SENT, DRAFTS, ...
+
+    q_filter = Column(String, nullable=False, default="") # Page tokens are only valid for the same query
+    page_token = Column(String, nullable=True) # Next page after the last fully written one
+    last_message_id = Column(String, nullable=True) # Last message of that page
+    history_id = Column(String, nullable=True) # Mailbox historyId snapshotted when the sync started
+
+    started_at = Column(DateTime(timezone=True), nullable=False) # Becomes last_synced_at on completion
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -21,6 +21,7 @@ class User(Base):
     
     # Optimization Cursor
     last_synced_at = Column(DateTime(timezone=True), nullable=True)
+    gmail_history_id = Column(String, nullable=True) # users.history.list cursor
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,41 +1,25 @@
 import json
 import logging
+import math
 from datetime import datetime, timedelta
-import dateparser
-from langchain_google_genai import ChatGoogleGenerativeAI
 from app.core.config import settings
+from app.services.ai_rate_limiter import ai_rate_limiter, estimate_tokens
+from app.services.analysis_cache import analysis_cache
+from app.services.llm_providers import build_llm_provider
+from app.services.date_resolver import resolve_date
+from app.services.sender_events import context_category, next_event_query
 
 logger = logging.getLogger(__name__)
 
-class EventDetectionAgent:
-    def __init__(self):
-        # Initialize Gemini LLM
-        try:
-            self.llm = ChatGoogleGenerativeAI(
-                model="gemini-flash-latest",
-                google_api_key=settings.GOOGLE_API_KEY,
-                temperature=0.1,
-                convert_system_message_to_human=True 
-            )
-        except Exception as e:
-            logger.error(f"Failed to initialize Gemini Agent: {e}")
-            self.llm = None
-
-    async def analyze_email(self, email_content: str, received_at: datetime, email_id: str, db=None, user_id: str=None, sender: str=None) -> dict:
-        """
-        Analyzes email content using strict rules + dateparser for resolution.
-        """
-        if not self.llm:
-            return None
-
-        prompt = f"""
-You are an AI automation agent.
-OBJECTIVE: Detect deadlines/exams/meetings.
+# Part of the analysis cache key: bump whenever DETECTION_RULES or the output format change
+PROMPT_VERSION = "1"
 
+# Detection rules shared by the single-email and batch prompts
+DETECTION_RULES = """
 STEP 1: INTENT DETECTION
 Detect: deadline, exam, submission, meeting, assignment, homework, project.
 NOTE: The email may contain "[Attachment PDF Content]: ...". Treat this as critical high-priority text.
-If NONE: Return {{ "status": "ignored" }}
+If NONE: Return { "status": "ignored" }
 
 STEP 2: EXTRACTION
 Extract:
@@ -49,7 +33,52 @@ SPECIAL RULE FOR LISTS/TIMETABLES (e.g. from PDFs):
    - Title: "2 Exams: Math & Physics" (or "Math & Physics Exams")
    - Date: The shared date.
    - Do NOT create separate JSON objects. Return ONE object representing the combined schedule for that day.
+"""
+
+class EventDetectionAgent:
+    def __init__(self):
+        self._llm = None
+        self._llm_built = False
+
+    @property
+    def llm(self):
+        """
+        Gemini, or the local fake for offline runs / load tests (LLM_PROVIDER).
+        Built on first use: importing langchain takes over a second, which API
+        processes that only enqueue AI jobs never need to pay.
+        """
+        if not self._llm_built:
+            self._llm = build_llm_provider()
+            self._llm_built = True
+        return self._llm
+
+    @llm.setter
+    def llm(self, provider):
+        self._llm = provider
+        self._llm_built = True
+
+    @property
+    def model_name(self) -> str:
+        return getattr(self.llm, "model_name", None) or settings.LLM_MODEL
 
+    async def analyze_email(self, email_content: str, received_at: datetime, email_id: str, db=None, user_id: str=None, sender: str=None, sender_events=None) -> dict:
+        """
+        Analyzes email content using strict rules + dateparser for resolution.
+        """
+        if not self.llm:
+            return None
+
+        # Same (normalized) content already analyzed: reuse the raw answer, resolve dates for this email
+        cache_key = self._cache_key(email_content)
+        cached = self._cached(cache_key)
+        if cached is not None:
+            cached["email_id"] = email_id
+            return await self._resolve(cached, received_at, db, user_id, sender, sender_events)
+
+        prompt = f"""
+You are an AI automation agent.
+OBJECTIVE: Detect deadlines/exams/meetings.
+{DETECTION_RULES}
 STEP 3: OUTPUT JSON
 {{
   "email_id": "{email_id}",
@@ -65,216 +94,256 @@ EMAIL CONTENT:
 {email_content}
 """
         try:
-            # Call LLM
+            # Call LLM (waits for RPM/TPM quota without blocking the event loop)
+            await ai_rate_limiter.acquire(estimate_tokens(prompt))
             response = await self.llm.ainvoke(prompt)
-            print(f"DEBUG: LLM Response Content Type: {type(response.content)}")
-            print(f"DEBUG: LLM Response Content: {response.content}")
-            
-            if isinstance(response.content, list):
-                # Handle list of dicts (e.g. [{'type': 'text', 'text': ...}])
-                pieces = []
-                for part in response.content:
-                    if isinstance(part, dict) and 'text' in part:
-                        pieces.append(part['text'])
-                    else:
-                        pieces.append(str(part))
-                content = "".join(pieces).strip()
-            else:
-                content = response.content.strip()
-            if content.startswith("```"):
-                content = content.replace("```json", "").replace("```", "").strip()
-            
-            result = json.loads(content)
-            
-            if result.get("status") == "ignored":
-                return result
+            result = json.loads(self._response_json(response))
+            self._remember(cache_key, result)
+            return await self._resolve(result, received_at, db, user_id, sender, sender_events)
+        except Exception as e:
+            print(f"Error during AI analysis: {e}")
+            if "429" in str(e) or "RESOURCE_EXHAUSTED" in str(e):
+                # CRITICAL: Do not silence Rate Limits! Raise so we don't mark as processed.
+                await ai_rate_limiter.penalize(30) # Slow down every caller, not just this one
+                raise e
+            return None
 
-            # --- Python Logic Layer (The "Brain") ---
-            
-            # 1. Resolve Date using dateparser
-            date_text = result.get("date_text")
-            
-            # Defensive: ensure date_text is a string
-            if isinstance(date_text, list):
-                date_text = " ".join(date_text)
-                
-            resolved_date = None
-            
-            if date_text:
-                prefixes = ["", "before ", "by ", "on ", "due ", "due date ", "until "]
-                lower_text = date_text.lower()
-                
-                for prefix in prefixes:
-                    if resolved_date:
-                        break
-                        
-                    # 1. Clean prefix
-                    if prefix and prefix not in lower_text:
-                        continue
-                        
-                    clean_text = lower_text.replace(prefix, "").strip()
-                    if not clean_text:
-                        continue
-                    
-                    # 2. Try Direct Parse
-                    parsed = dateparser.parse(
-                        clean_text,
-                        settings={'RELATIVE_BASE': received_at, 'PREFER_DATES_FROM': 'future'}
-                    )
-                    if parsed:
-                        resolved_date = parsed
-                        break
-                        
-                    # 3. Manual Fallbacks on CLEANED text
-                    
-                    # "next week [day]" -> [day] + 7 days
-                    if "next week" in clean_text:
-                         super_clean = clean_text.replace("next week", "").strip()
-                         base_day = dateparser.parse(super_clean, settings={'RELATIVE_BASE': received_at, 'PREFER_DATES_FROM': 'future'})
-                         if base_day:
-                             resolved_date = base_day + timedelta(days=7)
-                             break
-
-                    # "end of this month"
-                    if "end of this month" in clean_text:
-                        import calendar
-                        last_day = calendar.monthrange(received_at.year, received_at.month)[1]
-                        resolved_date = received_at.replace(day=last_day)
-                        break
-
-                    # "end of next month"
-                    if "end of next month" in clean_text:
-                        import calendar
-                        if received_at.month == 12:
-                            nm_year = received_at.year + 1
-                            nm_month = 1
-                        else:
-                            nm_year = received_at.year
-                            nm_month = received_at.month + 1
-                        last_day = calendar.monthrange(nm_year, nm_month)[1]
-                        resolved_date = received_at.replace(year=nm_year, month=nm_month, day=last_day)
-                        break
-
-                    # "end of weekend"
-                    if "end of weekend" in clean_text:
-                        days_ahead = 6 - received_at.weekday()
-                        if days_ahead <= 0: days_ahead += 7
-                        resolved_date = received_at + timedelta(days=days_ahead)
-                        break
-                    
-                    # Manual Fix for "weekend" -> Upcoming Friday
-                    if "weekend" in clean_text:
-                        # Find next Friday (weekday 4)
-                        # Current weekday: Mon=0, Sun=6
-                        days_ahead = 4 - received_at.weekday()
-                        if days_ahead <= 0: # If today is Friday, Saturday, Sunday -> Next Friday
-                             days_ahead += 7
-                        
-                        resolved_date = received_at + timedelta(days=days_ahead)
-                        # Set to end of day (23:59:59) roughly implies "night"
-                        resolved_date = resolved_date.replace(hour=23, minute=59, second=59)
-                        break
-
-                    # "next [day]" fallback (must be last manual check to avoid clashing with next week)
-                    if "next " in clean_text:
-                         super_clean = clean_text.replace("next ", "").strip()
-                         base_day = dateparser.parse(super_clean, settings={'RELATIVE_BASE': received_at, 'PREFER_DATES_FROM': 'future'})
-                         if base_day:
-                             resolved_date = base_day + timedelta(days=7)
-                             break
-
-            # --- CONTEXT LOOKUP (The "Memory" Feature) ---
-            # If no date found, but text implies a reference like "before the meeting"
-            if not resolved_date and db and user_id and sender:
-                 # Check for specific keywords
-                 context_keywords = ["meeting", "exam", "submission", "deadline"]
-                 found_keyword = next((k for k in context_keywords if k in (date_text or "").lower()), None)
-                 
-                 if found_keyword:
-                     # Query DB for the *next* event of this type
-                     try:
-                         # normalize keyword to category if needed
-                         cat = found_keyword
-                         if cat == "submission": cat = "deadline"
-                         
-                         from app.models.email import Email
-                         from sqlalchemy import select
-                         
-                         # OPTIMIZATION: 
-                         # 1. Match Sender (Context usually implies same source)
-                         # 2. Limit to 10 Days (Don't link to something months away)
-                         limit_date = received_at + timedelta(days=10)
-                         
-                         query = select(Email).filter(
-                             Email.user_id == user_id,
-                             Email.sender == sender,
-                             Email.category.ilike(f"%{cat}%"),
-                             Email.event_date > received_at,
-                             Email.event_date <= limit_date
-                         ).order_by(Email.event_date.asc()).limit(1)
-                         
-                         res = await db.execute(query)
-                         context_email = res.scalars().first()
-                         
-                         if context_email:
-                             resolved_date = context_email.event_date
-                             result["reason"] = f"Resolved via context: Linked to '{context_email.subject}'"
-                             print(f"DEBUG: Context found! Linked to {context_email.id}")
-                     except Exception as ex:
-                         print(f"DEBUG: Context lookup failed: {ex}")
-
-            if not resolved_date:
-                # Fallback: if LLM failed to give text but gave nothing, or dateparser failed
-                result["action"] = "needs_confirmation"
-                result["reason"] = result.get("reason", "Could not resolve date")
-                return result
-
-            # 2. Apply Notification Rules
-            event_type = result.get("event_type", "meeting");
-            reminders = []
-            
-            if event_type == "exam":
-                # Notify 2 days before + 1 hour before
-                reminders = [
-                    {"method": "email", "minutes": 2 * 24 * 60}, 
-                    {"method": "popup", "minutes": 60}
-                ]
-            elif event_type == "deadline":
-                # Notify 1 day before + 1 hour before
-                reminders = [
-                     {"method": "email", "minutes": 24 * 60},
-                     {"method": "popup", "minutes": 60}
-                ]
+    def max_in_flight(self) -> int:
+        """
+        How many LLM calls to keep in flight: AI_CONCURRENCY if set, otherwise what the
+        RPM quota sustains at the expected call latency (Little's law), capped.
+        """
+        if settings.AI_CONCURRENCY:
+            return settings.AI_CONCURRENCY
+        sustained = math.ceil(ai_rate_limiter.rpm / 60.0 * settings.AI_EXPECTED_LATENCY_SECONDS)
+        return max(1, min(settings.AI_MAX_CONCURRENCY, sustained))
+
+    def batch_emails(self, items: list[dict]) -> list[list[dict]]:
+        """
+        Packs emails (dicts with email_id, email_content, received_at, sender) into
+        batches of at most AI_BATCH_MAX_EMAILS that fit AI_BATCH_TOKEN_BUDGET.
+        An email over the budget on its own gets a batch of one.
+        """
+        batches = []
+        current = []
+        current_tokens = 0
+        for item in items:
+            tokens = estimate_tokens(item["email_content"])
+            if current and (current_tokens + tokens > settings.AI_BATCH_TOKEN_BUDGET or len(current) >= settings.AI_BATCH_MAX_EMAILS):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(item)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    async def analyze_batch(self, items: list[dict], db=None, user_id: str=None, sender_events=None) -> dict:
+        """
+        Analyzes several emails with ONE LLM call (see batch_emails for packing).
+        Returns dict: email_id -> result (same shape as analyze_email, None on failure).
+        Emails whose content was analyzed before come from the analysis cache.
+        sender_events (the run's preloaded SenderEvents) serves the context lookups.
+        Items missing from / malformed in the batch response are retried one at a time.
+        Raises on rate limits so the caller leaves the emails unprocessed.
+        """
+        if not self.llm:
+            return {}
+        if len(items) == 1:
+            item = items[0]
+            return {item["email_id"]: await self.analyze_email(db=db, user_id=user_id, sender_events=sender_events, **item)}
+
+        raw = {}
+        keys = {item["email_id"]: self._cache_key(item["email_content"]) for item in items}
+        pending = {}
+        for item in items:
+            cached = self._cached(keys[item["email_id"]])
+            if cached is not None:
+                cached["email_id"] = item["email_id"]
+                raw[item["email_id"]] = cached
             else:
-                # Default (Meeting)
-                reminders = [{"method": "popup", "minutes": 10}]
+                # Identical copies within the batch are asked once, the rest hit the cache below
+                pending.setdefault(keys[item["email_id"]] if settings.AI_CACHE_ENABLED else item["email_id"], item)
+        if len(pending) > 1:
+            await self._ask_batch(list(pending.values()), keys, raw)
 
-            # 3. Construct Calendar Payload
-            start_iso = resolved_date.isoformat()
-            end_iso = (resolved_date + timedelta(hours=1)).isoformat()
-            
-            result["resolved_date"] = start_iso
-            # Ensure action is set so UI shows notification
-            if "action" not in result or result["action"] == "ignored":
-                 result["action"] = "needs_confirmation"
-            result["calendar_event_payload"] = {
-                "summary": result.get("event_title", "Event"),
-                "description": f"Detected from email. Original text: '{date_text}'",
-                "start": {"dateTime": start_iso},
-                "end": {"dateTime": end_iso},
-                "reminders": {
-                    "useDefault": False,
-                    "overrides": reminders
-                }
-            }
-            
-            return result
-            
+        results = {}
+        for item in items:
+            entry = raw.get(item["email_id"])
+            if entry is None:
+                # Missing or malformed in the batch answer (or a single miss): ask for this email alone
+                print(f"DEBUG: No batch answer for {item['email_id']}, analyzing alone")
+                results[item["email_id"]] = await self.analyze_email(db=db, user_id=user_id, sender_events=sender_events, **item)
+                continue
+            try:
+                # dateparser resolution runs per email, against that email's received_at
+                results[item["email_id"]] = await self._resolve(entry, item["received_at"], db, user_id, item.get("sender"), sender_events)
+            except Exception as e:
+                print(f"Error resolving AI result for {item['email_id']}: {e}")
+                results[item["email_id"]] = None
+        return results
+
+    async def _ask_batch(self, items: list[dict], keys: dict, raw: dict):
+        """
+        One LLM call for several emails. Valid entries of the JSON array answer are
+        cached and stored in raw (email_id -> entry). Raises on rate limits.
+        """
+        emails_text = "\n".join(
+            f"=== EMAIL email_id={item['email_id']} ===\n{item['email_content']}\n" for item in items
+        )
+        prompt = f"""
+You are an AI automation agent.
+OBJECTIVE: Detect deadlines/exams/meetings in EACH of the {len(items)} emails below, independently.
+{DETECTION_RULES}
+STEP 3: OUTPUT a JSON ARRAY with exactly one object per email, each carrying the email_id from its header:
+[
+  {{
+    "email_id": "...",
+    "status": "processed",
+    "event_type": "exam | deadline | meeting",
+    "event_title": "...",
+    "date_text": "...",
+    "confidence": 0.0 to 1.0,
+    "action": "auto_add | needs_confirmation"
+  }},
+  {{ "email_id": "...", "status": "ignored" }}
+]
+
+EMAILS:
+{emails_text}
+"""
+        try:
+            await ai_rate_limiter.acquire(estimate_tokens(prompt) + settings.AI_OUTPUT_TOKENS_ESTIMATE * (len(items) - 1))
+            response = await self.llm.ainvoke(prompt)
+            parsed = json.loads(self._response_json(response))
+            if isinstance(parsed, dict):
+                parsed = [parsed]
+            for entry in parsed if isinstance(parsed, list) else []:
+                email_id = str(entry.get("email_id")) if isinstance(entry, dict) else None
+                if email_id in keys and entry.get("status") in ("processed", "ignored"):
+                    raw[email_id] = entry
+                    self._remember(keys[email_id], entry)
         except Exception as e:
-            print(f"Error during AI analysis: {e}")
+            print(f"Error during batch AI analysis: {e}")
             if "429" in str(e) or "RESOURCE_EXHAUSTED" in str(e):
-                # CRITICAL: Do not silence Rate Limits! Raise so we don't mark as processed.
+                await ai_rate_limiter.penalize(30)
                 raise e
+
+    def _cache_key(self, email_content: str) -> str:
+        return analysis_cache.key(email_content, PROMPT_VERSION, self.model_name)
+
+    def _cached(self, cache_key: str):
+        if not settings.AI_CACHE_ENABLED:
             return None
+        return analysis_cache.get(cache_key)
+
+    def _remember(self, cache_key: str, result: dict):
+        # Raw LLM answer only (no email_id, no resolved dates): those belong to each email
+        if settings.AI_CACHE_ENABLED and isinstance(result, dict) and result.get("status") in ("processed", "ignored"):
+            analysis_cache.put(cache_key, {k: v for k, v in result.items() if k != "email_id"})
+
+    def _response_json(self, response) -> str:
+        print(f"DEBUG: LLM Response Content Type: {type(response.content)}")
+        print(f"DEBUG: LLM Response Content: {response.content}")
+
+        if isinstance(response.content, list):
+            # Handle list of dicts (e.g. [{'type': 'text', 'text': ...}])
+            pieces = []
+            for part in response.content:
+                if isinstance(part, dict) and 'text' in part:
+                    pieces.append(part['text'])
+                else:
+                    pieces.append(str(part))
+            content = "".join(pieces).strip()
+        else:
+            content = response.content.strip()
+        if content.startswith("```"):
+            content = content.replace("```json", "").replace("```", "").strip()
+        return content
+
+    async def _resolve(self, result: dict, received_at: datetime, db=None, user_id: str=None, sender: str=None, sender_events=None) -> dict:
+        """
+        Python logic layer on top of the LLM answer: resolves date_text with dateparser
+        (+ context lookup) and builds the calendar payload.
+        """
+        if result.get("status") == "ignored":
+            return result
+
+        # --- Python Logic Layer (The "Brain") ---
+        
+        # 1. Resolve Date: regex fast path, memoized dateparser for the rest
+        date_text = result.get("date_text")
+        
+        # Defensive: ensure date_text is a string
+        if isinstance(date_text, list):
+            date_text = " ".join(date_text)
+            
+        resolved_date = resolve_date(date_text, received_at)
+
+        # --- CONTEXT LOOKUP (The "Memory" Feature) ---
+        # If no date found, but text implies a reference like "before the meeting":
+        # link to the sender's next event of that type (within 10 days)
+        if not resolved_date and db and user_id and sender:
+            category = context_category(date_text)
+            if category:
+                try:
+                    if sender_events is not None and sender_events.covers(sender, received_at):
+                        context_event = sender_events.next_event(sender, category, received_at)
+                    else:
+                        context_event = await next_event_query(db, user_id, sender, category, received_at)
+                    if context_event:
+                        resolved_date = context_event.event_date
+                        result["reason"] = f"Resolved via context: Linked to '{context_event.subject}'"
+                        print(f"DEBUG: Context found! Linked to {context_event.email_id}")
+                except Exception as ex:
+                    print(f"DEBUG: Context lookup failed: {ex}")
+
+        if not resolved_date:
+            # Fallback: if LLM failed to give text but gave nothing, or dateparser failed
+            result["action"] = "needs_confirmation"
+            result["reason"] = result.get("reason", "Could not resolve date")
+            return result
+
+        # 2. Apply Notification Rules
+        event_type = result.get("event_type", "meeting");
+        reminders = []
+        
+        if event_type == "exam":
+            # Notify 2 days before + 1 hour before
+            reminders = [
+                {"method": "email", "minutes": 2 * 24 * 60}, 
+                {"method": "popup", "minutes": 60}
+            ]
+        elif event_type == "deadline":
+            # Notify 1 day before + 1 hour before
+            reminders = [
+                 {"method": "email", "minutes": 24 * 60},
+                 {"method": "popup", "minutes": 60}
+            ]
+        else:
+            # Default (Meeting)
+            reminders = [{"method": "popup", "minutes": 10}]
+
+        # 3. Construct Calendar Payload
+        start_iso = resolved_date.isoformat()
+        end_iso = (resolved_date + timedelta(hours=1)).isoformat()
+        
+        result["resolved_date"] = start_iso
+        # Ensure action is set so UI shows notification
+        if "action" not in result or result["action"] == "ignored":
+             result["action"] = "needs_confirmation"
+        result["calendar_event_payload"] = {
+            "summary": result.get("event_title", "Event"),
+            "description": f"Detected from email. Original text: '{date_text}'",
+            "start": {"dateTime": start_iso},
+            "end": {"dateTime": end_iso},
+            "reminders": {
+                "useDefault": False,
+                "overrides": reminders
+            }
+        }
+        
+        return result
 
 agent_service = EventDetectionAgent()
@@ -0,0 +1,106 @@
+import asyncio
+from app.core.config import settings
+from app.services.gmail_quota import TokenBucket
+
+# Atomic two-bucket reservation (requests + tokens) shared by every worker.
+# Same model as the local limiter: units are taken now, the reply is how long to wait.
+_RESERVE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local function reserve(name, rate, cap, units)
+  local level = tonumber(redis.call('HGET', KEYS[1], name .. ':level') or cap)
+  local ts = tonumber(redis.call('HGET', KEYS[1], name .. ':ts') or now)
+  level = math.min(cap, level + (now - ts) * rate) - units
+  redis.call('HSET', KEYS[1], name .. ':level', level, name .. ':ts', now)
+  if level >= 0 then return 0 end
+  return -level / rate
+end
+local wait = reserve('req', tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[5]))
+wait = math.max(wait, reserve('tok', tonumber(ARGV[3]), tonumber(ARGV[4]), tonumber(ARGV[6])))
+redis.call('EXPIRE', KEYS[1], 3600)
+return tostring(wait)
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough prompt + completion token count (~4 characters per token) used for TPM budgeting.
+    """
+    return len(text) // 4 + settings.AI_OUTPUT_TOKENS_ESTIMATE
+
+
+class AIRateLimiter:
+    """
+    Async RPM/TPM limiter for LLM calls.
+
+    Each call reserves one request and its estimated tokens from two token buckets
+    and sleeps (asyncio.sleep, never blocking the loop) only as long as its own
+    reservation requires, so concurrent callers are spread over the quota instead
+    of being serialised behind fixed sleeps.
+
+    backend="redis" keeps the buckets in Redis (settings.REDIS_URL) so every API
+    worker shares one quota; if Redis is unavailable it falls back to in-process.
+
+    Buckets hold at most `burst` requests (and the matching share of TPM), not a
+    whole minute: a full-minute capacity plus the refill would let ~2x RPM through
+    the first minute after startup or an idle period.
+    """
+    def __init__(self, rpm: int, tpm: int, backend: str = "local", key: str = "ai:rate_limit", burst: float = 1):
+        self.backend = backend
+        self.key = key
+        self.burst = burst
+        self._redis = None
+        self._script = None
+        self.set_limits(rpm, tpm)
+
+    def set_limits(self, rpm: int, tpm: int):
+        """
+        Sets the quota and starts both in-process buckets full (i.e. at the burst).
+        """
+        self.rpm = rpm
+        self.tpm = tpm
+        self.req_capacity = self.burst
+        self.tok_capacity = tpm / rpm * self.burst # Tokens of `burst` average requests
+        self._buckets = {"req": TokenBucket(rpm / 60.0, self.req_capacity), "tok": TokenBucket(tpm / 60.0, self.tok_capacity)}
+
+    def _get_script(self):
+        if self._script is None:
+            import redis.asyncio as redis # Optional dependency, only for the shared backend
+            self._redis = redis.from_url(settings.REDIS_URL)
+            self._script = self._redis.register_script(_RESERVE_LUA)
+        return self._script
+
+    async def _reserve(self, requests: int, tokens: int) -> float:
+        if self.backend == "redis":
+            try:
+                wait = await self._get_script()(
+                    keys=[self.key],
+                    args=[self.rpm / 60.0, self.req_capacity, self.tpm / 60.0, self.tok_capacity, requests, tokens]
+                )
+                return float(wait)
+            except Exception as e:
+                print(f"AI rate limiter: Redis unavailable ({e}), using in-process limits")
+                self.backend = "local"
+        return max(self._buckets["req"].reserve(requests), self._buckets["tok"].reserve(tokens))
+
+    async def acquire(self, tokens: int):
+        """
+        Waits until one request of `tokens` estimated tokens fits in the RPM/TPM quota.
+        """
+        wait = await self._reserve(1, tokens)
+        if wait:
+            print(f"DEBUG: AI rate limit: waiting {wait:.1f}s")
+            await asyncio.sleep(wait)
+
+    async def penalize(self, seconds: float):
+        """
+        Called on a 429 from the provider: later callers wait about `seconds` longer.
+        """
+        await self._reserve(max(1, round(self.rpm / 60.0 * seconds)), 0)
+
+
+ai_rate_limiter = AIRateLimiter(
+    rpm=settings.AI_REQUESTS_PER_MINUTE,
+    tpm=settings.AI_TOKENS_PER_MINUTE,
+    backend=settings.AI_RATE_LIMIT_BACKEND,
+)
@@ -0,0 +1,64 @@
+import hashlib
+import json
+import re
+import unicodedata
+from typing import Optional
+from app.core.config import settings
+from app.services.keyed_store import KeyedStore
+
+_QUOTED_LINE_RE = re.compile(r"^\s*>.*$", re.MULTILINE)
+_URL_QUERY_RE = re.compile(r"(https?://[^\s?#]+)[?#]\S*")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_content(text: str) -> str:
+    """
+    Canonical form of an email body for hashing: copies of the same circular that
+    differ only in case, whitespace, quoted replies or tracking query strings collapse.
+    Digits are kept since they carry the dates.
+    """
+    text = unicodedata.normalize("NFKC", text or "")
+    text = _QUOTED_LINE_RE.sub("", text)
+    text = _URL_QUERY_RE.sub(r"\1", text)
+    return _WHITESPACE_RE.sub(" ", text).strip().lower()
+
+
+class AnalysisCache:
+    """
+    Persistent cache of raw LLM analysis JSON (before date resolution), keyed by
+    the normalized content hash + prompt version + model name, so a mass announcement
+    is analyzed once for every recipient. A KeyedStore with a TTL.
+    """
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int, memory_entries: int):
+        self.store = KeyedStore(path, "analysis_result", max_entries, memory_entries, ttl_seconds=ttl_seconds)
+
+    @property
+    def hits(self) -> int:
+        return self.store.hits
+
+    @property
+    def misses(self) -> int:
+        return self.store.misses
+
+    @staticmethod
+    def key(content: str, prompt_version: str, model: str) -> str:
+        digest = hashlib.sha256(normalize_content(content).encode("utf-8")).hexdigest()
+        return f"{prompt_version}:{model}:{digest}"
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Returns a fresh copy of the cached raw result, or None (missing or expired).
+        """
+        data = self.store.get(key)
+        return json.loads(data) if data is not None else None
+
+    def put(self, key: str, result: dict):
+        self.store.put(key, json.dumps(result))
+
+
+analysis_cache = AnalysisCache(
+    path=settings.AI_CACHE_PATH,
+    ttl_seconds=settings.AI_CACHE_TTL_HOURS * 3600,
+    max_entries=settings.AI_CACHE_MAX_ENTRIES,
+    memory_entries=settings.AI_CACHE_MEMORY_ENTRIES,
+)
@@ -0,0 +1,50 @@
+import hashlib
+from typing import Optional
+from app.core.config import settings
+from app.services.keyed_store import KeyedStore
+
+
+class AttachmentTextCache:
+    """
+    Content-addressed store of extracted attachment text.
+
+    Entries are keyed by the SHA-256 of the attachment bytes, so the same syllabus
+    mailed to many users is parsed once. A secondary (attachmentId, size) index lets
+    a re-sync or hydration of the same message skip the download entirely.
+
+    Lookups happen inside parse_message on the Google API threads; both maps are
+    KeyedStores in the same local SQLite file. A ref whose text was evicted is a miss.
+    """
+    def __init__(self, path: str, max_entries: int, memory_entries: int):
+        self.texts = KeyedStore(path, "attachment_text", max_entries, memory_entries) # content_hash -> text
+        self.refs = KeyedStore(path, "attachment_ref", max_entries, memory_entries) # "attachment_id:size" -> content_hash
+
+    @staticmethod
+    def hash_bytes(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def get_by_hash(self, content_hash: str) -> Optional[str]:
+        return self.texts.get(content_hash)
+
+    def get_by_ref(self, attachment_id: str, size: Optional[int]) -> Optional[str]:
+        """
+        Lookup by Gmail attachmentId + size, without downloading the attachment.
+        """
+        if not attachment_id or not size:
+            return None
+        content_hash = self.refs.get(f"{attachment_id}:{size}")
+        if content_hash is None:
+            return None
+        return self.get_by_hash(content_hash)
+
+    def put(self, content_hash: str, text: str, attachment_id: Optional[str] = None, size: Optional[int] = None):
+        self.texts.put(content_hash, text)
+        if attachment_id and size:
+            self.refs.put(f"{attachment_id}:{size}", content_hash)
+
+
+attachment_cache = AttachmentTextCache(
+    path=settings.ATTACHMENT_CACHE_PATH,
+    max_entries=settings.ATTACHMENT_CACHE_MAX_ENTRIES,
+    memory_entries=settings.ATTACHMENT_CACHE_MEMORY_ENTRIES,
+)
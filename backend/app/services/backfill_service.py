@@ -0,0 +1,159 @@
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.user import User
+from app.models.sync_checkpoint import SyncCheckpoint
+from app.services.gmail_service import gmail_service
+from app.services.gmail_quota import gmail_quota
+from app.services.google_client import run_google_call
+from app.services.sync_pipeline import SyncPipeline
+
+
+class BackfillJob:
+    """
+    Progress of one user's historical backfill (served by GET /emails/backfill).
+    """
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.status = "running" # running, done, failed
+        self.folder = None
+        self.total_estimate = None # messagesTotal from the Gmail profile
+        self.scanned_done = 0 # Listed in finished folders
+        self.stored = 0 # Newly stored messages
+        self.error = None
+        self.quota = None
+        self.pipeline = None # Pipeline of the folder in progress
+        self.started_at = datetime.utcnow()
+        self.finished_at = None
+        self._start = time.perf_counter()
+        self._elapsed = None
+
+    @property
+    def scanned(self) -> int:
+        return self.scanned_done + (self.pipeline.scanned if self.pipeline else 0)
+
+    def finish(self, status: str, error: Optional[str] = None):
+        self.status = status
+        self.error = error
+        self.pipeline = None
+        self.finished_at = datetime.utcnow()
+        self._elapsed = time.perf_counter() - self._start
+
+    def as_dict(self) -> dict:
+        elapsed = self._elapsed if self._elapsed is not None else time.perf_counter() - self._start
+        scanned = self.scanned
+        rate = scanned / elapsed if elapsed else 0.0
+        eta = None
+        if self.status == "running" and self.total_estimate and rate:
+            eta = round(max(self.total_estimate - scanned, 0) / rate)
+        return {
+            "status": self.status,
+            "folder": self.folder,
+            "scanned": scanned,
+            "stored": self.stored + (self.pipeline.fetched_count if self.pipeline else 0),
+            "total_estimate": self.total_estimate,
+            "messages_per_sec": round(rate, 1),
+            "eta_seconds": eta,
+            "elapsed_seconds": round(elapsed, 1),
+            "started_at": self.started_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "error": self.error,
+            "quota": self.quota.as_dict() if self.quota else None,
+        }
+
+
+class BackfillService:
+    """
+    Imports a user's whole mailbox (settings.BACKFILL_FOLDERS), which the regular
+    sync never reaches after the first `limit` messages.
+
+    Runs in the background on the sync pipeline, listing every page (no early stop
+    on known messages) with a checkpoint per folder, so it resumes after a restart.
+    Its Gmail calls are low priority: capped at BACKFILL_QUOTA_SHARE of the user's
+    quota and paused while a live sync runs. Historical mail is never sent to the AI:
+    rows older than BACKFILL_AI_WINDOW_DAYS are stored already processed, so
+    retry_pending / force_process don't spend the AI quota on years of old mail.
+    """
+    def __init__(self):
+        self.jobs: dict[str, BackfillJob] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def start(self, user_id) -> BackfillJob:
+        """
+        Starts (or resumes from its checkpoints) the user's backfill. No-op if already running.
+        """
+        user_id = str(user_id)
+        task = self._tasks.get(user_id)
+        if task and not task.done():
+            return self.jobs[user_id]
+        job = BackfillJob(user_id)
+        self.jobs[user_id] = job
+        self._tasks[user_id] = asyncio.create_task(self._run(job))
+        return job
+
+    def progress(self, user_id) -> Optional[dict]:
+        job = self.jobs.get(str(user_id))
+        return job.as_dict() if job else None
+
+    async def _run(self, job: BackfillJob):
+        try:
+            async with SessionLocal() as db:
+                user = await db.get(User, job.user_id)
+                if not user:
+                    raise ValueError("User not found")
+                with gmail_quota.track(user.id, low_priority=True) as quota:
+                    job.quota = quota
+                    service = await run_google_call(gmail_service.build_service, user)
+                    profile = await gmail_quota.execute(service.users().getProfile(userId='me'), 'getProfile')
+                    job.total_estimate = profile.get('messagesTotal')
+                    print(f"Backfill: {user.email} has ~{job.total_estimate} messages")
+
+                    for folder in settings.BACKFILL_FOLDERS:
+                        await self._backfill_folder(db, user, service, folder.upper(), job)
+            job.finish("done")
+            print(f"Backfill done for {job.user_id}: {job.as_dict()}")
+        except Exception as e:
+            print(f"Error in backfill for {job.user_id}: {e}")
+            job.finish("failed", str(e))
+
+    async def _backfill_folder(self, db, user: User, service, folder: str, job: BackfillJob):
+        key = f"BACKFILL:{folder}"
+        checkpoint = await db.get(SyncCheckpoint, (user.id, key))
+        # Stalled for too long: the page token has probably expired, walk again from the top
+        if checkpoint and datetime.utcnow() - (checkpoint.updated_at or checkpoint.started_at).replace(tzinfo=None) > timedelta(hours=settings.SYNC_CHECKPOINT_TTL_HOURS):
+            await db.delete(checkpoint)
+            await db.commit()
+            checkpoint = None
+        if checkpoint:
+            print(f"Backfill: resuming {folder} after message {checkpoint.last_message_id}")
+        else:
+            checkpoint = SyncCheckpoint(user_id=user.id, folder=key, q_filter="", started_at=datetime.utcnow())
+            db.add(checkpoint)
+            await db.commit()
+
+        label_id = 'DRAFT' if folder == 'DRAFTS' else folder
+        pipeline = SyncPipeline(
+            gmail_service, db, user, service, label_id, folder, max_results=sys.maxsize,
+            checkpoint=checkpoint, stop_after_existing=None, record_metrics=False,
+            processed_before=datetime.now(timezone.utc) - timedelta(days=settings.BACKFILL_AI_WINDOW_DAYS)
+        )
+        job.folder = folder
+        job.pipeline = pipeline
+        # New email ids are dropped on purpose: the live sync schedules the AI for recent mail
+        fetched_count, _ = await pipeline.run()
+        job.pipeline = None
+        job.scanned_done += pipeline.scanned
+        job.stored += fetched_count
+
+        if pipeline.metrics.error:
+            # Checkpoint stays: starting the backfill again resumes this folder
+            raise RuntimeError(f"Listing {folder} stopped: {pipeline.metrics.error}")
+        await db.delete(checkpoint)
+        await db.commit()
+
+
+backfill_service = BackfillService()
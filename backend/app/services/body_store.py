@@ -0,0 +1,72 @@
+import zlib
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.models.email import EmailBody
+from app.core.config import settings
+
+
+def compress_body(text: Optional[str]) -> Optional[bytes]:
+    if text is None:
+        return None
+    return zlib.compress(text.encode('utf-8'), settings.BODY_COMPRESSION_LEVEL)
+
+
+def decompress_body(data: Optional[bytes]) -> Optional[str]:
+    if data is None:
+        return None
+    return zlib.decompress(data).decode('utf-8')
+
+
+class EmailBodyStore:
+    """
+    Reads and writes the compressed email_bodies table. Only the detail view and the
+    agent decompress bodies; list views and sync bookkeeping never load them.
+    """
+    async def upsert(self, db: AsyncSession, bodies: list[dict], chunk_size: int = 500):
+        """
+        bodies: dicts with email_id, body_text, body_html (plain strings).
+        Inserts or replaces the compressed row for each email. Does not commit.
+        """
+        for start in range(0, len(bodies), chunk_size):
+            values = [
+                {
+                    "email_id": body["email_id"],
+                    "body_text": compress_body(body.get("body_text")),
+                    "body_html": compress_body(body.get("body_html")),
+                }
+                for body in bodies[start:start + chunk_size]
+            ]
+            stmt = pg_insert(EmailBody).values(values)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[EmailBody.email_id],
+                set_={"body_text": stmt.excluded.body_text, "body_html": stmt.excluded.body_html}
+            )
+            await db.execute(stmt)
+
+    async def get_many(self, db: AsyncSession, email_ids: list) -> dict:
+        """
+        Returns dict: email_id -> (body_text, body_html), decompressed.
+        Emails without a stored body (metadata-only, not hydrated) are absent.
+        """
+        if not email_ids:
+            return {}
+        result = await db.execute(
+            select(EmailBody.email_id, EmailBody.body_text, EmailBody.body_html)
+            .filter(EmailBody.email_id.in_(email_ids))
+        )
+        return {
+            row.email_id: (decompress_body(row.body_text), decompress_body(row.body_html))
+            for row in result.all()
+        }
+
+    async def get(self, db: AsyncSession, email_id) -> tuple:
+        """
+        Returns (body_text, body_html) for one email, (None, None) if not stored.
+        """
+        bodies = await self.get_many(db, [email_id])
+        return next(iter(bodies.values()), (None, None))
+
+
+body_store = EmailBodyStore()
@@ -1,26 +1,20 @@
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
 from app.models.user import User
-from app.core.config import settings
 from datetime import datetime, timedelta
+from app.services.google_client import run_google_call, execute_async, google_service_cache
 
 class CalendarService:
     def build_service(self, user: User):
-        creds = Credentials(
-            token=user.google_access_token,
-            refresh_token=user.google_refresh_token,
-            token_uri="https://oauth2.googleapis.com/token",
-            client_id=settings.GOOGLE_CLIENT_ID,
-            client_secret=settings.GOOGLE_CLIENT_SECRET,
-        )
-        return build('calendar', 'v3', credentials=creds)
+        """
+        Returns the user's cached Calendar API service (built from stored tokens on a miss).
+        """
+        return google_service_cache.get(user, 'calendar', 'v3')
 
-    def create_event(self, user: User, title: str, start_time: str, end_time: str = None, description: str = None):
+    async def create_event(self, user: User, title: str, start_time: str, end_time: str = None, description: str = None):
         """
         Creates an event in the user's primary calendar.
         start_time and end_time should be ISO format strings.
         """
-        service = self.build_service(user)
+        service = await run_google_call(self.build_service, user)
         
         # Default end time to 1 hour after start if not provided
         if not end_time:
@@ -49,7 +43,7 @@ class CalendarService:
         }
 
         try:
-            event = service.events().insert(calendarId='primary', body=event_body).execute()
+            event = await execute_async(service.events().insert(calendarId='primary', body=event_body))
             print(f"Event created: {event.get('htmlLink')}")
             return event
         except Exception as e:
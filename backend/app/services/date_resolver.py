@@ -0,0 +1,278 @@
+import calendar
+import re
+from datetime import datetime, timedelta
+from collections import OrderedDict
+from typing import Optional
+from app.core.config import settings
+
+# Leading words the LLM copies along with the date ("due Friday", "before 14 March")
+_PREFIX_RE = re.compile(r"^(before|by|on|due date|due|until)\s+")
+
+_WEEKDAYS = {name: i for i, names in enumerate([
+    ("monday", "mon"), ("tuesday", "tue", "tues"), ("wednesday", "wed"), ("thursday", "thu", "thur", "thurs"),
+    ("friday", "fri"), ("saturday", "sat"), ("sunday", "sun"),
+]) for name in names}
+_MONTHS = {name: i + 1 for i, names in enumerate([
+    ("january", "jan"), ("february", "feb"), ("march", "mar"), ("april", "apr"), ("may",), ("june", "jun"),
+    ("july", "jul"), ("august", "aug"), ("september", "sep", "sept"), ("october", "oct"), ("november", "nov"), ("december", "dec"),
+]) for name in names}
+
+_WEEKDAY = "(?P<weekday>" + "|".join(sorted(_WEEKDAYS, key=len, reverse=True)) + ")"
+_MONTH = "(?P<month>" + "|".join(sorted(_MONTHS, key=len, reverse=True)) + r")\.?"
+_DAY = r"(?P<day>\d{1,2})(st|nd|rd|th)?"
+_YEAR = r"(,?\s*(?P<year>\d{4}))?"
+# Times need am/pm or minutes: a bare "at 10" is left to dateparser
+_TIME = r"(?P<hour>\d{1,2})(:(?P<minute>\d{2}))?\s*(?P<ampm>am|pm)|(?P<hour24>\d{1,2}):(?P<minute24>\d{2})"
+
+_DATE_FORMS = [
+    ("relative", re.compile(r"(?P<relative>today|tomorrow)")),
+    ("next_week_weekday", re.compile(r"next week " + _WEEKDAY)),
+    ("next_weekday", re.compile(r"next " + _WEEKDAY)),
+    ("weekday", re.compile(_WEEKDAY)),
+    ("iso", re.compile(r"(?P<y>\d{4})-(?P<m>\d{1,2})-(?P<d>\d{1,2})")),
+    ("numeric", re.compile(r"(?P<a>\d{1,2})/(?P<b>\d{1,2})/(?P<y>\d{4})")),
+    ("month_day", re.compile(_MONTH + r"\s+" + _DAY + _YEAR)),
+    ("day_month", re.compile(_DAY + r"\s+(of\s+)?" + _MONTH + _YEAR)),
+]
+_SPLIT_RE = re.compile(r"^(?P<date>.+?)(\s*,?\s+(at\s+)?(?P<time>" + _TIME.replace("?P<", "?P<t_") + r"))?$")
+
+
+def normalize_date_text(date_text) -> str:
+    if isinstance(date_text, list):
+        date_text = " ".join(date_text)
+    return re.sub(r"\s+", " ", (date_text or "").lower()).strip(" .,;:!")
+
+
+def _time(match: re.Match, prefix: str = "t_") -> Optional[tuple]:
+    group = lambda name: match.group(prefix + name)
+    if group("hour24") is not None:
+        hour, minute = int(group("hour24")), int(group("minute24"))
+    else:
+        hour, minute = int(group("hour")), int(group("minute") or 0)
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if group("ampm") == "pm" else 0)
+    if hour > 23 or minute > 59:
+        return None
+    return hour, minute
+
+
+def _date(kind: str, match: re.Match, base: datetime, hm: Optional[tuple]) -> Optional[datetime]:
+    """
+    One date form (+ optional (hour, minute)), with dateparser's semantics under
+    PREFER_DATES_FROM=future: naive wall time of the base, "today"/"tomorrow" keep
+    the base time, weekdays are strictly after today, dates without a year roll
+    over to next year once they are past.
+    """
+    at = (lambda d: d.replace(hour=hm[0], minute=hm[1], second=0, microsecond=0)) if hm else (lambda d: d)
+    midnight = base.replace(hour=0, minute=0, second=0, microsecond=0)
+    if kind == "relative":
+        return at(base + timedelta(days=1 if match.group("relative") == "tomorrow" else 0))
+    if kind in ("weekday", "next_weekday", "next_week_weekday"):
+        days = (_WEEKDAYS[match.group("weekday")] - base.weekday()) % 7 or 7
+        # "next friday" / "next week friday": the agent's historical +7 days rule
+        return at(midnight + timedelta(days=days + (0 if kind == "weekday" else 7)))
+    try:
+        if kind == "iso":
+            return at(datetime(int(match.group("y")), int(match.group("m")), int(match.group("d"))))
+        if kind == "numeric":
+            a, b, year = int(match.group("a")), int(match.group("b")), int(match.group("y"))
+            # Month first, like dateparser's default; day first when that is the only valid reading
+            return at(datetime(year, a, b) if a <= 12 else datetime(year, b, a))
+        year = match.group("year")
+        candidate = at(datetime(int(year) if year else base.year, _MONTHS[match.group("month")], int(match.group("day"))))
+        if not year and candidate < base:
+            candidate = candidate.replace(year=base.year + 1)
+    except ValueError:
+        return None
+    return candidate
+
+
+def fast_resolve(text: str, received_at: datetime) -> Optional[datetime]:
+    """
+    Compiled-regex fast path for the common forms (weekdays, today/tomorrow,
+    next [week] <weekday>, ISO / numeric / month-name dates, optional time, and
+    the end of month / weekend rules). None means "not handled here".
+    """
+    text = _PREFIX_RE.sub("", text)
+
+    # Manual rules of the agent: computed on received_at itself (time and tz kept)
+    if text == "end of this month":
+        return received_at.replace(day=calendar.monthrange(received_at.year, received_at.month)[1])
+    if text == "end of next month":
+        year, month = (received_at.year + 1, 1) if received_at.month == 12 else (received_at.year, received_at.month + 1)
+        return received_at.replace(year=year, month=month, day=calendar.monthrange(year, month)[1])
+    if text == "end of weekend":
+        return received_at + timedelta(days=(6 - received_at.weekday()) or 7)
+    if text in ("weekend", "this weekend"):
+        friday = received_at + timedelta(days=(4 - received_at.weekday()) if received_at.weekday() < 4 else (11 - received_at.weekday()))
+        return friday.replace(hour=23, minute=59, second=59)
+
+    split = _SPLIT_RE.match(text)
+    if not split:
+        return None
+    date_text = split.group("date")
+    base = received_at.replace(tzinfo=None)
+    hm = None
+    if split.group("time") is not None:
+        hm = _time(split)
+        if hm is None:
+            return None
+    for kind, pattern in _DATE_FORMS:
+        match = pattern.fullmatch(date_text)
+        if match:
+            return _date(kind, match, base, hm)
+    return None
+
+
+def _parse(text: str, received_at: datetime) -> Optional[datetime]:
+    # Imported on the first slow-path parse: ~0.35s that most runs never pay
+    import dateparser
+    return dateparser.parse(text, settings={'RELATIVE_BASE': received_at, 'PREFER_DATES_FROM': 'future'})
+
+
+def dateparser_resolve(text: str, received_at: datetime) -> Optional[datetime]:
+    """
+    The agent's original resolution loop (prefix stripping + dateparser + manual
+    fallbacks). Unmemoized: resolve_date goes through dateparser_memo.
+    """
+    for prefix in ["", "before ", "by ", "on ", "due ", "due date ", "until "]:
+        # 1. Clean prefix
+        if prefix and prefix not in text:
+            continue
+
+        clean_text = text.replace(prefix, "").strip()
+        if not clean_text:
+            continue
+
+        # 2. Try Direct Parse
+        parsed = _parse(clean_text, received_at)
+        if parsed:
+            return parsed
+
+        # 3. Manual Fallbacks on CLEANED text
+
+        # "next week [day]" -> [day] + 7 days
+        if "next week" in clean_text:
+            base_day = _parse(clean_text.replace("next week", "").strip(), received_at)
+            if base_day:
+                return base_day + timedelta(days=7)
+
+        # "end of this month"
+        if "end of this month" in clean_text:
+            last_day = calendar.monthrange(received_at.year, received_at.month)[1]
+            return received_at.replace(day=last_day)
+
+        # "end of next month"
+        if "end of next month" in clean_text:
+            if received_at.month == 12:
+                nm_year = received_at.year + 1
+                nm_month = 1
+            else:
+                nm_year = received_at.year
+                nm_month = received_at.month + 1
+            last_day = calendar.monthrange(nm_year, nm_month)[1]
+            return received_at.replace(year=nm_year, month=nm_month, day=last_day)
+
+        # "end of weekend"
+        if "end of weekend" in clean_text:
+            days_ahead = 6 - received_at.weekday()
+            if days_ahead <= 0: days_ahead += 7
+            return received_at + timedelta(days=days_ahead)
+
+        # Manual Fix for "weekend" -> Upcoming Friday
+        if "weekend" in clean_text:
+            # Find next Friday (weekday 4)
+            # Current weekday: Mon=0, Sun=6
+            days_ahead = 4 - received_at.weekday()
+            if days_ahead <= 0: # If today is Friday, Saturday, Sunday -> Next Friday
+                days_ahead += 7
+            resolved_date = received_at + timedelta(days=days_ahead)
+            # Set to end of day (23:59:59) roughly implies "night"
+            return resolved_date.replace(hour=23, minute=59, second=59)
+
+        # "next [day]" fallback (must be last manual check to avoid clashing with next week)
+        if "next " in clean_text:
+            base_day = _parse(clean_text.replace("next ", "").strip(), received_at)
+            if base_day:
+                return base_day + timedelta(days=7)
+    return None
+
+
+class DateparserMemo:
+    """
+    LRU memo of dateparser_resolve keyed on (text, received_at date, tz) rather than
+    the exact timestamp, which no two emails share. What is stored depends on how
+    the answer used the base's time of day:
+
+    - no time of day in the result ("14 march", "friday" -> midnight): the result
+      itself, valid for any base on that date
+    - the base's own minutes/seconds carried over ("tomorrow", "in 3 hours",
+      "next month"): the offset from the base, re-applied to each email
+    - anything else ("10am" rolls over depending on the base time): keyed on the
+      exact base, like before
+    """
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # key -> ("at", datetime | None) | ("offset", timedelta)
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key, received_at: datetime):
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        self._entries.move_to_end(key)
+        kind, value = entry
+        return True, (received_at + value if kind == "offset" else value)
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def resolve(self, text: str, received_at: datetime) -> Optional[datetime]:
+        day_key = (text, received_at.date(), received_at.tzinfo)
+        for key in (day_key, (text, received_at)):
+            found, resolved = self._lookup(key, received_at)
+            if found:
+                self.hits += 1
+                return resolved
+        self.misses += 1
+
+        resolved = dateparser_resolve(text, received_at)
+        # Seconds tell the cases apart, so a base on a whole minute is never generalised
+        seconds = (received_at.second, received_at.microsecond)
+        if resolved is None:
+            self._store(day_key, ("at", None))
+        elif seconds == (0, 0):
+            self._store((text, received_at), ("at", resolved))
+        elif resolved.time() == datetime.min.time():
+            self._store(day_key, ("at", resolved))
+        elif (resolved.minute, resolved.second, resolved.microsecond) == (received_at.minute, *seconds) and resolved.tzinfo == received_at.tzinfo:
+            self._store(day_key, ("offset", resolved - received_at))
+        else:
+            self._store((text, received_at), ("at", resolved))
+        return resolved
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = self.misses = 0
+
+
+dateparser_memo = DateparserMemo(max_entries=settings.DATE_RESOLVER_CACHE_SIZE)
+
+
+def resolve_date(date_text, received_at: datetime) -> Optional[datetime]:
+    """
+    Resolves the LLM's date_text against the email's received_at: regex fast path
+    first, the memoized dateparser loop for everything else.
+    """
+    text = normalize_date_text(date_text)
+    if not text:
+        return None
+    resolved = fast_resolve(text, received_at)
+    if resolved is not None:
+        return resolved
+    return dateparser_memo.resolve(text, received_at)
@@ -0,0 +1,256 @@
+import asyncio
+import contextlib
+import contextvars
+import random
+import threading
+import time
+from collections import Counter, OrderedDict
+from app.core.config import settings
+from app.services.google_client import run_google_call
+
+# Gmail API quota units per call (https://developers.google.com/gmail/api/reference/quota)
+GMAIL_QUOTA_UNITS = {
+    'getProfile': 1,
+    'history.list': 2,
+    'messages.list': 5,
+    'messages.get': 5,
+    'messages.attachments.get': 5,
+    'messages.modify': 5,
+    'messages.send': 100,
+}
+
+_current_report = contextvars.ContextVar("gmail_quota_report", default=None)
+
+
+def is_rate_limited(exception) -> bool:
+    """
+    True for errors worth retrying: 429, 5xx, 403 rateLimitExceeded /
+    userRateLimitExceeded and dropped connections.
+    """
+    if isinstance(exception, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(getattr(exception, 'resp', None), 'status', None)
+    if status == 429 or (status and status >= 500):
+        return True
+    return status == 403 and 'ratelimitexceeded' in str(exception).lower()
+
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Exponential backoff with jitter (50-100% of 2^attempt seconds, capped).
+    """
+    return min(2 ** attempt, settings.GMAIL_BACKOFF_MAX_SECONDS) * (0.5 + random.random() / 2)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. reserve() takes the units immediately (the balance
+    may go negative) and returns how long the caller must wait before using them,
+    so concurrent callers queue up fairly instead of polling.
+    """
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, units: float) -> float:
+        with self._lock:
+            self._refill()
+            self.tokens -= units
+            return max(0.0, -self.tokens / self.rate)
+
+    def pause(self, seconds: float):
+        # Server said slow down: push every caller of this bucket back
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.tokens, -self.rate * seconds)
+
+
+class QuotaReport:
+    """
+    Quota used by one sync (or other tracked operation) for one user.
+    """
+    def __init__(self, user_id: str, low_priority: bool = False):
+        self.user_id = user_id
+        self.low_priority = low_priority
+        self.units = Counter() # method -> quota units
+        self.calls = Counter() # method -> API calls (batch sub-requests count individually)
+        self.throttled = 0
+        self.wait_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, method: str, count: int, units: int, waited: float):
+        with self._lock:
+            self.units[method] += units
+            self.calls[method] += count
+            self.wait_seconds += waited
+
+    def add_throttle(self, delay: float):
+        with self._lock:
+            self.throttled += 1
+            self.wait_seconds += delay
+
+    def as_dict(self) -> dict:
+        return {
+            "units": sum(self.units.values()),
+            "units_by_method": dict(self.units),
+            "calls_by_method": dict(self.calls),
+            "throttled": self.throttled,
+            "wait_seconds": round(self.wait_seconds, 3),
+        }
+
+
+class GmailQuota:
+    """
+    Per-user and global (per-project) token buckets in Gmail quota units.
+
+    Gmail calls acquire their units before executing; the user is taken from the
+    active track() context, so syncs don't have to thread it through every helper.
+    Outside track() only the global bucket applies.
+
+    Low-priority work (the mailbox backfill) is additionally capped at
+    low_priority_share of the user's rate and waits while a live sync of the
+    same user is running.
+    """
+    def __init__(self, user_rate: float, user_burst: float, global_rate: float, low_priority_share: float = 0.5, max_users: int = 1024):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.low_priority_share = low_priority_share
+        self.max_users = max_users
+        self._global = TokenBucket(global_rate, global_rate)
+        self._users = OrderedDict() # user_id (or "user_id:low") -> TokenBucket
+        self._live = Counter() # user_id -> running normal-priority blocks
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def track(self, user_id, low_priority: bool = False):
+        """
+        Attributes Gmail calls made inside the block (including on the Google API
+        threads) to user_id and yields their QuotaReport. Nested blocks for the same
+        user share the outer report.
+        """
+        user_id = str(user_id)
+        report = _current_report.get()
+        if report is not None and report.user_id == user_id:
+            yield report
+            return
+        report = QuotaReport(user_id, low_priority)
+        token = _current_report.set(report)
+        if not low_priority:
+            with self._lock:
+                self._live[user_id] += 1
+        try:
+            yield report
+        finally:
+            _current_report.reset(token)
+            if not low_priority:
+                with self._lock:
+                    self._live[user_id] -= 1
+                    if self._live[user_id] <= 0:
+                        del self._live[user_id]
+
+    def _user_bucket(self, key: str, rate: float) -> TokenBucket:
+        with self._lock:
+            bucket = self._users.get(key)
+            if bucket is None:
+                bucket = TokenBucket(rate, min(self.user_burst, rate))
+                self._users[key] = bucket
+            self._users.move_to_end(key)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+            return bucket
+
+    def _should_yield(self) -> bool:
+        # Low-priority callers back off while the user has a live sync running
+        report = _current_report.get()
+        return report is not None and report.low_priority and bool(self._live.get(report.user_id))
+
+    def _reserve(self, method: str, count: int) -> float:
+        units = GMAIL_QUOTA_UNITS.get(method, 5) * count
+        wait = self._global.reserve(units)
+        report = _current_report.get()
+        if report is not None:
+            wait = max(wait, self._user_bucket(report.user_id, self.user_rate).reserve(units))
+            if report.low_priority:
+                low = self._user_bucket(f"{report.user_id}:low", self.user_rate * self.low_priority_share)
+                wait = max(wait, low.reserve(units))
+            report.add(method, count, units, wait)
+        return wait
+
+    def _throttle(self, delay: float):
+        report = _current_report.get()
+        if report is not None:
+            self._user_bucket(report.user_id, self.user_rate).pause(delay)
+            report.add_throttle(delay)
+
+    async def acquire(self, method: str, count: int = 1):
+        while self._should_yield():
+            await asyncio.sleep(0.5)
+        wait = self._reserve(method, count)
+        if wait:
+            await asyncio.sleep(wait)
+
+    def acquire_blocking(self, method: str, count: int = 1):
+        while self._should_yield():
+            time.sleep(0.5)
+        wait = self._reserve(method, count)
+        if wait:
+            time.sleep(wait)
+
+    async def throttle(self, delay: float):
+        """
+        Backs off after a rate-limit response. Later calls for the same user wait too.
+        """
+        self._throttle(delay)
+        await asyncio.sleep(delay)
+
+    async def execute(self, request, method: str):
+        """
+        Awaitable request.execute() that respects the quota buckets and retries
+        429 / 5xx / rate-limit 403s with jittered exponential backoff.
+        """
+        attempt = 0
+        while True:
+            await self.acquire(method)
+            try:
+                return await run_google_call(request.execute)
+            except Exception as e:
+                attempt += 1
+                if not is_rate_limited(e) or attempt > settings.GMAIL_RATE_LIMIT_MAX_RETRIES:
+                    raise
+                delay = backoff_delay(attempt)
+                print(f"DEBUG: Gmail {method} rate limited ({e}). Retry {attempt} in {delay:.1f}s")
+                await self.throttle(delay)
+
+    def execute_blocking(self, request, method: str):
+        """
+        Same as execute() for code already running on a Google API thread.
+        """
+        attempt = 0
+        while True:
+            self.acquire_blocking(method)
+            try:
+                return request.execute()
+            except Exception as e:
+                attempt += 1
+                if not is_rate_limited(e) or attempt > settings.GMAIL_RATE_LIMIT_MAX_RETRIES:
+                    raise
+                delay = backoff_delay(attempt)
+                print(f"DEBUG: Gmail {method} rate limited ({e}). Retry {attempt} in {delay:.1f}s")
+                self._throttle(delay)
+                time.sleep(delay)
+
+
+gmail_quota = GmailQuota(
+    user_rate=settings.GMAIL_USER_QUOTA_PER_SECOND,
+    user_burst=settings.GMAIL_USER_QUOTA_BURST,
+    global_rate=settings.GMAIL_GLOBAL_QUOTA_PER_SECOND,
+    low_priority_share=settings.BACKFILL_QUOTA_SHARE,
+)
@@ -1,35 +1,310 @@
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from datetime import datetime
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from datetime import datetime, timedelta
+import asyncio
 import base64
 from app.models.user import User
-from app.models.email import Email
+from app.models.email import Email, EmailBody
+from app.models.sync_checkpoint import SyncCheckpoint
 from app.core.config import settings
 from app.services.agent_service import agent_service
 from app.core.database import SessionLocal # For background tasks
+from app.services.google_client import run_google_call, execute_async, google_service_cache
+from app.services.sync_pipeline import SyncPipeline, sync_metrics
+from app.services.gmail_quota import gmail_quota, backoff_delay
+from app.services.pdf_extractor import pdf_extractor
+from app.services.attachment_cache import attachment_cache
+from app.services.mime_parser import extract_mime_content
+from app.services.body_store import body_store
+from app.services.triage_service import triage_classifier, normalize_sender
+from app.services.prompt_compactor import compact_email
+from app.services.sender_events import SenderEvents, ContextEvent
+
+# Headers stored by the metadata-first sync (format='metadata')
+METADATA_HEADERS = ['Subject', 'From', 'To', 'Date']
 
 class GmailService:
     def build_service(self, user: User):
         """
-        Reconstructs the Gmail API service using stored tokens.
+        Returns the user's cached Gmail API service (built from stored tokens on a miss).
+        """
+        return google_service_cache.get(user, 'gmail', 'v1')
+
+    async def batch_get_messages(self, service, message_ids: list[str], format: str = 'full') -> tuple[dict, list[str]]:
+        """
+        Fetches message details through Gmail's batch endpoint (up to 100 sub-requests per HTTP call).
+        Sub-requests that fail with a retryable error are re-batched on their own with backoff.
+        Returns tuple: (dict message_id -> message resource, ids still failing after
+        GMAIL_BATCH_MAX_RETRIES). Ids in neither are gone for good (400 / 404).
+        """
+        results = {}
+        pending = list(dict.fromkeys(message_ids))
+        batch_size = max(1, min(settings.GMAIL_BATCH_SIZE, 100))
+        attempt = 0
+
+        while pending:
+            failed = []
+
+            def on_response(request_id, response, exception):
+                if exception is None:
+                    results[request_id] = response
+                    return
+                status = getattr(getattr(exception, 'resp', None), 'status', None)
+                if status in (400, 404):
+                    # Deleted or invalid message - retrying will not help
+                    print(f"DEBUG: Skipping {request_id}: {exception}")
+                else:
+                    failed.append(request_id)
+
+            for start in range(0, len(pending), batch_size):
+                chunk = pending[start:start + batch_size]
+                batch = service.new_batch_http_request(callback=on_response)
+                for message_id in chunk:
+                    batch.add(
+                        self._get_request(service, message_id, format),
+                        request_id=message_id
+                    )
+                try:
+                    await gmail_quota.acquire('messages.get', len(chunk))
+                    await run_google_call(batch.execute)
+                except Exception as e:
+                    # Whole HTTP call failed: every unanswered sub-request gets retried
+                    print(f"Error executing Gmail batch: {e}")
+                    failed.extend(m for m in chunk if m not in results and m not in failed)
+
+            if not failed:
+                break
+            attempt += 1
+            if attempt > settings.GMAIL_BATCH_MAX_RETRIES:
+                print(f"DEBUG: Giving up on {len(failed)} messages after {attempt - 1} retries")
+                return results, failed
+
+            # Exponential backoff with jitter before retrying only the failed ids
+            delay = backoff_delay(attempt)
+            print(f"DEBUG: Retrying {len(failed)} failed batch sub-requests in {delay:.1f}s")
+            await gmail_quota.throttle(delay)
+            pending = failed
+
+        return results, []
+
+    def _get_request(self, service, message_id: str, format: str = 'full'):
+        if format == 'metadata':
+            # Only the headers the list view needs; no body or attachment data
+            return service.users().messages().get(
+                userId='me', id=message_id, format='metadata', metadataHeaders=METADATA_HEADERS
+            )
+        return service.users().messages().get(userId='me', id=message_id, format=format)
+
+    def parse_message(self, service, msg_detail: dict, metadata_only: bool = False) -> dict:
+        """
+        Extracts headers, body text/html (incl. relevant PDF attachments) and labels
+        from a Gmail message resource. Returns a dict of Email column values.
+        For format='metadata' resources (metadata_only) the body falls back to the
+        snippet and body_fetched stays False until the email is hydrated.
+        Blocking (may download attachments): call it through run_google_call.
+        """
+        payload = msg_detail.get('payload', {})
+        headers = payload.get('headers', [])
+        
+        subject = next((h['value'] for h in headers if h['name'] == 'Subject'), "") or "(No Subject)"
+        sender = next((h['value'] for h in headers if h['name'] == 'From'), "Unknown")
+        recipient = next((h['value'] for h in headers if h['name'] == 'To'), "Unknown")
+        date_str = next((h['value'] for h in headers if h['name'] == 'Date'), None)
+        
+        # Helper to extract PDF text
+        def extract_pdf_from_attachment(msg_id, attachment_id, size=None):
+            # Gmail reports the attachment size up front: skip huge PDFs without downloading them
+            if size and size > settings.PDF_MAX_BYTES:
+                print(f"DEBUG: Skipping PDF ({size} bytes > PDF_MAX_BYTES)")
+                return ""
+            try:
+                # Same attachment seen before (re-sync / hydration): no download, no parse
+                text = attachment_cache.get_by_ref(attachment_id, size)
+                if text is None:
+                    att = gmail_quota.execute_blocking(
+                        service.users().messages().attachments().get(userId='me', messageId=msg_id, id=attachment_id),
+                        'messages.attachments.get'
+                    )
+                    data = att.get('data')
+                    if not data:
+                        return ""
+                    file_data = base64.urlsafe_b64decode(data)
+                    content_hash = attachment_cache.hash_bytes(file_data)
+                    # Same bytes seen before (e.g. a circular mailed to many users): no parse
+                    text = attachment_cache.get_by_hash(content_hash)
+                    if text is None:
+                        # Parsed in the PDF worker processes (page/size/time capped)
+                        text = pdf_extractor.extract_text(file_data)
+                        if text is None:
+                            # Timed out / worker failure: not cached, the next sync tries again
+                            return ""
+                    attachment_cache.put(content_hash, text, attachment_id, size)
+                if text.strip():
+                    return f"\n\n[Attachment PDF Content]:\n{text}"
+            except Exception as e:
+                print(f"Error parsing PDF attachment: {e}")
+                return ""
+            return ""
+
+        # Body extraction: one pass over the MIME tree (charset-aware, size/depth capped)
+        content = extract_mime_content(payload)
+        body_text = content.text or msg_detail.get('snippet', '')
+        body_html = content.html
+
+        pdf_parts = [
+            a for a in content.attachments
+            if a.mime_type == 'application/pdf' or a.filename.lower().endswith('.pdf')
+        ]
+        if pdf_parts:
+            # Optimization: Only fetch PDF if the body hints at it (prevent waste)
+            # Check the *snippet* and the body text
+            current_context = (msg_detail.get('snippet', '') + content.text).lower()
+            keywords = ["attach", "schedule", "timetable", "exam", "syllabus", "pdf", "file", "find enclosed", "shared"]
+
+            if any(k in current_context for k in keywords):
+                print(f"DEBUG: Context implies useful PDF ('{next((k for k in keywords if k in current_context), '')}'). Downloading...")
+                pieces = [body_text]
+                for attachment in pdf_parts:
+                    pieces.append(extract_pdf_from_attachment(msg_detail['id'], attachment.attachment_id, attachment.size))
+                body_text = "".join(pieces)
+            else:
+                print(f"DEBUG: Skipping PDF (No context keywords found in body).")
+
+        from email.utils import parsedate_to_datetime
+
+        # Parse date using email.utils
+        received_at = datetime.utcnow() # Default fallback
+        if date_str:
+            try:
+                received_at = parsedate_to_datetime(date_str)
+            except Exception as e:
+                print(f"Error parsing date {date_str}: {e}")
+
+        return {
+            "subject": subject,
+            "sender": sender,
+            "recipient": recipient,
+            "body_text": body_text,
+            "body_html": body_html,
+            "snippet": msg_detail.get('snippet'),
+            "received_at": received_at,
+            "label_ids": ",".join(msg_detail.get('labelIds', [])),
+            "body_fetched": not metadata_only,
+        }
+
+    async def get_existing_emails(self, db: AsyncSession, message_ids: list[str]) -> dict:
+        """
+        Resolves which Gmail message ids are already stored, in a single IN (...) query.
+        Returns dict: message_id -> row (id, message_id, is_processed, has_html, body_fetched).
         """
-        creds = Credentials(
-            token=user.google_access_token,
-            refresh_token=user.google_refresh_token,
-            token_uri="https://oauth2.googleapis.com/token",
-            client_id=settings.GOOGLE_CLIENT_ID,
-            client_secret=settings.GOOGLE_CLIENT_SECRET,
+        if not message_ids:
+            return {}
+        result = await db.execute(
+            select(Email.id, Email.message_id, Email.is_processed, EmailBody.body_html.isnot(None).label("has_html"), Email.body_fetched)
+            .outerjoin(EmailBody, EmailBody.email_id == Email.id)
+            .filter(Email.message_id.in_(message_ids))
         )
-        return build('gmail', 'v1', credentials=creds)
+        return {row.message_id: row for row in result.all()}
+
+    async def upsert_emails(self, db: AsyncSession, rows: list[dict], chunk_size: int = 500, update_bodies: bool = True) -> list:
+        """
+        Writes parsed emails with INSERT ... ON CONFLICT (message_id) DO UPDATE, then
+        their bodies (compressed) into email_bodies.
+        Conflicting rows only get their body refreshed; with update_bodies=False
+        (metadata-only rows) they are left untouched.
+        Returns list of (id, message_id, is_processed) for every written row.
+        """
+        written = []
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            email_rows = [
+                {k: v for k, v in row.items() if k not in ("body_text", "body_html")}
+                for row in chunk
+            ]
+            stmt = pg_insert(Email).values(email_rows)
+            if update_bodies:
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[Email.message_id],
+                    set_={"body_fetched": stmt.excluded.body_fetched}
+                )
+            else:
+                stmt = stmt.on_conflict_do_nothing(index_elements=[Email.message_id])
+            result = await db.execute(stmt.returning(Email.id, Email.message_id, Email.is_processed))
+            chunk_written = [tuple(row) for row in result.all()]
+            written.extend(chunk_written)
+
+            # Metadata-only rows have no body yet: it is written on hydration
+            ids = {message_id: email_id for email_id, message_id, _ in chunk_written}
+            await body_store.upsert(db, [
+                {"email_id": ids[row["message_id"]], "body_text": row.get("body_text"), "body_html": row.get("body_html")}
+                for row in chunk
+                if row.get("body_fetched", True) and row["message_id"] in ids
+            ])
+        return written
+
+    async def hydrate_emails(self, db: AsyncSession, user: User, emails: list[Email]) -> int:
+        """
+        Downloads and stores full bodies for emails synced metadata-only.
+        One batch call for all of them. Returns the number of emails hydrated.
+        """
+        pending = {e.message_id: e for e in emails if not e.body_fetched}
+        if not pending:
+            return 0
+
+        service = await run_google_call(self.build_service, user)
+        bodies = []
+        with gmail_quota.track(user.id):
+            # Ids that keep failing stay unhydrated and are tried again on the next open
+            details, _ = await self.batch_get_messages(service, list(pending), format='full')
+            for message_id, msg_detail in details.items():
+                try:
+                    parsed = await run_google_call(self.parse_message, service, msg_detail)
+                except Exception as e:
+                    print(f"Error hydrating {message_id}: {e}")
+                    continue
+                email_obj = pending[message_id]
+                bodies.append({"email_id": email_obj.id, "body_text": parsed["body_text"], "body_html": parsed["body_html"]})
+                email_obj.body_fetched = True
+        hydrated = len(bodies)
+
+        await body_store.upsert(db, bodies)
+        await db.commit()
+        print(f"DEBUG: Hydrated {hydrated}/{len(pending)} email bodies")
+        return hydrated
+
+    async def sync(self, db: AsyncSession, user: User, max_results: int = 50, folder: str = "INBOX", metadata_only: bool = False):
+        """
+        Entry point for /sync. Uses the historyId delta sync when the user has a stored
+        cursor, otherwise (or when the cursor has expired) a label listing sync.
+        metadata_only stores headers/snippet/labels only; bodies are hydrated on open.
+        Returns tuple: (fetched_count, list_of_new_email_ids)
+        """
+        user_key = str(user.id)
+        sync_metrics.pop(user_key, None) # Refilled by this run's pipeline
+        with gmail_quota.track(user.id) as quota:
+            try:
+                if folder.upper() == 'INBOX' and user.gmail_history_id:
+                    result = await self.sync_history(db, user, metadata_only=metadata_only)
+                    if result is not None:
+                        return result
+                    print("DEBUG: historyId expired. Falling back to full resync.")
+                    return await self.fetch_emails(db, user, max_results=max_results, folder=folder, full_resync=True, metadata_only=metadata_only)
 
-    async def fetch_emails(self, db: AsyncSession, user: User, max_results: int = 50, folder: str = "INBOX"):
+                return await self.fetch_emails(db, user, max_results=max_results, folder=folder, metadata_only=metadata_only)
+            finally:
+                sync_metrics.setdefault(user_key, {})["quota"] = quota.as_dict()
+                print(f"DEBUG: Gmail quota used by sync: {sync_metrics[user_key]['quota']}")
+
+    async def fetch_emails(self, db: AsyncSession, user: User, max_results: int = 50, folder: str = "INBOX", full_resync: bool = False, metadata_only: bool = False):
         """
         Fetches emails from Gmail and saves them to the database.
+        full_resync ignores the after:timestamp cursor (used when the historyId has expired).
+        metadata_only fetches format='metadata' (no bodies or attachments).
+        Progress is checkpointed with every batch; an interrupted run resumes where it stopped.
         Returns tuple: (fetched_count, list_of_new_email_ids)
         """
-        service = self.build_service(user)
+        service = await run_google_call(self.build_service, user)
         
         # Map folder to Gmail Label ID
         label_id = 'INBOX'
@@ -40,305 +315,367 @@ class GmailService:
         elif folder.lower() == 'starred':
             label_id = 'STARRED'
         
-        # List messages (handle pagination)
-        print(f"Fetching {folder} emails for user {user.email} with limit {max_results}...")
-        
-        fetched_count = 0
-        skipped_count = 0
-        page_token = None
-        new_email_ids = []
-        consecutive_existing = 0
-        stop_sync = False
-        
-        while fetched_count < max_results:
-            if stop_sync:
-                break
-            try:
-                # Calculate how many more to fetch in this batch
-                batch_size = min(max_results - fetched_count + skipped_count, 100)
-                if batch_size < 10: batch_size = 10 
-
-                # Optimization: Use 'after:TIMESTAMP' to fetch only new emails
-                q_filter = ""
-                if user.last_synced_at:
-                    # Convert to timestamp (seconds)
-                    ts = int(user.last_synced_at.timestamp())
-                    q_filter = f"after:{ts}"
-                    print(f"DEBUG: Using Sync Cursor -> {q_filter}")
-
-                results = service.users().messages().list(
-                    userId='me', 
-                    maxResults=batch_size, 
-                    labelIds=[label_id],
-                    q=q_filter,
-                    pageToken=page_token
-                ).execute()
-                
-                messages = results.get('messages', [])
-                page_token = results.get('nextPageToken')
-                
-                print(f"DEBUG: Gmail list returned {len(messages)} messages (batch)")
-                
-                if not messages:
-                    break
-                    
-                for msg in messages:
-                    if fetched_count >= max_results:
-                        break
-                        
-                    # Check if email already exists
-                    result = await db.execute(select(Email).filter(Email.message_id == msg['id']))
-                    existing_email = result.scalars().first()
-                    
-                    if existing_email and existing_email.body_html:
-                        skipped_count += 1
-                        
-                        # Optimization: If we hit 15 existing emails in a row, assume we are fully synced.
-                        # This prevents scanning the entire history looking for "new" count.
-                        consecutive_existing += 1
-                        if consecutive_existing >= 15:
-                            print(f"DEBUG: Found 15 existing emails in a row. Stopping sync at {msg['id']}.")
-                            stop_sync = True
-                            break
-                        continue
-                    
-                    # Reset counter if we found a new one
-                    consecutive_existing = 0
+        # Optimization: Use 'after:TIMESTAMP' to fetch only new emails
+        q_filter = ""
+        if user.last_synced_at and not full_resync:
+            # Convert to timestamp (seconds)
+            ts = int(user.last_synced_at.timestamp())
+            q_filter = f"after:{ts}"
+            print(f"DEBUG: Using Sync Cursor -> {q_filter}")
 
-                    try:
-                        # Fetch full message details
-                        msg_detail = service.users().messages().get(userId='me', id=msg['id'], format='full').execute()
-                        
-                        payload = msg_detail.get('payload', {})
-                        headers = payload.get('headers', [])
-                        
-                        subject = next((h['value'] for h in headers if h['name'] == 'Subject'), "") or "(No Subject)"
-                        sender = next((h['value'] for h in headers if h['name'] == 'From'), "Unknown")
-                        recipient = next((h['value'] for h in headers if h['name'] == 'To'), "Unknown")
-                        date_str = next((h['value'] for h in headers if h['name'] == 'Date'), None)
-                        
-                        # Body extraction
-                        body_text = msg_detail.get('snippet', '')
-                        parts = payload.get('parts', [])
-                        body_html = None
-                        
-                        # Helper to extract PDF text
-                        def extract_pdf_from_attachment(msg_id, attachment_id):
-                            try:
-                                att = service.users().messages().attachments().get(userId='me', messageId=msg_id, id=attachment_id).execute()
-                                data = att.get('data')
-                                if data:
-                                    file_data = base64.urlsafe_b64decode(data)
-                                    import io
-                                    from pypdf import PdfReader
-                                    reader = PdfReader(io.BytesIO(file_data))
-                                    text = ""
-                                    for page in reader.pages:
-                                        text += page.extract_text() + "\n"
-                                    return f"\n\n[Attachment PDF Content]:\n{text}"
-                            except Exception as e:
-                                print(f"Error parsing PDF attachment: {e}")
-                                return ""
-                            return ""
+        # An unfinished earlier run of this same listing resumes from its checkpoint
+        checkpoint = await db.get(SyncCheckpoint, (user.id, folder.upper()))
+        if checkpoint and (
+            checkpoint.q_filter != q_filter
+            or datetime.utcnow() - checkpoint.started_at.replace(tzinfo=None) > timedelta(hours=settings.SYNC_CHECKPOINT_TTL_HOURS)
+        ):
+            print("DEBUG: Discarding stale sync checkpoint")
+            await db.delete(checkpoint)
+            await db.commit()
+            checkpoint = None
 
-                        def get_parts(parts_list):
-                            text = ""
-                            html = None
-                            for part in parts_list:
-                                if part.get('mimeType') == 'text/plain':
-                                    data = part.get('body', {}).get('data')
-                                    if data:
-                                        text += base64.urlsafe_b64decode(data).decode('utf-8')
-                                elif part.get('mimeType') == 'text/html':
-                                    data = part.get('body', {}).get('data')
-                                    if data:
-                                        html = base64.urlsafe_b64decode(data).decode('utf-8')
-                                elif part.get('mimeType') == 'application/pdf':
-                                    # PDF Attachment Found
-                                    att_id = part.get('body', {}).get('attachmentId')
-                                    if att_id:
-                                        # Optimization: Only fetch PDF if the body hints at it (prevent waste)
-                                        # Check the *snippet* or valid body text found so far
-                                        current_context = (body_text + text).lower()
-                                        keywords = ["attach", "schedule", "timetable", "exam", "syllabus", "pdf", "file", "find enclosed", "shared"]
-                                        
-                                        if any(k in current_context for k in keywords):
-                                            print(f"DEBUG: Context implies useful PDF ('{next((k for k in keywords if k in current_context), '')}'). Downloading...")
-                                            pdf_text = extract_pdf_from_attachment(msg['id'], att_id)
-                                            text += pdf_text
-                                        else:
-                                            print(f"DEBUG: Skipping PDF (No context keywords found in body).")
-                                elif part.get('parts'):
-                                    nested_text, nested_html = get_parts(part.get('parts'))
-                                    if nested_text: text += nested_text # Append, don't replace
-                                    if nested_html and not html: html = nested_html
-                            return text, html
-
-                        if parts:
-                            extracted_text, extracted_html = get_parts(parts)
-                            if extracted_text:
-                                body_text = extracted_text
-                            if extracted_html:
-                                body_html = extracted_html
-                        else:
-                            data = payload.get('body', {}).get('data')
-                            if data:
-                                decoded = base64.urlsafe_b64decode(data).decode('utf-8')
-                                if payload.get('mimeType') == 'text/html':
-                                    body_html = decoded
-                                else:
-                                    body_text = decoded
-            
-                        from email.utils import parsedate_to_datetime
-            
-                        # Parse date using email.utils
-                        received_at = datetime.utcnow() # Default fallback
-                        if date_str:
-                            try:
-                                received_at = parsedate_to_datetime(date_str)
-                            except Exception as e:
-                                print(f"Error parsing date {date_str}: {e}")
-                        
-                        # NO AI PROCESSING HERE - Speed only!
-
-                        if existing_email:
-                            existing_email.body_html = body_html
-                            existing_email.body_text = body_text 
-                            # We will re-process with AI in background if needed, but for now just update content
-                            if not existing_email.is_processed:
-                                new_email_ids.append(existing_email.id)
-                        else:
-                            new_email = Email(
-                                user_id=user.id,
-                                message_id=msg['id'],
-                                thread_id=msg['threadId'],
-                                subject=subject,
-                                sender=sender,
-                                recipient=recipient,
-                                body_text=body_text,
-                                body_html=body_html,
-                                snippet=msg_detail.get('snippet'),
-                                received_at=received_at,
-                                folder=folder.upper(),
-                                label_ids=",".join(msg_detail.get('labelIds', [])),
-                                is_processed=False
-                            )
-                            db.add(new_email)
-                            await db.flush() # Get the ID
-                            new_email_ids.append(new_email.id)
-                            fetched_count += 1
-                        
-                    except Exception as e:
-                        print(f"Error processing details for {msg['id']}: {e}")
-                        continue
-                
-                await db.commit() # Commit batch
-                
-                if not page_token:
-                    break
+        resumed = checkpoint is not None
+        if resumed:
+            print(f"DEBUG: Resuming sync from checkpoint (after message {checkpoint.last_message_id})")
+        else:
+            # Snapshot the mailbox historyId BEFORE listing, so changes made during
+            # this sync are replayed by the next history sync instead of being lost.
+            start_history_id = None
+            if label_id == 'INBOX' and (full_resync or not user.gmail_history_id):
+                try:
+                    profile = await gmail_quota.execute(service.users().getProfile(userId='me'), 'getProfile')
+                    start_history_id = profile.get('historyId')
+                except Exception as e:
+                    print(f"Error fetching Gmail profile: {e}")
 
-            except Exception as e:
-                print(f"Error fetching messages: {e}")
-                break
-        
+            checkpoint = SyncCheckpoint(
+                user_id=user.id,
+                folder=folder.upper(),
+                q_filter=q_filter,
+                history_id=str(start_history_id) if start_history_id else None,
+                started_at=datetime.utcnow(),
+            )
+            db.add(checkpoint)
+            await db.commit()
+
+        # List -> fetch -> parse -> write run as a pipeline of bounded queues
+        print(f"Fetching {folder} emails for user {user.email} with limit {max_results}...")
+        # A resumed page can start with many already written messages ahead of the ones
+        # still missing (e.g. left unfetched after retries): no early stop on existing mail
+        pipeline = SyncPipeline(self, db, user, service, label_id, folder, max_results, q_filter, metadata_only=metadata_only, checkpoint=checkpoint, stop_after_existing=None if resumed else 15)
+        fetched_count, new_email_ids = await pipeline.run()
         print(f"DEBUG: Fetched {fetched_count} emails. New/Updated for AI: {len(new_email_ids)}")
+
+        first_sync = not user.last_synced_at
+        if pipeline.metrics.error:
+            # Listing stopped early: keep the checkpoint (committed with the last batch)
+            # and the cursors as they are, so the next /sync picks up from there.
+            print("DEBUG: Sync interrupted. Next sync resumes from the checkpoint.")
+            return fetched_count, [] if first_sync else new_email_ids
+
+        # Completed: move the cursors and drop the checkpoint in one commit
+        if checkpoint.history_id:
+            user.gmail_history_id = checkpoint.history_id
+            print(f"DEBUG: Stored history cursor {user.gmail_history_id}")
         if fetched_count > 0:
+            # The sync start, not its end: mail arriving mid-sync is picked up next time
+            user.last_synced_at = checkpoint.started_at
+        await db.delete(checkpoint)
+        db.add(user)
+        await db.commit()
+
+        if fetched_count > 0 and first_sync:
             # Logic: If this was the FIRST sync (we just set the stamp), 
             # we should NOT return these IDs for AI processing (per optimization request).
             # The user wants "agents will start acting not on the old mails".
-            if not user.last_synced_at:
-                 print("DEBUG: FIRST SYNC DETECTED. Setting Stamp but Skipping AI for these historical emails.")
-                 user.last_synced_at = datetime.utcnow()
-                 db.add(user)
-                 await db.commit()
-                 return fetched_count, []
-            
-            # Normal case: Update stamp
-            user.last_synced_at = datetime.utcnow()
-            db.add(user)
-            await db.commit()
+            print("DEBUG: FIRST SYNC DETECTED. Setting Stamp but Skipping AI for these historical emails.")
+            return fetched_count, []
+        if fetched_count > 0:
             print(f"DEBUG: Updated last_synced_at to {user.last_synced_at}")
 
         return fetched_count, new_email_ids
 
-    async def process_emails_background(self, email_ids: list[str], user_id: str):
+    async def sync_history(self, db: AsyncSession, user: User, metadata_only: bool = False):
+        """
+        Incremental sync using users.history.list from the stored historyId.
+        Applies messagesAdded / messagesDeleted / labelsAdded / labelsRemoved as deltas,
+        so a quiet mailbox costs a single API call.
+        metadata_only fetches added messages with format='metadata' (hydrated on open).
+        Returns tuple: (fetched_count, list_of_new_email_ids), or None if the
+        historyId has expired and a full resync is required.
+        """
+        from googleapiclient.errors import HttpError
+
+        service = await run_google_call(self.build_service, user)
+        print(f"Syncing history for user {user.email} from historyId {user.gmail_history_id}...")
+
+        added = {} # message_id -> message stub (id, threadId, labelIds)
+        deleted = set()
+        label_ops = {} # message_id -> [(op, [labels]), ...] in history order
+        latest_history_id = user.gmail_history_id
+        page_token = None
+
+        while True:
+            try:
+                results = await gmail_quota.execute(service.users().history().list(
+                    userId='me',
+                    startHistoryId=user.gmail_history_id,
+                    historyTypes=['messageAdded', 'messageDeleted', 'labelAdded', 'labelRemoved'],
+                    maxResults=500,
+                    pageToken=page_token
+                ), 'history.list')
+            except HttpError as e:
+                if e.resp.status == 404:
+                    # historyId too old (Gmail keeps roughly a week of history)
+                    user.gmail_history_id = None
+                    db.add(user)
+                    await db.commit()
+                    return None
+                raise
+
+            for record in results.get('history', []):
+                for item in record.get('messagesAdded', []):
+                    msg = item['message']
+                    added[msg['id']] = msg
+                    deleted.discard(msg['id'])
+                for item in record.get('messagesDeleted', []):
+                    msg_id = item['message']['id']
+                    deleted.add(msg_id)
+                    added.pop(msg_id, None)
+                for item in record.get('labelsAdded', []):
+                    label_ops.setdefault(item['message']['id'], []).append(('add', item.get('labelIds', [])))
+                for item in record.get('labelsRemoved', []):
+                    label_ops.setdefault(item['message']['id'], []).append(('remove', item.get('labelIds', [])))
+
+            latest_history_id = results.get('historyId', latest_history_id)
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+
+        print(f"DEBUG: History delta -> {len(added)} added, {len(deleted)} deleted, {len(label_ops)} relabeled")
+
+        # Load every local row touched by the delta in one query
+        touched_ids = set(added) | deleted | set(label_ops)
+        existing = {}
+        if touched_ids:
+            result = await db.execute(select(Email).filter(Email.user_id == user.id, Email.message_id.in_(touched_ids)))
+            existing = {e.message_id: e for e in result.scalars().all()}
+
+        # 1. Deletions
+        for msg_id in deleted:
+            if msg_id in existing:
+                await db.delete(existing.pop(msg_id))
+
+        # 2. Label changes on messages we already have
+        for msg_id, ops in label_ops.items():
+            email_obj = existing.get(msg_id)
+            if not email_obj:
+                continue
+            labels = [l for l in (email_obj.label_ids or "").split(',') if l]
+            for op, label_ids in ops:
+                if op == 'add':
+                    labels.extend(l for l in label_ids if l not in labels)
+                else:
+                    labels = [l for l in labels if l not in label_ids]
+            email_obj.label_ids = ",".join(labels)
+
+        # 3. New messages (only the mailbox folders the app shows)
+        to_fetch = [msg_id for msg_id in added if msg_id not in existing]
+        fetch_format = 'metadata' if metadata_only else 'full'
+        details, unfetched = await self.batch_get_messages(service, to_fetch, format=fetch_format) if to_fetch else ({}, [])
+        rows = []
+        for msg_id in to_fetch:
+            msg_detail = details.get(msg_id)
+            if not msg_detail:
+                continue
+            labels = msg_detail.get('labelIds', [])
+            if 'DRAFT' in labels:
+                folder = 'DRAFTS'
+            elif 'SENT' in labels:
+                folder = 'SENT'
+            elif 'INBOX' in labels:
+                folder = 'INBOX'
+            else:
+                continue
+            try:
+                rows.append({
+                    "user_id": user.id,
+                    "message_id": msg_id,
+                    "thread_id": msg_detail.get('threadId'),
+                    "folder": folder,
+                    "is_processed": False,
+                    **(await run_google_call(self.parse_message, service, msg_detail, metadata_only))
+                })
+            except Exception as e:
+                print(f"Error processing details for {msg_id}: {e}")
+
+        written = await self.upsert_emails(db, rows, update_bodies=not metadata_only)
+        new_email_ids = [email_id for email_id, _, is_processed in written if not is_processed]
+        fetched_count = len(written)
+
+        if unfetched:
+            # Keep the cursor: the next history sync replays this delta and fetches them
+            # again (messages written now are skipped as existing)
+            print(f"DEBUG: {len(unfetched)} added messages could not be fetched. Cursor stays at {user.gmail_history_id}")
+        else:
+            user.gmail_history_id = str(latest_history_id)
+            user.last_synced_at = datetime.utcnow()
+        db.add(user)
+        await db.commit()
+        print(f"DEBUG: History sync done. New: {fetched_count}. Cursor -> {user.gmail_history_id}")
+
+        return fetched_count, new_email_ids
+
+    async def process_emails_background(self, email_ids: list[str], user_id: str) -> list[str]:
         """
         Background task to process emails with AI Agent.
+        Returns the ids left unprocessed because the LLM was rate limited (for a later retry).
         """
+        deferred = []
         if not email_ids:
-            return
+            return deferred
 
         print(f"Background Task: Agent analyzing {len(email_ids)} emails...")
         
         async with SessionLocal() as db:
-            for email_id in email_ids:
-                try:
-                    result = await db.execute(select(Email).filter(Email.id == email_id))
-                    email = result.scalars().first()
-                    
-                    if not email or email.is_processed:
-                        continue
-                        
-                    # Call the AI Agent
-                    # THROTTLE: Sleep 4s to stay under Gemini Free Tier limits (15 RPM)
-                    import time
-                    time.sleep(4) 
-                    
-                    analysis = await agent_service.analyze_email(
-                        email_content=email.body_text or email.snippet or "", 
-                        received_at=email.received_at,
-                        email_id=str(email.id),
-                        db=db,
-                        user_id=user_id,
-                        sender=email.sender
+            result = await db.execute(select(Email).filter(Email.id.in_(email_ids), Email.is_processed == False))
+            emails = {str(e.id): e for e in result.scalars().all()}
+
+            # Cheap local triage: clearly irrelevant mail never reaches the LLM (or the body fetch)
+            if settings.AI_TRIAGE_ENABLED and emails:
+                reputations = await triage_classifier.sender_reputations(db, user_id, [e.sender for e in emails.values() if e.sender])
+                skipped = 0
+                for email_id, email in list(emails.items()):
+                    decision = triage_classifier.classify(
+                        email.subject, email.snippet, email.sender,
+                        (email.label_ids or "").split(","),
+                        reputations.get(normalize_sender(email.sender)),
                     )
-                    
-                    if analysis and analysis.get("status") == "processed":
-                        # Map JSON fields to DB columns
-                        email.is_processed = True
-                        
-                        # Event Info
-                        if analysis.get("event_type"):
-                             email.category = analysis.get("event_type") # exam, deadline, meeting
-                        
-                        payload = analysis.get("calendar_event_payload")
-                        if payload:
-                            email.event_title = payload.get("summary")
-                            
-                            start = payload.get("start", {}).get("dateTime")
-                            if start:
-                                try:
-                                    email.event_date = datetime.fromisoformat(start)
-                                    email.deadline = datetime.fromisoformat(start) # Logic: event date is the deadline
-                                except ValueError:
-                                    pass
-
-                        # Priority/Action logic derived from confidence or type
-                        if analysis.get("action") == "auto_add":
-                             email.priority = "high"
-                             email.action_required = True
-                        elif analysis.get("action") == "needs_confirmation":
-                             email.priority = "medium"
-                             email.action_required = True
-                        else:
-                             email.priority = "low"
-                             email.action_required = False
-
-                        await db.commit()
-                        print(f"Agent Processed {email.id}: Detected {email.category}")
-                    else:
-                        # Mark processed even if nothing found to avoid loops
-                        email.is_processed = True
-                        await db.commit()
-                        
-                except Exception as e:
-                    print(f"Error in Agent background task for email {email_id}: {e}")
+                    if decision.skip:
+                        self._apply_analysis(email, {"status": "ignored", "reason": f"triage:{decision.reason}"})
+                        del emails[email_id]
+                        skipped += 1
+                if skipped:
+                    await db.commit()
+                    print(f"DEBUG: Triage skipped {skipped}/{skipped + len(emails)} emails before the LLM")
+
+            # Metadata-only emails need their bodies before the agent can read them
+            try:
+                unhydrated = [e for e in emails.values() if not e.body_fetched]
+                if unhydrated:
+                    user = await db.get(User, unhydrated[0].user_id)
+                    await self.hydrate_emails(db, user, unhydrated)
+            except Exception as e:
+                print(f"Error hydrating emails for agent: {e}")
+
+            # Bodies live compressed in email_bodies: one query, decompressed once here
+            bodies = await body_store.get_many(db, [e.id for e in emails.values()])
+
+            items = []
+            tokens_before = tokens_after = 0
+            for email_id, email in emails.items():
+                body_text, body_html = bodies.get(email.id, (None, None))
+                content = body_text or email.snippet or ""
+                if settings.AI_PROMPT_COMPACTION:
+                    # Quoted history, signatures, footers and oversized PDF dumps cost tokens, not accuracy
+                    compacted = compact_email(body_text, body_html)
+                    if compacted.text:
+                        print(f"DEBUG: Compacted {email_id}: {compacted.original_tokens} -> {compacted.tokens} tokens ({compacted.tokens_saved} saved)")
+                        content = compacted.text
+                        tokens_before += compacted.original_tokens
+                        tokens_after += compacted.tokens
+                items.append({
+                    "email_id": email_id,
+                    "email_content": content,
+                    "received_at": email.received_at,
+                    "sender": email.sender,
+                })
+            if tokens_before:
+                print(f"DEBUG: Prompt compaction saved {tokens_before - tokens_after}/{tokens_before} tokens over {len(items)} emails")
+
+            # Upcoming events of these senders, for "before the exam" style dates: one query per run
+            sender_events = await SenderEvents.load(db, user_id, items)
+
+        # Several emails per LLM call, up to K calls in flight (each still waits for RPM/TPM quota inside)
+        semaphore = asyncio.Semaphore(agent_service.max_in_flight())
+
+        async def run_batch(batch):
+            async with semaphore:
+                await self._analyze_batch(batch, user_id, deferred, sender_events)
+
+        await asyncio.gather(*(run_batch(batch) for batch in agent_service.batch_emails(items)))
+        return deferred
+
+    async def _analyze_batch(self, batch: list[dict], user_id: str, deferred: list[str], sender_events: SenderEvents = None):
+        """
+        One LLM batch with its own DB session (context lookups + writes), so batches
+        running concurrently never share a session or a transaction.
+        """
+        async with SessionLocal() as db:
+            try:
+                analyses = await agent_service.analyze_batch(batch, db=db, user_id=user_id, sender_events=sender_events)
+            except Exception as e:
+                # Rate limited: leave this batch unprocessed for the next run
+                print(f"Error in Agent background task for batch of {len(batch)}: {e}")
+                deferred.extend(item["email_id"] for item in batch)
+                return
+
+            result = await db.execute(select(Email).filter(Email.id.in_([item["email_id"] for item in batch])))
+            for email in result.scalars().all():
+                analysis = analyses.get(str(email.id))
+                self._apply_analysis(email, analysis)
+                # Only real LLM verdicts feed the triage sender reputation
+                email.llm_analyzed = bool(analysis) and analysis.get("status") in ("processed", "ignored")
+                if analysis and analysis.get("status") == "processed":
+                    print(f"Agent Processed {email.id}: Detected {email.category}")
+                    if sender_events is not None and email.event_date and email.sender:
+                        # Later batches of this run can link to it without a query
+                        sender_events.add(email.sender, email.category, ContextEvent(email.event_date, str(email.id), email.subject))
+            await db.commit()
+
+    def _apply_analysis(self, email: Email, analysis: dict):
+        """
+        Maps the agent's JSON result onto the Email columns.
+        """
+        if analysis and analysis.get("status") == "processed":
+            # Map JSON fields to DB columns
+            email.is_processed = True
+            
+            # Event Info
+            if analysis.get("event_type"):
+                 email.category = analysis.get("event_type").strip().lower() # exam, deadline, meeting
+            
+            payload = analysis.get("calendar_event_payload")
+            if payload:
+                email.event_title = payload.get("summary")
+                
+                start = payload.get("start", {}).get("dateTime")
+                if start:
+                    try:
+                        email.event_date = datetime.fromisoformat(start)
+                        email.deadline = datetime.fromisoformat(start) # Logic: event date is the deadline
+                    except ValueError:
+                        pass
+
+            # Priority/Action logic derived from confidence or type
+            if analysis.get("action") == "auto_add":
+                 email.priority = "high"
+                 email.action_required = True
+            elif analysis.get("action") == "needs_confirmation":
+                 email.priority = "medium"
+                 email.action_required = True
+            else:
+                 email.priority = "low"
+                 email.action_required = False
+        else:
+            # Mark processed even if nothing found to avoid loops
+            email.is_processed = True
 
     async def send_email(self, user: User, to: list[str], subject: str, body: str, cc: list[str] = None, bcc: list[str] = None):
         """
         Sends an email using the Gmail API.
         """
-        service = self.build_service(user)
+        service = await run_google_call(self.build_service, user)
         
         from email.mime.text import MIMEText
         from email.mime.multipart import MIMEMultipart
@@ -359,7 +696,10 @@ class GmailService:
         
         try:
             print(f"Sending email to {to}...")
-            sent_message = service.users().messages().send(userId='me', body={'raw': raw_message}).execute()
+            # Quota only, no retry: a 5xx may still have sent the message
+            with gmail_quota.track(user.id):
+                await gmail_quota.acquire('messages.send')
+            sent_message = await execute_async(service.users().messages().send(userId='me', body={'raw': raw_message}))
             print(f"Email sent! Id: {sent_message['id']}")
             return sent_message
         except Exception as e:
@@ -371,10 +711,13 @@ class GmailService:
         """
         Modifies the labels of a message and syncs to local DB.
         """
-        service = self.build_service(user)
+        service = await run_google_call(self.build_service, user)
         try:
             body = {'addLabelIds': add_labels, 'removeLabelIds': remove_labels}
-            updated_message = service.users().messages().modify(userId='me', id=message_id, body=body).execute()
+            with gmail_quota.track(user.id):
+                updated_message = await gmail_quota.execute(
+                    service.users().messages().modify(userId='me', id=message_id, body=body), 'messages.modify'
+                )
             print(f"DEBUG: Modified message {message_id}: Added {add_labels}, Removed {remove_labels}")
             
             # Sync to local DB
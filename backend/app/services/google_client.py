@@ -0,0 +1,148 @@
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.config import settings
+
+# google-auth / googleapiclient / httplib2 are imported on first use: together they
+# add ~0.25s to startup, and API-only processes that never call Google skip them.
+
+# googleapiclient is synchronous (httplib2). Every blocking call goes through this
+# bounded pool so a long sync never stalls the event loop serving other requests.
+_executor = None
+
+def get_google_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.GOOGLE_API_MAX_WORKERS,
+            thread_name_prefix="google-api"
+        )
+    return _executor
+
+async def run_google_call(fn, *args, **kwargs):
+    """
+    Runs a blocking Google API function on the Google API thread pool.
+    Context variables (e.g. the active Gmail quota report) carry over, as with asyncio.to_thread.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(get_google_executor(), functools.partial(ctx.run, fn, *args, **kwargs))
+
+async def execute_async(request):
+    """
+    Awaitable replacement for googleapiclient's request.execute().
+    """
+    return await run_google_call(request.execute)
+
+
+# httplib2.Http is not thread-safe, so each pool thread keeps its own connection
+# pool. Cached services are shared across threads and borrow it per request.
+_thread_local = threading.local()
+
+def _thread_http():
+    http = getattr(_thread_local, "http", None)
+    if http is None:
+        import httplib2
+        http = httplib2.Http(timeout=60)
+        _thread_local.http = http
+    return http
+
+
+class ThreadAuthorizedHttp:
+    """
+    The `http` of every request of a cached service. Requests are usually built on
+    the event loop thread but executed on a pool thread, so the connection is picked
+    when the request is sent: an AuthorizedHttp around the *sending* thread's Http.
+    """
+    def __init__(self, credentials):
+        self.credentials = credentials
+
+    def _http(self):
+        import google_auth_httplib2
+        return google_auth_httplib2.AuthorizedHttp(self.credentials, http=_thread_http())
+
+    def request(self, *args, **kwargs):
+        return self._http().request(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._http(), name)
+
+
+class GoogleServiceCache:
+    """
+    Per-user cache of googleapiclient service objects with TTL + LRU eviction.
+    Services are built from the bundled (static) discovery documents and reuse
+    keep-alive connections per worker thread.
+    """
+    def __init__(self, max_size: int, ttl_seconds: int):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict() # (user_id, api, version) -> (created_at, access_token, service)
+        self._lock = threading.Lock()
+
+    def _credentials(self, user):
+        from google.oauth2.credentials import Credentials
+        return Credentials(
+            token=user.google_access_token,
+            refresh_token=user.google_refresh_token,
+            token_uri="https://oauth2.googleapis.com/token",
+            client_id=settings.GOOGLE_CLIENT_ID,
+            client_secret=settings.GOOGLE_CLIENT_SECRET,
+        )
+
+    def _build(self, user, api: str, version: str):
+        from googleapiclient.discovery import build
+        from googleapiclient.http import HttpRequest
+
+        creds = self._credentials(user)
+        http = ThreadAuthorizedHttp(creds)
+
+        def request_builder(_http, *args, **kwargs):
+            return HttpRequest(http, *args, **kwargs)
+
+        return build(api, version, credentials=creds, requestBuilder=request_builder, static_discovery=True)
+
+    def get(self, user, api: str, version: str):
+        """
+        Returns a cached service for the user, building one on miss, expiry or token change.
+        Blocking on a miss (discovery parsing): call it through run_google_call.
+        """
+        key = (str(user.id), api, version)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                created_at, access_token, service = entry
+                if access_token == user.google_access_token and now - created_at < self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    return service
+                del self._entries[key]
+
+        service = self._build(user, api, version)
+
+        with self._lock:
+            self._entries[key] = (now, user.google_access_token, service)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return service
+
+    def invalidate(self, user_id):
+        """
+        Drops every cached service for a user (e.g. after tokens were rotated).
+        """
+        user_id = str(user_id)
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == user_id]:
+                del self._entries[key]
+
+
+google_service_cache = GoogleServiceCache(
+    max_size=settings.GOOGLE_SERVICE_CACHE_SIZE,
+    ttl_seconds=settings.GOOGLE_SERVICE_CACHE_TTL,
+)
@@ -0,0 +1,174 @@
+import json
+import random
+import uuid
+from typing import Optional
+from app.core.config import settings
+
+PROCESS_EMAILS_JOB = "process_emails" # payload: {"email_ids": [...], "user_id": "..."}
+
+# Atomic reserve: promote due delayed jobs and jobs whose visibility timeout expired
+# (their worker died) back to ready, then lease the oldest ready job until now + timeout.
+# KEYS: ready, delayed, inflight, attempts. ARGV: visibility timeout, promote batch size.
+_RESERVE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+for _, key in ipairs({KEYS[2], KEYS[3]}) do
+  local due = redis.call('ZRANGEBYSCORE', key, '-inf', now, 'LIMIT', 0, tonumber(ARGV[2]))
+  for _, id in ipairs(due) do
+    redis.call('ZREM', key, id)
+    redis.call('LPUSH', KEYS[1], id)
+  end
+end
+local id = redis.call('RPOP', KEYS[1])
+if not id then return nil end
+redis.call('ZADD', KEYS[3], now + tonumber(ARGV[1]), id)
+local attempts = redis.call('HINCRBY', KEYS[4], id, 1)
+return {id, tostring(attempts)}
+"""
+
+# Extends a lease only if the job is still in flight (it may have been re-delivered)
+_TOUCH_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+if redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+  redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), ARGV[1])
+  return 1
+end
+return 0
+"""
+
+
+def job_backoff(attempt: int) -> float:
+    """
+    Exponential backoff with full jitter for a job's next attempt (1-based).
+    """
+    return random.uniform(0, min(settings.JOB_BACKOFF_MAX_SECONDS, settings.JOB_BACKOFF_BASE_SECONDS * 2 ** (attempt - 1)))
+
+
+class JobQueue:
+    """
+    Durable Redis job queue with at-least-once delivery.
+
+    - ready (list) -> reserve() leases a job into inflight (zset scored by lease deadline)
+    - ack() removes it; a worker that dies without acking loses its lease after
+      visibility_timeout and the job is delivered again
+    - retry() parks it in delayed (zset scored by run time) with backoff, or moves it
+      to the dead-letter list once max_attempts is reached
+
+    Job bodies live in one hash (id -> JSON), attempts in another.
+    """
+    def __init__(self, name: str, visibility_timeout: float, max_attempts: int):
+        self.name = name
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.keys = {part: f"{name}:{part}" for part in ("ready", "delayed", "inflight", "attempts", "jobs", "dead")}
+        self._redis = None
+        self._reserve_script = None
+        self._touch_script = None
+
+    def _client(self):
+        if self._redis is None:
+            import redis.asyncio as redis # Only the API (enqueue) and the workers need it
+            self._redis = redis.from_url(settings.REDIS_URL, decode_responses=True)
+            self._reserve_script = self._redis.register_script(_RESERVE_LUA)
+            self._touch_script = self._redis.register_script(_TOUCH_LUA)
+        return self._redis
+
+    async def enqueue(self, kind: str, payload: dict) -> str:
+        client = self._client()
+        job_id = uuid.uuid4().hex
+        job = {"id": job_id, "kind": kind, "payload": payload}
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.hset(self.keys["jobs"], job_id, json.dumps(job))
+            pipe.lpush(self.keys["ready"], job_id)
+            await pipe.execute()
+        return job_id
+
+    async def reserve(self) -> Optional[dict]:
+        """
+        Leases the next ready job. Returns the job dict (with "attempts") or None.
+        """
+        self._client()
+        leased = await self._reserve_script(
+            keys=[self.keys["ready"], self.keys["delayed"], self.keys["inflight"], self.keys["attempts"]],
+            args=[self.visibility_timeout, 100],
+        )
+        if not leased:
+            return None
+        job_id, attempts = leased
+        data = await self._redis.hget(self.keys["jobs"], job_id)
+        if data is None:
+            # Acked concurrently by a worker whose lease had expired
+            await self._redis.zrem(self.keys["inflight"], job_id)
+            return None
+        job = json.loads(data)
+        job["attempts"] = int(attempts)
+        return job
+
+    async def touch(self, job: dict) -> bool:
+        """
+        Heartbeat: pushes the lease deadline of a long-running job forward.
+        """
+        self._client()
+        return bool(await self._touch_script(keys=[self.keys["inflight"]], args=[job["id"], self.visibility_timeout]))
+
+    async def ack(self, job: dict):
+        client = self._client()
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.zrem(self.keys["inflight"], job["id"])
+            pipe.hdel(self.keys["jobs"], job["id"])
+            pipe.hdel(self.keys["attempts"], job["id"])
+            await pipe.execute()
+
+    async def retry(self, job: dict, error: str, payload: Optional[dict] = None) -> Optional[float]:
+        """
+        Schedules another attempt after a backoff (optionally with a narrowed payload).
+        Returns the delay, or None when the job went to the dead-letter list instead.
+        """
+        client = self._client()
+        job = {"id": job["id"], "kind": job["kind"], "payload": payload or job["payload"], "error": error, "attempts": job["attempts"]}
+        dead = job["attempts"] >= self.max_attempts
+        delay = None if dead else job_backoff(job["attempts"])
+        now = await client.time()
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.zrem(self.keys["inflight"], job["id"])
+            pipe.hset(self.keys["jobs"], job["id"], json.dumps(job))
+            if dead:
+                pipe.lpush(self.keys["dead"], job["id"])
+            else:
+                pipe.zadd(self.keys["delayed"], {job["id"]: now[0] + now[1] / 1_000_000 + delay})
+            await pipe.execute()
+        return delay
+
+    async def requeue_dead(self) -> int:
+        """
+        Moves every dead-lettered job back to ready with a fresh attempt count.
+        """
+        client = self._client()
+        moved = 0
+        while True:
+            job_id = await client.rpop(self.keys["dead"])
+            if job_id is None:
+                return moved
+            async with client.pipeline(transaction=True) as pipe:
+                pipe.hdel(self.keys["attempts"], job_id)
+                pipe.lpush(self.keys["ready"], job_id)
+                await pipe.execute()
+            moved += 1
+
+    async def stats(self) -> dict:
+        client = self._client()
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.llen(self.keys["ready"])
+            pipe.zcard(self.keys["delayed"])
+            pipe.zcard(self.keys["inflight"])
+            pipe.llen(self.keys["dead"])
+            ready, delayed, inflight, dead = await pipe.execute()
+        return {"ready": ready, "delayed": delayed, "inflight": inflight, "dead": dead}
+
+
+ai_job_queue = JobQueue(
+    name=settings.JOB_QUEUE_NAME,
+    visibility_timeout=settings.JOB_VISIBILITY_TIMEOUT_SECONDS,
+    max_attempts=settings.JOB_MAX_ATTEMPTS,
+)
@@ -0,0 +1,121 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# Memory hits buffered before their last_used is written to SQLite
+TOUCH_BATCH = 64
+
+
+class KeyedStore:
+    """
+    Persistent key -> text store shared by the local caches: one SQLite table
+    (WAL, thread-safe behind a lock) with an in-memory LRU in front.
+
+    Entries optionally expire after ttl_seconds; beyond max_entries the least
+    recently used 10% are dropped. Hits served from memory refresh last_used on
+    disk in batches, so the hottest entries are not the first evicted. Tables are
+    rebuildable caches: a store never migrates, a new layout just uses a new table name.
+    """
+    def __init__(self, path: str, table: str, max_entries: int, memory_entries: int, ttl_seconds: Optional[float] = None):
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict() # key -> (created_at, value)
+        self._touched = {} # key -> last memory hit not yet written to last_used
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.misses = 0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _remember(self, key: str, created_at: float, value: str):
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns the stored value, or None (missing or expired).
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                db = self._db()
+                row = db.execute(f"SELECT created_at, value FROM {self.table} WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    db.execute(f"UPDATE {self.table} SET last_used = ? WHERE key = ?", (now, key))
+                    db.commit()
+                    entry = (row[0], row[1])
+                    self._remember(key, *entry)
+            else:
+                self._memory.move_to_end(key)
+                self._touched[key] = now
+                if len(self._touched) >= TOUCH_BATCH:
+                    self._flush_touched(self._db())
+                    self._db().commit()
+
+            if entry is None or self._expired(entry[0], now):
+                if entry is not None:
+                    self._memory.pop(key, None)
+                    self._db().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                    self._db().commit()
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            self._touched.pop(key, None)
+            self._evict(db, now)
+            db.commit()
+            self._remember(key, now, value)
+
+    def _flush_touched(self, db: sqlite3.Connection):
+        if self._touched:
+            db.executemany(f"UPDATE {self.table} SET last_used = ? WHERE key = ?", [(t, k) for k, t in self._touched.items()])
+            self._touched.clear()
+
+    def _evict(self, db: sqlite3.Connection, now: float):
+        if self.ttl_seconds is not None:
+            db.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (now - self.ttl_seconds,))
+        # LRU: drop the least recently used 10% once the store is over capacity
+        count = db.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        overflow = count - self.max_entries + max(1, self.max_entries // 10)
+        self._flush_touched(db)
+        victims = [row[0] for row in db.execute(f"SELECT key FROM {self.table} ORDER BY last_used ASC LIMIT ?", (overflow,))]
+        db.executemany(f"DELETE FROM {self.table} WHERE key = ?", [(key,) for key in victims])
+        for key in victims:
+            self._memory.pop(key, None)
+            self._touched.pop(key, None)
@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LLMResponse:
+    content: str
+
+
+class LLMProvider(ABC):
+    """
+    What the agent needs from an LLM: `await ainvoke(prompt)` returning an object
+    with `.content` (the langchain chat model shape), plus the model name that
+    goes into the analysis cache key.
+    """
+    model_name: str = "unknown"
+
+    @abstractmethod
+    async def ainvoke(self, prompt: str):
+        ...
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+class GeminiProvider(LLMProvider):
+    """
+    Google Gemini through langchain. With record_path set, every answer is appended
+    (JSON lines: prompt hash -> content) so FakeLLMProvider can replay it offline.
+    """
+    def __init__(self, model: str, api_key: str, record_path: Optional[str] = None):
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        self.model_name = model
+        self.record_path = record_path
+        if record_path and os.path.dirname(record_path):
+            os.makedirs(os.path.dirname(record_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self.llm = ChatGoogleGenerativeAI(
+            model=model,
+            google_api_key=api_key,
+            temperature=0.1,
+            convert_system_message_to_human=True
+        )
+
+    async def ainvoke(self, prompt: str):
+        response = await self.llm.ainvoke(prompt)
+        if self.record_path:
+            content = response.content
+            if isinstance(content, list):
+                content = "".join(part["text"] if isinstance(part, dict) and "text" in part else str(part) for part in content)
+            with self._lock, open(self.record_path, "a") as f:
+                f.write(json.dumps({"prompt_sha256": prompt_hash(prompt), "content": content}) + "\n")
+        return response
+
+
+# Synthetic answers: the first event keyword decides the type, the first date-like phrase is date_text
+_EVENT_RE = re.compile(r"\b(exam|quiz|test|deadline|due|submi(t|ssion)|assignment|meeting|interview|viva)\b", re.IGNORECASE)
+_DATE_TEXT_RE = re.compile(
+    r"\b(\d{1,2}(st|nd|rd|th)?\s+(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*(\s+\d{4})?|"
+    r"(next\s+)?(mon|tues|wednes|thurs|fri|satur|sun)day|tomorrow|today|tonight|end of (this|next) month)\b",
+    re.IGNORECASE,
+)
+_EVENT_TYPES = {"exam": "exam", "quiz": "exam", "test": "exam", "viva": "exam", "meeting": "meeting", "interview": "meeting"}
+_BATCH_EMAIL_RE = re.compile(r"=== EMAIL email_id=(\S+) ===\n(.*?)(?=\n=== EMAIL email_id=|\Z)", re.DOTALL)
+_SINGLE_ID_RE = re.compile(r'"email_id": "([^"]+)"')
+
+
+class RateLimitedError(Exception):
+    pass
+
+
+class FakeLLMProvider(LLMProvider):
+    """
+    Deterministic local stand-in for load tests and offline runs.
+
+    Answers from recordings (JSON lines written by GeminiProvider) when the prompt
+    hash is known, otherwise synthesizes the JSON the prompts ask for with a keyword
+    rule. Each call sleeps a log-normal latency (median latency_seconds) and fails
+    with a 429-style error at rate_limit_rate, like the real API.
+    """
+    model_name = "fake"
+
+    def __init__(self, latency_seconds: float = 0.0, rate_limit_rate: float = 0.0,
+                 recordings_path: Optional[str] = None, seed: int = 0):
+        self.latency_seconds = latency_seconds
+        self.rate_limit_rate = rate_limit_rate
+        self._random = random.Random(seed)
+        self.recordings = {}
+        if recordings_path and os.path.exists(recordings_path):
+            with open(recordings_path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.recordings[entry["prompt_sha256"]] = entry["content"]
+        self.calls = 0
+        self.rate_limited = 0
+        self.replayed = 0
+
+    @staticmethod
+    def synthesize(email_id: str, text: str) -> dict:
+        event = _EVENT_RE.search(text)
+        if not event:
+            return {"email_id": email_id, "status": "ignored"}
+        date = _DATE_TEXT_RE.search(text)
+        keyword = event.group(1).lower()
+        return {
+            "email_id": email_id,
+            "status": "processed",
+            "event_type": _EVENT_TYPES.get(keyword, "deadline"),
+            "event_title": keyword.capitalize(),
+            "date_text": date.group(0) if date else "",
+            "confidence": 0.9 if date else 0.5,
+            "action": "auto_add" if date else "needs_confirmation",
+        }
+
+    async def ainvoke(self, prompt: str):
+        self.calls += 1
+        if self.latency_seconds:
+            await asyncio.sleep(self._random.lognormvariate(0, 0.4) * self.latency_seconds)
+        if self._random.random() < self.rate_limit_rate:
+            self.rate_limited += 1
+            raise RateLimitedError("429 RESOURCE_EXHAUSTED: fake quota exceeded")
+
+        recorded = self.recordings.get(prompt_hash(prompt))
+        if recorded is not None:
+            self.replayed += 1
+            return LLMResponse(recorded)
+
+        batch = _BATCH_EMAIL_RE.findall(prompt)
+        if batch:
+            return LLMResponse(json.dumps([self.synthesize(email_id, text) for email_id, text in batch]))
+        email_id = _SINGLE_ID_RE.search(prompt)
+        text = prompt.split("EMAIL CONTENT:", 1)[-1]
+        return LLMResponse(json.dumps(self.synthesize(email_id.group(1) if email_id else "", text)))
+
+
+def build_llm_provider() -> Optional[LLMProvider]:
+    """
+    Provider selected by LLM_PROVIDER ("gemini" or "fake"); None if Gemini cannot start.
+    """
+    if settings.LLM_PROVIDER == "fake":
+        return FakeLLMProvider(
+            latency_seconds=settings.LLM_FAKE_LATENCY_SECONDS,
+            rate_limit_rate=settings.LLM_FAKE_RATE_LIMIT_RATE,
+            recordings_path=settings.LLM_RECORDINGS_PATH,
+        )
+    try:
+        return GeminiProvider(
+            model=settings.LLM_MODEL,
+            api_key=settings.GOOGLE_API_KEY,
+            record_path=settings.LLM_RECORDINGS_PATH if settings.LLM_RECORD else None,
+        )
+    except Exception as e:
+        logger.error(f"Failed to initialize Gemini Agent: {e}")
+        return None
@@ -0,0 +1,129 @@
+import binascii
+import codecs
+import re
+from dataclasses import dataclass, field
+from typing import NamedTuple, Optional
+from app.core.config import settings
+
+_CHARSET_RE = re.compile(r'charset\s*=\s*"?([^";\s]+)', re.IGNORECASE)
+_URLSAFE = bytes.maketrans(b'-_', b'+/')
+# Content-Type header value -> codec name. Only a handful of distinct values occur
+# in practice, so the regex and codec lookup run once per value, not once per part.
+_charsets = {}
+
+
+class AttachmentRef(NamedTuple):
+    attachment_id: str
+    size: Optional[int]
+    filename: str
+    mime_type: str
+
+
+@dataclass
+class MimeContent:
+    text: str = ""
+    html: Optional[str] = None
+    attachments: list[AttachmentRef] = field(default_factory=list)
+    truncated: bool = False
+
+
+def _charset(part: dict) -> str:
+    for header in part.get('headers') or ():
+        if header.get('name', '').lower() == 'content-type':
+            value = header.get('value', '')
+            charset = _charsets.get(value)
+            if charset is None:
+                charset = 'utf-8'
+                match = _CHARSET_RE.search(value)
+                if match:
+                    try:
+                        charset = codecs.lookup(match.group(1)).name
+                    except LookupError:
+                        pass # Unknown charset label: fall back to UTF-8
+                if len(_charsets) >= 256:
+                    _charsets.clear()
+                _charsets[value] = charset
+            return charset
+    return 'utf-8'
+
+
+def _decode(data: str, charset: str, max_bytes: int) -> tuple[str, bool]:
+    """
+    Decodes a base64url body, honouring the part charset. Only the first
+    max_bytes are decoded, so a huge part never gets fully materialised.
+    """
+    max_encoded = (max_bytes // 3) * 4
+    raw = data.encode('ascii')
+    if b'-' in raw or b'_' in raw:
+        raw = raw.translate(_URLSAFE)
+    truncated = len(raw) > max_encoded
+    if truncated:
+        raw = memoryview(raw)[:max_encoded] # No copy of the part
+    elif len(raw) % 4:
+        raw += b'=' * (-len(raw) % 4)
+    return binascii.a2b_base64(raw).decode(charset, errors='replace'), truncated
+
+
+def extract_mime_content(payload: dict, max_chars: int = None, max_depth: int = None) -> MimeContent:
+    """
+    Walks a Gmail message payload once (iteratively, depth-capped) and returns the
+    plain text (all text/plain parts, in order), the first text/html part and the
+    attachments found along the way. Each body is capped at max_chars.
+    """
+    max_chars = max_chars or settings.MIME_MAX_BODY_CHARS
+    max_depth = max_depth or settings.MIME_MAX_DEPTH
+    max_bytes = max_chars * 4 # Worst-case UTF-8 width
+
+    content = MimeContent()
+    text_pieces = []
+    text_len = 0
+    html = None
+    truncated = False
+    stack = [payload]
+    depths = [0]
+
+    while stack:
+        part = stack.pop()
+        depth = depths.pop()
+        children = part.get('parts')
+        if children:
+            if depth >= max_depth:
+                truncated = True
+                continue
+            # Reversed so parts are visited in document order
+            stack.extend(reversed(children))
+            depths.extend([depth + 1] * len(children))
+            continue
+
+        body = part.get('body')
+        if not body:
+            continue
+        if 'attachmentId' in body:
+            content.attachments.append(AttachmentRef(
+                body['attachmentId'], body.get('size'), part.get('filename', ''), part.get('mimeType', '')
+            ))
+            continue
+        data = body.get('data')
+        if not data:
+            continue
+        mime_type = part.get('mimeType')
+        if mime_type == 'text/plain':
+            if text_len < max_chars:
+                decoded, cut = _decode(data, _charset(part), max_bytes)
+                text_pieces.append(decoded)
+                text_len += len(decoded)
+                truncated |= cut
+        elif mime_type == 'text/html' and html is None:
+            html, cut = _decode(data, _charset(part), max_bytes)
+            if len(html) > max_chars:
+                html = html[:max_chars]
+            truncated |= cut
+
+    text = text_pieces[0] if len(text_pieces) == 1 else "".join(text_pieces)
+    if len(text) > max_chars:
+        text = text[:max_chars]
+        truncated = True
+    content.text = text
+    content.html = html
+    content.truncated = truncated
+    return content
@@ -0,0 +1,157 @@
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+from typing import Optional
+from app.core.config import settings
+
+# Workers start from checkout in threads of a multithreaded server: forking that could
+# deadlock the child on another thread's lock and hand it our sockets / DB connections.
+_mp = multiprocessing.get_context("forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+
+def _extract_pdf_text(source, max_pages: int, max_chars: int) -> str:
+    """
+    Runs inside a worker process. source is either the PDF bytes or the path of a
+    spooled temp file (large PDFs are read page by page from disk, not from memory).
+    """
+    from pypdf import PdfReader
+
+    reader = PdfReader(source if isinstance(source, str) else io.BytesIO(source))
+    pieces = []
+    total = 0
+    for index, page in enumerate(reader.pages):
+        if index >= max_pages or total >= max_chars:
+            break
+        text = page.extract_text() or ""
+        pieces.append(text)
+        total += len(text) + 1
+    return "\n".join(pieces)[:max_chars]
+
+
+def _worker_loop(conn):
+    # PDF worker process: one job at a time from the pipe, until the parent closes it
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        try:
+            conn.send((True, _extract_pdf_text(*job)))
+        except Exception as e:
+            conn.send((False, repr(e)))
+
+
+class _PdfWorker:
+    """
+    One PDF worker process, owned by one extraction at a time.
+    """
+    def __init__(self):
+        self.conn, child = _mp.Pipe()
+        self.process = _mp.Process(target=_worker_loop, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+
+    def run(self, job: tuple, timeout: float) -> tuple:
+        """
+        Returns (ok, text or error). Raises TimeoutError if the worker does not
+        answer within timeout, EOFError if it died.
+        """
+        self.conn.send(job)
+        if not self.conn.poll(timeout):
+            raise TimeoutError
+        return self.conn.recv()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class PdfExtractor:
+    """
+    Extracts PDF attachment text in separate worker processes, so a 200-page syllabus
+    cannot stall the API worker. Every document is capped by size, pages, characters
+    and wall-clock time.
+
+    Each extraction checks out a whole worker, so its timeout only counts time the
+    worker spends on that PDF (not time queued behind others), and a stuck worker
+    is killed and replaced without touching extractions running on the other ones.
+    """
+    def __init__(self, max_workers: int):
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._idle = [] # started workers waiting for a job
+        self._lock = threading.Lock()
+
+    def _checkout(self) -> _PdfWorker:
+        self._slots.acquire()
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.process.is_alive():
+                    return worker
+        try:
+            return _PdfWorker()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _checkin(self, worker):
+        if worker is not None:
+            with self._lock:
+                self._idle.append(worker)
+        self._slots.release()
+
+    def extract_text(self, data: bytes) -> Optional[str]:
+        """
+        Returns the text of a PDF: empty string if it is too large or broken (a
+        deterministic answer, safe to cache), None if extraction failed for a
+        transient reason (timeout, dead or unavailable worker) and may succeed later.
+        Blocking: call from the Google API thread pool, not the event loop.
+        """
+        if len(data) > settings.PDF_MAX_BYTES:
+            print(f"DEBUG: Skipping PDF ({len(data)} bytes > PDF_MAX_BYTES)")
+            return ""
+
+        spool_path = None
+        source = data
+        if len(data) > settings.PDF_SPOOL_BYTES:
+            # Hand the worker a file path instead of pickling megabytes through a pipe
+            fd, spool_path = tempfile.mkstemp(suffix=".pdf")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            source = spool_path
+
+        try:
+            worker = self._checkout()
+        except Exception as e:
+            print(f"Error starting PDF worker: {e}")
+            if spool_path:
+                os.unlink(spool_path)
+            return None
+        try:
+            ok, result = worker.run((source, settings.PDF_MAX_PAGES, settings.PDF_MAX_CHARS), settings.PDF_TIMEOUT_SECONDS)
+            if ok:
+                return result
+            print(f"Error parsing PDF attachment: {result}")
+            return ""
+        except TimeoutError:
+            print(f"DEBUG: PDF extraction timed out after {settings.PDF_TIMEOUT_SECONDS}s")
+            # Only this worker is stuck: kill it, the next checkout starts a fresh one
+            worker.kill()
+            worker = None
+            return None
+        except Exception as e:
+            # The worker died (e.g. crashed on a malformed file)
+            print(f"Error parsing PDF attachment: {e}")
+            worker.kill()
+            worker = None
+            return None
+        finally:
+            self._checkin(worker)
+            if spool_path:
+                os.unlink(spool_path)
+
+
+pdf_extractor = PdfExtractor(max_workers=settings.PDF_MAX_WORKERS)
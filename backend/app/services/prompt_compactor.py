@@ -0,0 +1,145 @@
+import html as html_lib
+import re
+from dataclasses import dataclass
+from typing import Optional
+from app.core.config import settings
+
+PDF_MARKER = "[Attachment PDF Content]:"
+
+_HTML_DROP_RE = re.compile(r"<(script|style|head)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+_HTML_BLOCK_RE = re.compile(r"<\s*(br|/p|/div|/tr|/li|/h\d|/table)\b[^>]*>", re.IGNORECASE)
+_HTML_CELL_RE = re.compile(r"<\s*/t[dh]\s*>", re.IGNORECASE)
+_HTML_TAG_RE = re.compile(r"<[^>]+>")
+
+# Start of quoted reply history: everything below is dropped
+_REPLY_HEADER_RE = re.compile(
+    r"^\s*(On .{0,200}wrote:\s*$|-{2,}\s*Original Message\s*-{2,}|_{10,}\s*$|From:\s.+\n\s*Sent:\s)",
+    re.IGNORECASE | re.MULTILINE,
+)
+# Start of the signature: "-- " delimiter and mobile client footers
+_SIGNATURE_RE = re.compile(r"^(--\s*|Sent from my \w+.*|Get Outlook for \w+.*)$", re.IGNORECASE | re.MULTILINE)
+# Paragraphs that are legal / marketing boilerplate
+_FOOTER_RE = re.compile(
+    r"(confidential|disclaimer|intended (solely )?for the (use of the )?(named )?(addressee|recipient)|"
+    r"if you (have )?received this (e-?mail|message) in error|unsubscribe|privacy policy|"
+    r"please consider the environment)",
+    re.IGNORECASE,
+)
+# Sentences worth keeping first when the budget bites
+_DATE_RE = re.compile(
+    r"\b(\d{1,2}[/.-]\d{1,2}([/.-]\d{2,4})?|\d{1,2}(st|nd|rd|th)\b|\d{1,2}[:.]\d{2}|\d{1,2}\s?(am|pm)|"
+    r"jan(uary)?|feb(ruary)?|mar(ch)?|apr(il)?|\d{1,2}\s?may|may\s?\d{1,2}|june?|july?|aug(ust)?|sep(t(ember)?)?|oct(ober)?|nov(ember)?|dec(ember)?|"
+    r"(mon|tues|wednes|thurs|fri|satur|sun)day|today|tonight|tomorrow|next week|weekend|end of|"
+    r"deadline|due|exam|quiz|submi(t|ssion)|meeting|schedule[d]?)\b",
+    re.IGNORECASE,
+)
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9])")
+_SPACES_RE = re.compile(r"[ \t ]+")
+
+
+@dataclass
+class CompactedEmail:
+    text: str
+    original_tokens: int
+    tokens: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.original_tokens - self.tokens
+
+
+def _tokens(text: str) -> int:
+    # Same ~4 characters per token heuristic as the AI rate limiter
+    return len(text) // 4
+
+
+def html_to_text(html: str) -> str:
+    text = _HTML_DROP_RE.sub("", html)
+    text = _HTML_CELL_RE.sub(" | ", text)
+    text = _HTML_BLOCK_RE.sub("\n", text)
+    text = _HTML_TAG_RE.sub("", text)
+    return html_lib.unescape(text)
+
+
+def _cut(text: str, pattern: re.Pattern) -> str:
+    # Only when what stays still mentions a date
+    match = pattern.search(text)
+    if match and _DATE_RE.search(text[:match.start()]):
+        return text[:match.start()]
+    return text
+
+
+def _strip_body(text: str) -> str:
+    """
+    Drops quoted reply history, the signature and boilerplate footer paragraphs.
+    """
+    unquoted = "\n".join(line for line in text.splitlines() if not line.lstrip().startswith(">"))
+    match = _REPLY_HEADER_RE.search(unquoted)
+    fresh = unquoted[:match.start()] if match else unquoted
+    # In an "FYI" forward/reply without dates of its own, the quoted part is the content
+    if _DATE_RE.search(fresh):
+        text = fresh
+    text = _cut(text, _SIGNATURE_RE)
+    paragraphs = re.split(r"\n\s*\n", text)
+    return "\n\n".join(p for p in paragraphs if not _FOOTER_RE.search(p) or _DATE_RE.search(p))
+
+
+def _collapse(text: str) -> str:
+    lines = [_SPACES_RE.sub(" ", line).strip() for line in text.splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def _fit(body: str, pdf: str, budget: int) -> str:
+    """
+    Keeps whole units (body sentences, PDF lines/table rows) within budget tokens:
+    date-bearing body sentences and PDF rows first, then the opening of the body,
+    then the rest in order. Output keeps the original order; gaps are marked [...].
+    """
+    units = [] # (priority, position, section, text)
+    for i, sentence in enumerate(s for line in body.split("\n") for s in _SENTENCE_RE.split(line)):
+        priority = 0 if _DATE_RE.search(sentence) else (1 if i < 3 else 3)
+        units.append((priority, len(units), 0, sentence))
+    for row in pdf.split("\n"):
+        units.append((0 if _DATE_RE.search(row) or row == PDF_MARKER else 2, len(units), 1, row))
+
+    kept = set()
+    used = 0
+    for priority, position, _, unit in sorted(units):
+        cost = _tokens(unit) + 1
+        if unit and used + cost <= budget:
+            kept.add(position)
+            used += cost
+
+    sections = ([], [])
+    for _, position, section, unit in units:
+        pieces = sections[section]
+        if position in kept:
+            pieces.append(unit)
+        elif unit and (not pieces or pieces[-1] != "[...]"):
+            pieces.append("[...]")
+    text = " ".join(sections[0])
+    if sections[1]:
+        text += f"\n\n{PDF_MARKER}\n" + "\n".join(sections[1])
+    return text
+
+
+def compact_email(text: Optional[str], html: Optional[str] = None, max_tokens: int = None) -> CompactedEmail:
+    """
+    Prepares an email body for the LLM: HTML to text (when there is no plain part),
+    quoted history / signature / footers removed, whitespace collapsed, then cut to
+    max_tokens keeping the date-bearing sentences and PDF rows first.
+    """
+    max_tokens = max_tokens or settings.AI_PROMPT_MAX_TOKENS_PER_EMAIL
+    original = text or ""
+    if not original.strip() and html:
+        original = html_to_text(html)
+
+    body, _, pdf = original.partition(PDF_MARKER)
+    # Only the newest message carries the request; PDF text is kept as extracted
+    body = _collapse(_strip_body(body))
+    pdf = _collapse(pdf)
+
+    compacted = body + (f"\n\n{PDF_MARKER}\n{pdf}" if pdf else "")
+    if _tokens(compacted) > max_tokens:
+        compacted = _fit(body, pdf, max_tokens)
+    return CompactedEmail(text=compacted, original_tokens=_tokens(text or html or ""), tokens=_tokens(compacted))
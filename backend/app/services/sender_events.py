@@ -0,0 +1,105 @@
+import bisect
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.models.email import Email
+
+# "before the exam" links to the sender's next exam at most this far after the email
+CONTEXT_WINDOW = timedelta(days=10)
+
+# date_text keyword -> Email.category it refers to
+CONTEXT_KEYWORDS = {"meeting": "meeting", "exam": "exam", "submission": "deadline", "deadline": "deadline"}
+
+
+def context_category(date_text: Optional[str]) -> Optional[str]:
+    text = (date_text or "").lower()
+    return next((category for keyword, category in CONTEXT_KEYWORDS.items() if keyword in text), None)
+
+
+def _utc(value: datetime) -> datetime:
+    # event_date comes back aware from Postgres; received_at may be naive (utcnow fallback)
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+@dataclass(order=True)
+class ContextEvent:
+    event_date: datetime
+    email_id: str = field(compare=False)
+    subject: Optional[str] = field(compare=False)
+
+
+async def next_event_query(db: AsyncSession, user_id: str, sender: str, category: str, received_at: datetime) -> Optional[ContextEvent]:
+    """
+    The sender's next event of this category within CONTEXT_WINDOW of received_at.
+    Served by ix_emails_context_lookup (user_id, sender, category, event_date).
+    """
+    result = await db.execute(
+        select(Email.id, Email.subject, Email.event_date).filter(
+            Email.user_id == user_id,
+            Email.sender == sender,
+            Email.category == category,
+            Email.event_date > received_at,
+            Email.event_date <= received_at + CONTEXT_WINDOW,
+        ).order_by(Email.event_date.asc()).limit(1)
+    )
+    row = result.first()
+    return ContextEvent(_utc(row.event_date), str(row.id), row.subject) if row else None
+
+
+class SenderEvents:
+    """
+    In-memory map (sender, category) -> upcoming events, loaded with one query per
+    process_emails_background run, so the agent's context lookups ("before the
+    exam") skip the database. Events resolved during the run are added as they
+    are written; senders outside the map fall back to next_event_query.
+    """
+    def __init__(self, senders, since: datetime, until: datetime):
+        self.senders = set(senders)
+        self.since = _utc(since)
+        self.until = _utc(until)
+        self._events = defaultdict(list) # (sender, category) -> sorted [ContextEvent]
+
+    @classmethod
+    async def load(cls, db: AsyncSession, user_id: str, items: list[dict]) -> "SenderEvents":
+        """
+        Preloads the events every item of the run could link to: its sender's
+        events between the earliest received_at and the latest one + CONTEXT_WINDOW.
+        """
+        dated = [item for item in items if item.get("sender") and item.get("received_at")]
+        if not dated:
+            return cls((), datetime.min, datetime.min)
+        since = min(_utc(item["received_at"]) for item in dated)
+        until = max(_utc(item["received_at"]) for item in dated) + CONTEXT_WINDOW
+        events = cls({item["sender"] for item in dated}, since, until)
+        result = await db.execute(
+            select(Email.id, Email.subject, Email.sender, Email.category, Email.event_date).filter(
+                Email.user_id == user_id,
+                Email.sender.in_(events.senders),
+                Email.category.in_(set(CONTEXT_KEYWORDS.values())),
+                Email.event_date > since,
+                Email.event_date <= until,
+            )
+        )
+        for row in result.all():
+            events.add(row.sender, row.category, ContextEvent(_utc(row.event_date), str(row.id), row.subject))
+        return events
+
+    def covers(self, sender: str, received_at: datetime) -> bool:
+        return sender in self.senders and self.since <= _utc(received_at) and _utc(received_at) + CONTEXT_WINDOW <= self.until
+
+    def add(self, sender: str, category: str, event: ContextEvent):
+        event.event_date = _utc(event.event_date)
+        events = self._events[(sender, category)]
+        if all(e.email_id != event.email_id for e in events):
+            bisect.insort(events, event)
+
+    def next_event(self, sender: str, category: str, received_at: datetime) -> Optional[ContextEvent]:
+        received_at = _utc(received_at)
+        events = self._events.get((sender, category), [])
+        index = bisect.bisect_right(events, ContextEvent(received_at, "", None))
+        if index < len(events) and events[index].event_date <= received_at + CONTEXT_WINDOW:
+            return events[index]
+        return None
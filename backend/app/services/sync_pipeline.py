@@ -0,0 +1,361 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.user import User
+from app.models.sync_checkpoint import SyncCheckpoint
+from app.services.google_client import run_google_call
+from app.services.gmail_quota import gmail_quota
+
+_DONE = object() # Sentinel passed downstream when a stage finishes
+
+# Last pipeline run per user, served by GET /emails/sync/metrics
+sync_metrics: dict[str, dict] = {}
+
+
+@dataclass
+class StageMetrics:
+    name: str
+    workers: int = 1
+    items: int = 0
+    busy_seconds: float = 0.0
+
+    def record(self, items: int, seconds: float):
+        self.items += items
+        self.busy_seconds += seconds
+
+    def as_dict(self, elapsed: float) -> dict:
+        return {
+            "stage": self.name,
+            "workers": self.workers,
+            "items": self.items,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "items_per_sec": round(self.items / elapsed, 1) if elapsed else 0.0,
+            # Share of the run the stage's workers spent working (1.0 = saturated)
+            "utilization": round(self.busy_seconds / (elapsed * self.workers), 3) if elapsed else 0.0,
+        }
+
+
+class MeteredQueue(asyncio.Queue):
+    """
+    Bounded asyncio.Queue that samples its depth on every get (for backpressure metrics).
+    """
+    def __init__(self, name: str, maxsize: int):
+        super().__init__(maxsize=maxsize)
+        self.name = name
+        self.samples = 0
+        self.depth_total = 0
+        self.max_depth = 0
+
+    async def get(self):
+        depth = self.qsize()
+        self.samples += 1
+        self.depth_total += depth
+        self.max_depth = max(self.max_depth, depth)
+        return await super().get()
+
+    def as_dict(self) -> dict:
+        return {
+            "queue": self.name,
+            "maxsize": self.maxsize,
+            "max_depth": self.max_depth,
+            "avg_depth": round(self.depth_total / self.samples, 2) if self.samples else 0.0,
+        }
+
+
+@dataclass
+class PipelineMetrics:
+    stages: list[StageMetrics]
+    queues: list[MeteredQueue]
+    started_at: datetime = field(default_factory=datetime.utcnow)
+    elapsed_seconds: float = 0.0
+    error: Optional[str] = None # Why the run is incomplete (listing stopped early, messages left unfetched)
+
+    def as_dict(self) -> dict:
+        stages = [s.as_dict(self.elapsed_seconds) for s in self.stages]
+        bottleneck = max(stages, key=lambda s: s["utilization"])["stage"] if stages else None
+        return {
+            "started_at": self.started_at.isoformat(),
+            "elapsed_seconds": round(self.elapsed_seconds, 3),
+            "bottleneck": bottleneck,
+            "stages": stages,
+            "queues": [q.as_dict() for q in self.queues],
+            "error": self.error,
+        }
+
+
+class SyncPipeline:
+    """
+    Staged producer/consumer sync for one folder listing:
+
+        lister -> [fetch_q] -> N detail fetchers -> [parse_q] -> M parsers -> [write_q] -> batching DB writer
+
+    Bounded queues between the stages provide backpressure, so a slow database
+    or parser throttles listing instead of buffering the whole mailbox.
+
+    With a checkpoint, listing starts at its page token and every batch commit also
+    moves it to the next page after the last one whose messages are all written.
+    """
+    def __init__(self, gmail, db: AsyncSession, user: User, service, label_id: str, folder: str, max_results: int, q_filter: str = "", metadata_only: bool = False, checkpoint: Optional[SyncCheckpoint] = None, stop_after_existing: Optional[int] = 15, record_metrics: bool = True, processed_before: Optional[datetime] = None):
+        self.gmail = gmail
+        self.db = db
+        self.user = user
+        self.service = service
+        self.label_id = label_id
+        self.folder = folder
+        self.max_results = max_results
+        self.q_filter = q_filter
+        self.metadata_only = metadata_only
+        self.format = 'metadata' if metadata_only else 'full'
+        self.checkpoint = checkpoint
+        self.stop_after_existing = stop_after_existing # None: walk the whole listing (backfill)
+        self.record_metrics = record_metrics
+        self.processed_before = processed_before # Rows received earlier are stored as processed (historical, no AI)
+
+        self.fetch_workers = max(1, settings.SYNC_FETCH_CONCURRENCY)
+        self.parse_workers = max(1, settings.SYNC_PARSE_CONCURRENCY)
+        self.fetch_q = MeteredQueue("fetch", settings.SYNC_FETCH_QUEUE_SIZE)
+        self.parse_q = MeteredQueue("parse", settings.SYNC_QUEUE_SIZE)
+        self.write_q = MeteredQueue("write", settings.SYNC_QUEUE_SIZE)
+
+        self.list_stage = StageMetrics("list")
+        self.fetch_stage = StageMetrics("fetch", workers=self.fetch_workers)
+        self.parse_stage = StageMetrics("parse", workers=self.parse_workers)
+        self.write_stage = StageMetrics("write")
+        self.metrics = PipelineMetrics(
+            stages=[self.list_stage, self.fetch_stage, self.parse_stage, self.write_stage],
+            queues=[self.fetch_q, self.parse_q, self.write_q],
+        )
+
+        self.existing = {} # message_id -> stored row, for re-fetched messages until written
+        self.scanned = 0 # Listed messages, new or already stored
+        self.pages = [] # Listed pages in order: {"remaining", "next_token", "last_message_id"}
+        self.page_of = {} # message_id -> index in self.pages, until written or dropped
+        self.completed_pages = 0 # Leading pages fully written (checkpoint position)
+        self.fetched_count = 0
+        self.new_email_ids = []
+
+    async def run(self):
+        """
+        Runs all stages to completion. Returns tuple: (fetched_count, list_of_new_email_ids)
+        """
+        start = time.perf_counter()
+        fetchers = [asyncio.create_task(self._fetch_worker()) for _ in range(self.fetch_workers)]
+        parsers = [asyncio.create_task(self._parse_worker()) for _ in range(self.parse_workers)]
+        tasks = [
+            asyncio.create_task(self._lister()),
+            asyncio.create_task(self._close_after(fetchers, self.parse_q, self.parse_workers)),
+            asyncio.create_task(self._close_after(parsers, self.write_q, 1)),
+            asyncio.create_task(self._writer()),
+        ]
+        try:
+            await asyncio.gather(*tasks, *fetchers, *parsers)
+        except Exception:
+            # One stage failed: stop the others instead of leaving them blocked on a full queue
+            for task in (*tasks, *fetchers, *parsers):
+                task.cancel()
+            raise
+        finally:
+            self.metrics.elapsed_seconds = time.perf_counter() - start
+            if self.record_metrics:
+                sync_metrics[str(self.user.id)] = self.metrics.as_dict()
+            print(f"DEBUG: Sync pipeline metrics: {self.metrics.as_dict()}")
+
+        return self.fetched_count, self.new_email_ids
+
+    async def _close_after(self, workers, downstream: asyncio.Queue, consumers: int):
+        # Signal the next stage once every worker of this stage has drained
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for _ in range(consumers):
+                await downstream.put(_DONE)
+
+    async def _lister(self):
+        scheduled_new = 0
+        skipped_count = 0
+        consecutive_existing = 0
+        page_token = self.checkpoint.page_token if self.checkpoint else None
+        chunk_size = max(1, min(settings.GMAIL_BATCH_SIZE, 100))
+
+        try:
+            # Separate session: the writer commits on self.db concurrently
+            async with SessionLocal() as read_db:
+                while scheduled_new < self.max_results:
+                    try:
+                        stage_start = time.perf_counter()
+                        # Calculate how many more to fetch in this batch
+                        batch_size = min(self.max_results - scheduled_new + skipped_count, 100)
+                        if batch_size < 10: batch_size = 10
+
+                        results = await gmail_quota.execute(self.service.users().messages().list(
+                            userId='me',
+                            maxResults=batch_size,
+                            labelIds=[self.label_id],
+                            q=self.q_filter,
+                            pageToken=page_token
+                        ), 'messages.list')
+
+                        messages = results.get('messages', [])
+                        page_token = results.get('nextPageToken')
+                        print(f"DEBUG: Gmail list returned {len(messages)} messages (batch)")
+
+                        if not messages:
+                            break
+
+                        # One IN (...) query for the whole page instead of one SELECT per message
+                        existing = await self.gmail.get_existing_emails(read_db, [msg['id'] for msg in messages])
+                        to_fetch = []
+                        stop_sync = False
+                        for msg in messages:
+                            if scheduled_new >= self.max_results:
+                                break
+
+                            existing_email = existing.get(msg['id'])
+                            # Metadata-only syncs never re-fetch a known message (bodies hydrate on open)
+                            if existing_email and (existing_email.has_html or self.metadata_only):
+                                skipped_count += 1
+
+                                # Optimization: If we hit 15 existing emails in a row, assume we are fully synced.
+                                # This prevents scanning the entire history looking for "new" count.
+                                consecutive_existing += 1
+                                if self.stop_after_existing and consecutive_existing >= self.stop_after_existing:
+                                    print(f"DEBUG: Found {consecutive_existing} existing emails in a row. Stopping sync at {msg['id']}.")
+                                    stop_sync = True
+                                    break
+                                continue
+
+                            # Reset counter if we found a new one
+                            consecutive_existing = 0
+                            to_fetch.append(msg)
+                            if existing_email:
+                                self.existing[msg['id']] = existing_email # Re-fetched, not new
+                            else:
+                                scheduled_new += 1
+
+                        self.scanned += len(messages)
+                        self.pages.append({"remaining": len(to_fetch), "next_token": page_token, "last_message_id": messages[-1]['id']})
+                        for msg in to_fetch:
+                            self.page_of[msg['id']] = len(self.pages) - 1
+                        self.list_stage.record(len(to_fetch), time.perf_counter() - stage_start)
+                        for start in range(0, len(to_fetch), chunk_size):
+                            await self.fetch_q.put(to_fetch[start:start + chunk_size]) # Blocks when fetchers fall behind
+
+                        if stop_sync or not page_token:
+                            break
+                    except Exception as e:
+                        # Rate limits were already retried with backoff; surface what ended the listing
+                        print(f"Error fetching messages: {e}")
+                        self.metrics.error = str(e)
+                        break
+        finally:
+            for _ in range(self.fetch_workers):
+                await self.fetch_q.put(_DONE)
+
+    async def _fetch_worker(self):
+        while True:
+            chunk = await self.fetch_q.get()
+            if chunk is _DONE:
+                return
+            stage_start = time.perf_counter()
+            details, failed = await self.gmail.batch_get_messages(self.service, [msg['id'] for msg in chunk], format=self.format)
+            self.fetch_stage.record(len(details), time.perf_counter() - stage_start)
+            if failed:
+                # Still failing after retries: left unsettled so the checkpoint and the
+                # cursors stay before them and the next sync fetches them again
+                self.metrics.error = f"{len(failed)} messages could not be fetched after retries"
+            failed = set(failed)
+            for msg in chunk:
+                msg_detail = details.get(msg['id'])
+                if msg_detail:
+                    await self.parse_q.put((msg, msg_detail))
+                elif msg['id'] not in failed:
+                    self._settle(msg['id']) # Deleted / invalid (400, 404): nothing to write
+
+    async def _parse_worker(self):
+        while True:
+            item = await self.parse_q.get()
+            if item is _DONE:
+                return
+            msg, msg_detail = item
+            stage_start = time.perf_counter()
+            try:
+                # NO AI PROCESSING HERE - Speed only!
+                parsed = await run_google_call(self.gmail.parse_message, self.service, msg_detail, self.metadata_only)
+            except Exception as e:
+                print(f"Error processing details for {msg['id']}: {e}")
+                self._settle(msg['id'])
+                continue
+            finally:
+                self.parse_stage.record(1, time.perf_counter() - stage_start)
+            await self.write_q.put({
+                "user_id": self.user.id,
+                "message_id": msg['id'],
+                "thread_id": msg['threadId'],
+                "folder": self.folder.upper(),
+                "is_processed": self._historical(parsed.get("received_at")),
+                **parsed
+            })
+
+    def _historical(self, received_at: Optional[datetime]) -> bool:
+        if self.processed_before is None or received_at is None:
+            return False
+        if received_at.tzinfo is None:
+            received_at = received_at.replace(tzinfo=timezone.utc) # utcnow fallback of parse_message
+        return received_at < self.processed_before
+
+    async def _writer(self):
+        rows = []
+        done = False
+        while not done:
+            timed_out = False
+            try:
+                row = await asyncio.wait_for(self.write_q.get(), timeout=settings.SYNC_WRITE_FLUSH_SECONDS)
+                if row is _DONE:
+                    done = True
+                else:
+                    rows.append(row)
+            except asyncio.TimeoutError:
+                timed_out = True # Upstream is slow: flush what we have instead of waiting for a full batch
+
+            if rows and (done or timed_out or len(rows) >= settings.SYNC_WRITE_BATCH_SIZE):
+                await self._flush(rows)
+                rows = []
+
+    async def _flush(self, rows: list[dict]):
+        stage_start = time.perf_counter()
+        # Existing rows only get their content refreshed; unprocessed rows
+        # (new or not yet analyzed) go to the AI queue.
+        written = await self.gmail.upsert_emails(self.db, rows, update_bodies=not self.metadata_only)
+        for email_id, message_id, is_processed in written:
+            if not is_processed:
+                self.new_email_ids.append(email_id)
+            if self.existing.pop(message_id, None) is None:
+                self.fetched_count += 1
+        for row in rows:
+            self._settle(row["message_id"])
+        self._advance_checkpoint()
+        await self.db.commit() # Commit batch (and checkpoint) atomically
+        self.write_stage.record(len(rows), time.perf_counter() - stage_start)
+
+    def _settle(self, message_id: str):
+        # Message written or dropped: one less pending in its page
+        page = self.page_of.pop(message_id, None)
+        if page is not None:
+            self.pages[page]["remaining"] -= 1
+
+    def _advance_checkpoint(self):
+        if self.checkpoint is None:
+            return
+        completed = self.completed_pages
+        while completed < len(self.pages) and self.pages[completed]["remaining"] <= 0:
+            completed += 1
+        if completed > self.completed_pages:
+            self.completed_pages = completed
+            page = self.pages[completed - 1]
+            self.checkpoint.page_token = page["next_token"]
+            self.checkpoint.last_message_id = page["last_message_id"]
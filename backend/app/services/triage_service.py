@@ -0,0 +1,105 @@
+import re
+from dataclasses import dataclass
+from email.utils import parseaddr
+from typing import Optional
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.core.config import settings
+from app.models.email import Email
+
+# Gmail tabs that never carry exams/deadlines worth an LLM call (unless a strong keyword says otherwise)
+SKIP_CATEGORIES = {"CATEGORY_PROMOTIONS", "CATEGORY_SOCIAL"}
+
+# Words that make an email worth analyzing no matter where it came from
+STRONG_RE = re.compile(
+    r"\b(exams?|quiz(zes)?|mid-?sem\w*|mid-?terms?|end-?sem\w*|finals?|viva|tests?|deadlines?|due|"
+    r"submi(t|ssions?|tted)|assignments?|homework|projects?|lab(s| record)?|meetings?|interviews?|"
+    r"seminars?|lectures?|class(es)?|timetable|schedule[ds]?|syllabus|resched\w*|postpone\w*|"
+    r"regist(er|ration)|placements?|campus drive|last date|appointment|invitation)\b",
+    re.IGNORECASE,
+)
+# Date/time hints: keep the email unless it is clearly noise
+WEAK_RE = re.compile(
+    r"\b(today|tonight|tomorrow|next week|(mon|tues|wednes|thurs|fri|satur|sun)day|"
+    r"jan(uary)?|feb(ruary)?|mar(ch)?|apr(il)?|may|june?|july?|aug(ust)?|sep(t(ember)?)?|oct(ober)?|nov(ember)?|dec(ember)?|"
+    r"\d{1,2}(st|nd|rd|th)|\d{1,2}[:.]\d{2}|\d{1,2}\s?(am|pm)|reminder|attached|attachment|pdf)\b",
+    re.IGNORECASE,
+)
+# Marketing / notification boilerplate
+NOISE_RE = re.compile(
+    r"(\bunsubscribe\b|\bnewsletter\b|\d+\s?% off|\bsale\b|\bdiscount|\bdeals?\b|\boffers?\b|\bpromo|\bcoupon|"
+    r"\bcashback\b|\border (has )?(been )?(shipped|confirmed|delivered)|\byour order\b|\breceipt\b|\binvoice\b|"
+    r"\botp\b|verification code|password reset|\bsign-?in\b|security alert|new login|"
+    r"\bliked\b|\bcommented\b|\bfollowed you\b|mentioned you|\bdigest\b|\bweekly roundup\b|\bsubscription\b)",
+    re.IGNORECASE,
+)
+AUTOMATED_SENDER_RE = re.compile(r"(no-?reply|do-?not-?reply|notifications?|newsletter|marketing|mailer|updates?)@", re.IGNORECASE)
+
+
+@dataclass
+class TriageDecision:
+    skip: bool
+    reason: str # Which rule decided: category, sender, noise, automated, keyword, default
+
+
+@dataclass
+class SenderReputation:
+    analyzed: int = 0 # Emails from this sender the LLM already analyzed
+    events: int = 0 # ... of which produced an event
+
+
+def normalize_sender(sender: Optional[str]) -> str:
+    return parseaddr(sender or "")[1].lower()
+
+
+class TriageClassifier:
+    """
+    Cheap local pre-filter in front of the LLM. Decides from Gmail category labels,
+    the sender's track record and keyword/regex rules over subject + snippet.
+    Conservative by design: anything with an exam/deadline/meeting word is analyzed.
+    """
+    def __init__(self, min_sender_history: int):
+        self.min_sender_history = min_sender_history
+
+    def classify(self, subject: str, snippet: str, sender: str, label_ids: list[str], reputation: Optional[SenderReputation] = None) -> TriageDecision:
+        text = f"{subject or ''}\n{snippet or ''}"
+        if STRONG_RE.search(text):
+            return TriageDecision(False, "keyword")
+
+        if SKIP_CATEGORIES.intersection(label_ids):
+            return TriageDecision(True, "category")
+
+        if reputation and reputation.analyzed >= self.min_sender_history and reputation.events == 0:
+            return TriageDecision(True, "sender")
+
+        if NOISE_RE.search(text):
+            return TriageDecision(True, "noise")
+
+        if not WEAK_RE.search(text) and AUTOMATED_SENDER_RE.search(normalize_sender(sender)):
+            return TriageDecision(True, "automated")
+
+        return TriageDecision(False, "default")
+
+    async def sender_reputations(self, db: AsyncSession, user_id: str, senders: list[str]) -> dict:
+        """
+        Returns dict: normalized sender address -> SenderReputation, from the user's
+        LLM-analyzed emails (one GROUP BY query). Triage-skipped and failed rows are
+        left out, so the sender rule never feeds on its own skips.
+        """
+        if not senders:
+            return {}
+        result = await db.execute(
+            select(Email.sender, func.count(Email.id), func.count(Email.event_date))
+            .filter(Email.user_id == user_id, Email.llm_analyzed == True, Email.sender.in_(set(senders)))
+            .group_by(Email.sender)
+        )
+        reputations = {}
+        for sender, analyzed, events in result.all():
+            reputation = reputations.setdefault(normalize_sender(sender), SenderReputation())
+            reputation.analyzed += analyzed
+            reputation.events += events
+        return reputations
+
+
+triage_classifier = TriageClassifier(min_sender_history=settings.AI_TRIAGE_SENDER_MIN_HISTORY)
@@ -0,0 +1,119 @@
+"""
+AI worker process: runs jobs from the durable Redis queue (JOB_QUEUE_BACKEND="redis").
+
+    python -m app.worker [--concurrency N]   # run; start as many processes as needed
+    python -m app.worker --stats             # ready / delayed / inflight / dead counts
+    python -m app.worker --requeue-dead      # move dead-lettered jobs back to ready
+
+With more than one worker process, set AI_RATE_LIMIT_BACKEND="redis" so they share
+the Gemini RPM/TPM quota.
+"""
+import argparse
+import asyncio
+import signal
+from app.core.config import settings
+from app.services.gmail_service import gmail_service
+from app.services.job_queue import ai_job_queue, PROCESS_EMAILS_JOB
+
+
+async def process_emails(payload: dict):
+    """
+    Returns a narrowed payload when some emails were rate limited, None when done.
+    """
+    deferred = await gmail_service.process_emails_background(payload["email_ids"], payload["user_id"])
+    if deferred:
+        return {**payload, "email_ids": deferred}
+    return None
+
+HANDLERS = {
+    PROCESS_EMAILS_JOB: process_emails,
+}
+
+
+async def _heartbeat(job: dict):
+    # Keep the lease alive while the job runs, well inside the visibility timeout
+    while True:
+        await asyncio.sleep(ai_job_queue.visibility_timeout / 3)
+        try:
+            renewed = await ai_job_queue.touch(job)
+        except Exception as e:
+            # Queue briefly unavailable: try again on the next beat
+            print(f"Worker: heartbeat for job {job['id']} failed ({e})")
+            continue
+        if not renewed:
+            print(f"Worker: lost the lease on job {job['id']}, it may run twice")
+            return
+
+
+async def run_job(job: dict):
+    handler = HANDLERS.get(job["kind"])
+    if handler is None:
+        await ai_job_queue.retry({**job, "attempts": ai_job_queue.max_attempts}, f"Unknown job kind {job['kind']}")
+        return
+
+    heartbeat = asyncio.create_task(_heartbeat(job))
+    try:
+        remaining = await handler(job["payload"])
+    except Exception as e:
+        delay = await ai_job_queue.retry(job, repr(e))
+        print(f"Worker: job {job['id']} failed (attempt {job['attempts']}): {e}; " + (f"retry in {delay:.0f}s" if delay is not None else "dead-lettered"))
+        return
+    finally:
+        heartbeat.cancel()
+
+    if remaining:
+        # Rate limited part of the work: retry just that part with backoff
+        delay = await ai_job_queue.retry(job, "rate limited", payload=remaining)
+        print(f"Worker: job {job['id']} rate limited, " + (f"retry in {delay:.0f}s" if delay is not None else "dead-lettered"))
+    else:
+        await ai_job_queue.ack(job)
+
+
+async def worker_loop(stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            job = await ai_job_queue.reserve()
+        except Exception as e:
+            print(f"Worker: queue unavailable ({e})")
+            job = None
+        if job is None:
+            try:
+                await asyncio.wait_for(stop.wait(), settings.WORKER_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        try:
+            await run_job(job)
+        except Exception as e:
+            # retry()/ack() failed (queue unavailable): the unacked job comes back after the visibility timeout
+            print(f"Worker: job {job['id']} could not be settled ({e}), left for redelivery")
+
+
+async def main(concurrency: int):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    print(f"Worker: {concurrency} slots on queue '{ai_job_queue.name}'")
+    # Running jobs finish after a stop signal; a killed worker's jobs come back after the visibility timeout
+    await asyncio.gather(*(worker_loop(stop) for _ in range(concurrency)))
+    print("Worker: stopped")
+
+
+async def admin(args):
+    if args.requeue_dead:
+        print(f"Requeued {await ai_job_queue.requeue_dead()} dead-lettered jobs")
+    print(await ai_job_queue.stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AI job worker")
+    parser.add_argument("--concurrency", type=int, default=settings.WORKER_CONCURRENCY)
+    parser.add_argument("--stats", action="store_true")
+    parser.add_argument("--requeue-dead", action="store_true")
+    args = parser.parse_args()
+    if args.stats or args.requeue_dead:
+        asyncio.run(admin(args))
+    else:
+        asyncio.run(main(args.concurrency))
@@ -0,0 +1,99 @@
+"""
+Benchmark: end-to-end AI processing throughput of process_emails_background with
+1 vs K LLM calls in flight, against the local FakeLLMProvider with realistic latency
+(log-normal, median LATENCY_SECONDS) instead of Gemini.
+
+Creates a throwaway user with NUM_EMAILS unprocessed synthetic emails in the
+configured database, processes them once per concurrency level, then deletes
+everything it created. Rate limiting, the analysis cache and triage are disabled
+so only the executor is measured. The emails carry an absolute date
+(relative phrases like "next friday" cost seconds of dateparser CPU per email).
+
+Usage: python bench_agent_concurrency.py [num_emails] [concurrency ...]
+"""
+import asyncio
+import sys
+import time
+import uuid
+from datetime import datetime
+
+import dateparser
+from sqlalchemy import delete, update
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.email import Email
+from app.models.user import User
+from app.services.agent_service import agent_service
+from app.services.ai_rate_limiter import ai_rate_limiter
+from app.services.gmail_service import GmailService
+from app.services.llm_providers import FakeLLMProvider
+
+NUM_EMAILS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+LEVELS = [int(k) for k in sys.argv[2:]] or [1, 2, 4, 8]
+LATENCY_SECONDS = 1.5
+
+
+class PeakProvider(FakeLLMProvider):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.in_flight = 0
+        self.peak = 0
+
+    async def ainvoke(self, prompt):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            return await super().ainvoke(prompt)
+        finally:
+            self.in_flight -= 1
+
+
+async def run():
+    settings.AI_CACHE_ENABLED = False
+    settings.AI_TRIAGE_ENABLED = False
+    ai_rate_limiter.set_limits(10 ** 9, 10 ** 9)
+    dateparser.parse("14 March 10am") # Warm up dateparser's language data outside the timings
+    gmail = GmailService()
+    run_id = uuid.uuid4().hex[:8]
+
+    async with SessionLocal() as db:
+        user = User(email=f"bench-{run_id}@example.com", full_name="Bench User")
+        db.add(user)
+        await db.commit()
+        emails = [
+            Email(
+                user_id=user.id, message_id=f"{run_id}-{i:06d}", thread_id=f"{run_id}-t{i:06d}", folder="INBOX",
+                is_processed=False, body_fetched=True, subject=f"Exam notice {i}", sender=f"prof{i % 20}@example.edu",
+                snippet=f"The exam for course {i} is on 14 March at 10am.", received_at=datetime.utcnow(), label_ids="INBOX",
+            )
+            for i in range(NUM_EMAILS)
+        ]
+        db.add_all(emails)
+        await db.commit()
+        email_ids = [str(e.id) for e in emails]
+
+    print(f"{NUM_EMAILS} emails, batches of {settings.AI_BATCH_MAX_EMAILS}, fake LLM median latency {LATENCY_SECONDS}s")
+    print("=" * 60)
+    baseline = None
+    try:
+        for k in LEVELS:
+            async with SessionLocal() as db:
+                await db.execute(update(Email).where(Email.user_id == user.id).values(is_processed=False, llm_analyzed=False, event_date=None))
+                await db.commit()
+            settings.AI_CONCURRENCY = k
+            agent_service.llm = PeakProvider(latency_seconds=LATENCY_SECONDS, seed=k)
+            start = time.perf_counter()
+            await gmail.process_emails_background(email_ids, str(user.id))
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"K={k:<3d} {elapsed:7.2f}s  {NUM_EMAILS / elapsed:7.1f} emails/s  peak in flight {agent_service.llm.peak}  speedup x{baseline / elapsed:.1f}")
+    finally:
+        async with SessionLocal() as db:
+            await db.execute(delete(Email).where(Email.user_id == user.id))
+            await db.execute(delete(User).where(User.id == user.id))
+            await db.commit()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,124 @@
+"""
+Benchmark: sequential messages.get vs batched fetch (GmailService.batch_get_messages).
+
+Runs against a local fake Gmail server that adds a fixed round-trip latency
+to every HTTP call, so the numbers reflect round trips rather than parsing.
+
+Usage: python bench_batch_fetch.py [num_messages] [latency_ms]
+"""
+import asyncio
+import json
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httplib2
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+from app.services.gmail_service import GmailService
+
+NUM_MESSAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+LATENCY = (int(sys.argv[2]) if len(sys.argv) > 2 else 40) / 1000.0
+
+
+def fake_message(message_id):
+    return {
+        "id": message_id,
+        "threadId": message_id,
+        "labelIds": ["INBOX"],
+        "snippet": "Exam schedule for next week",
+        "payload": {
+            "mimeType": "text/plain",
+            "headers": [
+                {"name": "Subject", "value": f"Message {message_id}"},
+                {"name": "From", "value": "prof@example.com"},
+                {"name": "Date", "value": "Thu, 29 Jan 2026 10:00:00 +0000"},
+            ],
+            "body": {"data": "SGVsbG8gd29ybGQ="},
+        },
+    }
+
+
+class FakeGmailHandler(BaseHTTPRequestHandler):
+    GET_RE = re.compile(r"/gmail/v1/users/me/messages/([^/?]+)")
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        time.sleep(LATENCY)
+        match = self.GET_RE.match(self.path)
+        if not match:
+            return self._send(404, "application/json", b"{}")
+        self._send(200, "application/json", json.dumps(fake_message(match.group(1))).encode())
+
+    def do_POST(self):
+        # Gmail batch endpoint: multipart/mixed in, multipart/mixed out
+        time.sleep(LATENCY)
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length).decode()
+        boundary_in = self.headers.get_content_type() and self.headers.get_param("boundary")
+        boundary_out = uuid.uuid4().hex
+        parts = []
+        for part in body.split(f"--{boundary_in}"):
+            content_id = re.search(r"Content-ID: <([^>]+)>", part)
+            match = self.GET_RE.search(part)
+            if not content_id or not match:
+                continue
+            payload = json.dumps(fake_message(match.group(1)))
+            parts.append(
+                f"--{boundary_out}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id.group(1)}>\r\n\r\n"
+                f"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(payload)}\r\n\r\n{payload}\r\n"
+            )
+        out = ("".join(parts) + f"--{boundary_out}--\r\n").encode()
+        self._send(200, f"multipart/mixed; boundary={boundary_out}", out)
+
+
+def build_fake_service(base_url):
+    doc = json.loads(get_static_doc("gmail", "v1"))
+    doc["rootUrl"] = base_url + "/"
+    return build_from_document(doc, http=httplib2.Http())
+
+
+def run():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGmailHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    ids = [f"msg{i:06d}" for i in range(NUM_MESSAGES)]
+    gmail = GmailService()
+
+    print(f"Fake Gmail at {base_url}: {NUM_MESSAGES} messages, {LATENCY * 1000:.0f}ms per round trip")
+    print("=" * 60)
+
+    service = build_fake_service(base_url)
+    start = time.perf_counter()
+    for message_id in ids:
+        service.users().messages().get(userId="me", id=message_id, format="full").execute()
+    sequential = time.perf_counter() - start
+    print(f"Sequential get: {sequential:7.2f}s  ({NUM_MESSAGES / sequential:8.1f} msg/s)")
+
+    service = build_fake_service(base_url)
+    start = time.perf_counter()
+    results, failed = asyncio.run(gmail.batch_get_messages(service, ids, format="full"))
+    batched = time.perf_counter() - start
+    assert len(results) == NUM_MESSAGES and not failed, f"batch returned {len(results)} of {NUM_MESSAGES}"
+    print(f"Batched get:    {batched:7.2f}s  ({NUM_MESSAGES / batched:8.1f} msg/s)")
+    print(f"Speedup: {sequential / batched:.1f}x")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,116 @@
+"""
+Benchmark: per-row existence check + flush vs set-based IN (...) + bulk upsert
+when syncing a synthetic mailbox into the configured Postgres database.
+
+Creates a throwaway user, writes NUM_MESSAGES synthetic emails in pages of 100
+with each strategy, then deletes everything it created.
+
+Usage: python bench_bulk_upsert.py [num_messages]
+"""
+import asyncio
+import sys
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import delete, select
+
+from app.core.database import SessionLocal
+from app.models.email import Email, EmailBody
+from app.models.user import User
+from app.services.body_store import compress_body
+from app.services.gmail_service import GmailService
+
+NUM_MESSAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+PAGE_SIZE = 100
+
+
+def synthetic_rows(user_id, prefix):
+    for i in range(NUM_MESSAGES):
+        yield {
+            "user_id": user_id,
+            "message_id": f"{prefix}-{i:07d}",
+            "thread_id": f"{prefix}-t{i // 3:07d}",
+            "folder": "INBOX",
+            "is_processed": False,
+            "subject": f"Synthetic message {i}",
+            "sender": f"sender{i % 50}@example.com",
+            "recipient": "me@example.com",
+            "body_text": "Reminder: the assignment is due next Friday. " * 20,
+            "body_html": "<p>Reminder: the assignment is due next Friday.</p>" * 20,
+            "snippet": "Reminder: the assignment is due next Friday.",
+            "received_at": datetime.utcnow(),
+            "label_ids": "INBOX,UNREAD",
+        }
+
+
+def pages(rows):
+    page = []
+    for row in rows:
+        page.append(row)
+        if len(page) == PAGE_SIZE:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+async def per_row(db, user_id, prefix):
+    # Legacy path: SELECT + add + flush for every message
+    for page in pages(synthetic_rows(user_id, prefix)):
+        for row in page:
+            result = await db.execute(select(Email).filter(Email.message_id == row["message_id"]))
+            if result.scalars().first():
+                continue
+            body_text, body_html = row.pop("body_text"), row.pop("body_html")
+            email = Email(**row)
+            db.add(email)
+            await db.flush()
+            db.add(EmailBody(email_id=email.id, body_text=compress_body(body_text), body_html=compress_body(body_html)))
+            await db.flush()
+        await db.commit()
+
+
+async def set_based(db, user_id, prefix, gmail):
+    # New path: one IN (...) query + one bulk upsert per page
+    for page in pages(synthetic_rows(user_id, prefix)):
+        existing = await gmail.get_existing_emails(db, [row["message_id"] for row in page])
+        rows = [row for row in page if row["message_id"] not in existing]
+        await gmail.upsert_emails(db, rows)
+        await db.commit()
+
+
+async def run():
+    gmail = GmailService()
+    run_id = uuid.uuid4().hex[:8]
+    print(f"Syncing a {NUM_MESSAGES}-message synthetic mailbox (pages of {PAGE_SIZE})")
+    print("=" * 60)
+
+    async with SessionLocal() as db:
+        user = User(email=f"bench-{run_id}@example.com", full_name="Bench User")
+        db.add(user)
+        await db.commit()
+
+        try:
+            for label, fn in (
+                ("Per-row    ", lambda prefix: per_row(db, user.id, prefix)),
+                ("Set-based  ", lambda prefix: set_based(db, user.id, prefix, gmail)),
+            ):
+                prefix = f"{run_id}-{label.strip()}"
+                start = time.perf_counter()
+                await fn(prefix)
+                first = time.perf_counter() - start
+
+                # Re-sync: every message already exists
+                start = time.perf_counter()
+                await fn(prefix)
+                resync = time.perf_counter() - start
+                print(f"{label} first sync {first:7.2f}s ({NUM_MESSAGES / first:8.0f} msg/s) | re-sync {resync:6.2f}s")
+        finally:
+            await db.execute(delete(Email).where(Email.user_id == user.id))
+            await db.execute(delete(User).where(User.id == user.id))
+            await db.commit()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
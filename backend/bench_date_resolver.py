@@ -0,0 +1,110 @@
+"""
+Benchmark: date resolution of the agent. The original loop (dateparser for
+every prefix / fallback) vs app.services.date_resolver (regex fast path +
+memoized dateparser), over date texts from the test_all_cases.py and
+test_date_resolution.py corpora, resolved against a week of received_at bases.
+
+Reports agreement between the two (every mismatch is printed), the fast-path
+share, cold throughput and the test_all_cases expectations. A second pass
+resolves a stream of distinct emails (date_text phrases at random received_at
+timestamps over a month, as in production) and reports the memo hit rate.
+
+Usage: python bench_date_resolver.py [emails]
+"""
+import random
+import sys
+import time
+from datetime import timedelta, timezone
+
+from app.services.date_resolver import dateparser_memo, dateparser_resolve, fast_resolve, normalize_date_text, resolve_date
+from test_all_cases import MOCK_NOW, TEST_CASES
+
+EMAILS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+# test_all_cases.py: full sentences, plus the date_text the LLM extracts from them
+CORPUS = [text for text, _ in TEST_CASES] + [
+    "by Friday", "tomorrow at 10am", "on Jan 30th", "before end of this month", "end of next month",
+    "until end of weekend", "next week Saturday", "next Saturday", "Saturday",
+    # test_date_resolution.py
+    "next Friday at 2:00 PM",
+    # Other shapes seen in date_text
+    "due 14 March 10am", "2026-02-03", "2026-02-03 14:00", "03/02/2026", "31/1/2026", "February 3rd, 2027",
+    "3rd of february", "this weekend", "today 5pm", "Monday, 9:30 am", "tonight", "in 2 days", "friday at 10",
+]
+BASES = [MOCK_NOW + timedelta(days=d, hours=h) for d in range(7) for h in (0, 13)] + [MOCK_NOW.replace(tzinfo=timezone.utc)]
+
+
+def legacy(text, base):
+    # The original, unmemoized loop
+    return dateparser_resolve(normalize_date_text(text), base)
+
+
+def timed(fn, pairs, rounds=1):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text, base in pairs:
+            fn(text, base)
+    return rounds * len(pairs) / (time.perf_counter() - start)
+
+
+def run():
+    pairs = [(text, base) for base in BASES for text in CORPUS]
+    legacy(CORPUS[0], BASES[0]) # Load dateparser's language data outside the timings
+    print(f"{len(CORPUS)} date texts x {len(BASES)} received_at bases = {len(pairs)} resolutions")
+    print("=" * 72)
+
+    mismatches = 0
+    for text, base in pairs:
+        expected, actual = legacy(text, base), resolve_date(text, base)
+        if expected != actual:
+            mismatches += 1
+            print(f"MISMATCH {text!r} @ {base}: legacy {expected} / new {actual}")
+    fast = sum(1 for text, base in pairs if fast_resolve(normalize_date_text(text), base) is not None)
+
+    # Extracted date_text phrases (what the LLM returns) vs whole sentences
+    phrases = [(text, base) for text, base in pairs if text not in dict(TEST_CASES)]
+    legacy_rate = timed(legacy, pairs)
+    legacy_phrase_rate = timed(legacy, phrases)
+    dateparser_memo.clear()
+    cold_phrase_rate = timed(resolve_date, phrases)
+    dateparser_memo.clear()
+    cold_rate = timed(resolve_date, pairs)
+
+    # Distinct emails: every received_at is its own second, only texts and days repeat
+    rng = random.Random(0)
+    texts = list(dict.fromkeys(text for text, _ in phrases))
+    emails = [(rng.choice(texts), MOCK_NOW + timedelta(seconds=rng.randrange(30 * 86400))) for _ in range(EMAILS)]
+    for text, base in emails:
+        expected = legacy(text, base)
+        dateparser_memo.clear()
+        if resolve_date(text, base) != expected:
+            mismatches += 1
+            print(f"MISMATCH {text!r} @ {base}: legacy {expected} / new {resolve_date(text, base)}")
+    legacy_stream_rate = timed(legacy, emails)
+    dateparser_memo.clear()
+    stream_rate = timed(resolve_date, emails)
+    memo_hits, slow_path = dateparser_memo.hits, dateparser_memo.hits + dateparser_memo.misses
+    # Replay the stream with a warm memo: answers must not depend on what was cached first
+    for text, base in emails:
+        expected = legacy(text, base)
+        if resolve_date(text, base) != expected:
+            mismatches += 1
+            print(f"MISMATCH (memo) {text!r} @ {base}: legacy {expected} / new {resolve_date(text, base)}")
+
+    passed = {"legacy": 0, "new": 0}
+    for text, expected in TEST_CASES:
+        for name, fn in (("legacy", legacy), ("new", resolve_date)):
+            resolved = fn(text, MOCK_NOW)
+            passed[name] += bool(resolved and resolved.date().isoformat() == expected)
+
+    print(f"Agreement        : {len(pairs) + 2 * len(emails) - mismatches}/{len(pairs) + 2 * len(emails)}")
+    print(f"Fast path        : {fast / len(pairs):.0%} of resolutions")
+    print(f"Legacy loop      : {legacy_rate:10,.0f} resolutions/s  (date_text phrases only: {legacy_phrase_rate:,.0f}/s)")
+    print(f"Resolver (cold)  : {cold_rate:10,.0f} resolutions/s  (date_text phrases only: {cold_phrase_rate:,.0f}/s, x{cold_phrase_rate / legacy_phrase_rate:.0f})")
+    print(f"Distinct emails  : {stream_rate:10,.0f} resolutions/s  (legacy {legacy_stream_rate:,.0f}/s, x{stream_rate / legacy_stream_rate:.0f}) over {len(emails)} emails")
+    print(f"Memo hit rate    : {memo_hits / max(1, slow_path):.0%} of {slow_path} slow-path resolutions (on distinct emails)")
+    print(f"test_all_cases   : legacy {passed['legacy']}/{len(TEST_CASES)}, new {passed['new']}/{len(TEST_CASES)}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,175 @@
+"""
+Latency check: /health and GET /emails/ must stay responsive while a large
+sync is in flight.
+
+The Gmail client is replaced by a fake whose calls block like googleapiclient's
+.execute() (time.sleep per HTTP call). The sync runs twice:
+  - inline:   Google calls run on the event loop (previous behaviour)
+  - executor: Google calls go through app.services.google_client
+Writes to the configured database with a throwaway user and cleans up after.
+
+Usage: python bench_event_loop_latency.py [num_messages] [latency_ms]
+"""
+import asyncio
+import base64
+import statistics
+import sys
+import time
+import uuid
+
+import httpx
+from sqlalchemy import delete
+
+import app.services.gmail_quota as quota_module
+import app.services.gmail_service as gmail_module
+import app.services.sync_pipeline as pipeline_module
+from app.core.database import SessionLocal
+from app.main import app
+from app.models.email import Email
+from app.models.user import User
+from app.services.gmail_service import gmail_service
+
+NUM_MESSAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+LATENCY = (int(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000.0
+
+
+class BlockingRequest:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self, *args, **kwargs):
+        time.sleep(LATENCY) # Simulated HTTPS round trip, blocks the calling thread
+        return self.result() if callable(self.result) else self.result
+
+
+class BlockingGmail:
+    """Just enough of the Gmail resource tree for GmailService.fetch_emails."""
+
+    def __init__(self, run_id):
+        self.ids = [f"{run_id}-{i:06d}" for i in range(NUM_MESSAGES)]
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def getProfile(self, userId):
+        return BlockingRequest({"historyId": "1"})
+
+    def list(self, userId, maxResults=100, labelIds=None, q="", pageToken=None):
+        start = int(pageToken or 0)
+        page = self.ids[start:start + maxResults]
+        next_token = str(start + maxResults) if start + maxResults < len(self.ids) else None
+        body = {"messages": [{"id": i, "threadId": i} for i in page]}
+        if next_token:
+            body["nextPageToken"] = next_token
+        return BlockingRequest(body)
+
+    def get(self, userId, id, format="full"):
+        text = base64.urlsafe_b64encode(b"Quiz on Friday. " * 50).decode()
+        return BlockingRequest({
+            "id": id, "threadId": id, "labelIds": ["INBOX"], "snippet": "Quiz on Friday",
+            "payload": {
+                "mimeType": "text/plain",
+                "headers": [{"name": "Subject", "value": id}, {"name": "From", "value": "prof@example.com"}],
+                "body": {"data": text},
+            },
+        })
+
+    def new_batch_http_request(self, callback):
+        class Batch:
+            def __init__(self):
+                self.requests = []
+
+            def add(self, request, request_id=None):
+                self.requests.append((request_id, request))
+
+            def execute(self):
+                time.sleep(LATENCY)
+                for request_id, request in self.requests:
+                    callback(request_id, request.result, None)
+
+        return Batch()
+
+
+async def inline_call(fn, *args, **kwargs):
+    return fn(*args, **kwargs)
+
+
+async def inline_execute(request):
+    return request.execute()
+
+
+async def probe(client, path, samples, stop):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get(path)
+        samples.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.01)
+
+
+def summary(samples):
+    if not samples:
+        return "no samples"
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return f"n={len(samples):4d} p50={statistics.median(samples):8.1f}ms p99={p99:8.1f}ms max={samples[-1]:8.1f}ms"
+
+
+async def run_mode(label, user_id):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        health, listing = [], []
+        stop = asyncio.Event()
+        probes = [
+            asyncio.create_task(probe(client, "/health", health, stop)),
+            asyncio.create_task(probe(client, f"/api/v1/emails/?user_id={user_id}", listing, stop)),
+        ]
+        async with SessionLocal() as db:
+            user = await db.get(User, user_id)
+            start = time.perf_counter()
+            count, _ = await gmail_service.fetch_emails(db, user, max_results=NUM_MESSAGES)
+            elapsed = time.perf_counter() - start
+        stop.set()
+        await asyncio.gather(*probes)
+
+    print(f"[{label}] synced {count} messages in {elapsed:.2f}s")
+    print(f"  /health      {summary(health)}")
+    print(f"  GET /emails/ {summary(listing)}")
+
+
+async def run():
+    run_id = uuid.uuid4().hex[:8]
+    async with SessionLocal() as db:
+        user = User(email=f"bench-{run_id}@example.com", full_name="Bench User")
+        db.add(user)
+        await db.commit()
+        user_id = user.id
+
+    print(f"Sync of {NUM_MESSAGES} messages, {LATENCY * 1000:.0f}ms per Google API call")
+    print("=" * 60)
+    real_call, real_execute = gmail_module.run_google_call, gmail_module.execute_async
+    real_build_service = gmail_service.build_service
+    try:
+        for label, call, execute in (
+            ("inline", inline_call, inline_execute),
+            ("executor", real_call, real_execute),
+        ):
+            for module in (gmail_module, pipeline_module, quota_module):
+                module.run_google_call, module.execute_async = call, execute
+            fake = BlockingGmail(f"{run_id}-{label}")
+            gmail_service.build_service = lambda user, fake=fake: fake
+            await run_mode(label, user_id)
+    finally:
+        for module in (gmail_module, pipeline_module, quota_module):
+            module.run_google_call, module.execute_async = real_call, real_execute
+        gmail_service.build_service = real_build_service
+        async with SessionLocal() as db:
+            await db.execute(delete(Email).where(Email.user_id == user_id))
+            await db.execute(delete(User).where(User.id == user_id))
+            await db.commit()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,135 @@
+"""
+Load test: pushes N synthetic emails through process_emails_background with the
+local FakeLLMProvider (configurable latency and 429 rate) instead of Gemini, and
+reports throughput plus p50/p99 of per-email completion time and LLM call latency.
+
+Creates a throwaway user in the configured database and deletes everything it
+created afterwards. The analysis cache and triage are disabled so every email
+reaches the (fake) LLM; the AI rate limiter is wide open unless --rpm is given.
+
+Usage: python bench_llm_pipeline.py [--emails 2000] [--latency 1.5] [--rate-limit 0.0]
+                                    [--concurrency K] [--rpm N] [--recordings path]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import datetime
+
+import dateparser
+from sqlalchemy import delete, select
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.email import Email
+from app.models.user import User
+from app.services.agent_service import agent_service
+from app.services.ai_rate_limiter import ai_rate_limiter
+from app.services.gmail_service import gmail_service
+from app.services.llm_providers import FakeLLMProvider
+
+TEMPLATES = [
+    "The mid-semester exam for course {i} is on 14 March at 10am in Hall B.",
+    "Reminder: assignment {i} is due tomorrow before midnight.",
+    "Project meeting {i} moved to Friday 4pm, same room.",
+    "Campus newsletter {i}: sports day highlights and the new cafeteria menu.",
+    "Lab record {i} submission deadline is 21 March 2025.",
+]
+
+
+def percentiles(values: list) -> str:
+    if len(values) < 2:
+        return "n/a"
+    q = statistics.quantiles(values, n=100)
+    return f"p50 {q[49]:6.2f}s  p99 {q[98]:6.2f}s"
+
+
+class TimedProvider(FakeLLMProvider):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+
+    async def ainvoke(self, prompt):
+        start = time.perf_counter()
+        try:
+            return await super().ainvoke(prompt)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+
+async def run(args):
+    dateparser.parse("14 March") # Warm up dateparser's language data outside the timings
+    settings.AI_CACHE_ENABLED = False
+    settings.AI_TRIAGE_ENABLED = False
+    settings.AI_CONCURRENCY = args.concurrency
+    ai_rate_limiter.set_limits(args.rpm or 10 ** 9, 10 ** 9)
+    provider = TimedProvider(latency_seconds=args.latency, rate_limit_rate=args.rate_limit, recordings_path=args.recordings)
+    agent_service.llm = provider
+
+    # Completion time of every email: stamped when its batch commits
+    done_at = {}
+    analyze_batch = gmail_service._analyze_batch
+
+    async def timed_analyze_batch(batch, user_id, deferred, sender_events=None):
+        await analyze_batch(batch, user_id, deferred, sender_events)
+        now = time.perf_counter()
+        for item in batch:
+            done_at.setdefault(item["email_id"], now)
+
+    gmail_service._analyze_batch = timed_analyze_batch
+    run_id = uuid.uuid4().hex[:8]
+
+    async with SessionLocal() as db:
+        user = User(email=f"bench-{run_id}@example.com", full_name="Bench User")
+        db.add(user)
+        await db.commit()
+        emails = [
+            Email(
+                user_id=user.id, message_id=f"{run_id}-{i:07d}", thread_id=f"{run_id}-t{i:07d}", folder="INBOX",
+                is_processed=False, body_fetched=True, subject=f"Notice {i}", sender=f"sender{i % 50}@example.edu",
+                snippet=TEMPLATES[i % len(TEMPLATES)].format(i=i), received_at=datetime(2025, 3, 1, 9, 0), label_ids="INBOX",
+            )
+            for i in range(args.emails)
+        ]
+        db.add_all(emails)
+        await db.commit()
+        email_ids = [str(e.id) for e in emails]
+
+    print(
+        f"{args.emails} emails | fake LLM median {args.latency}s, 429 rate {args.rate_limit:.0%} | "
+        f"K={agent_service.max_in_flight()} | batches of {settings.AI_BATCH_MAX_EMAILS}"
+    )
+    print("=" * 72)
+    try:
+        start = time.perf_counter()
+        deferred = await gmail_service.process_emails_background(email_ids, str(user.id))
+        elapsed = time.perf_counter() - start
+
+        async with SessionLocal() as db:
+            processed = (await db.execute(
+                select(Email.id).filter(Email.user_id == user.id, Email.is_processed == True)
+            )).scalars().all()
+        completion = [done_at[email_id] - start for email_id in email_ids if email_id in done_at]
+
+        print(f"Wall time        : {elapsed:8.2f}s")
+        print(f"Throughput       : {len(processed) / elapsed:8.1f} emails/s ({len(processed)} processed, {len(deferred)} deferred on 429)")
+        print(f"Email completion : {percentiles(completion)}")
+        print(f"LLM call latency : {percentiles(provider.latencies)}  ({provider.calls} calls, {provider.rate_limited} rate limited, {provider.replayed} replayed)")
+    finally:
+        gmail_service._analyze_batch = analyze_batch
+        async with SessionLocal() as db:
+            await db.execute(delete(Email).where(Email.user_id == user.id))
+            await db.execute(delete(User).where(User.id == user.id))
+            await db.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--emails", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=1.5)
+    parser.add_argument("--rate-limit", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rpm", type=int, default=0)
+    parser.add_argument("--recordings", default=None)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,83 @@
+"""
+Benchmark: prompt input compaction (app.services.prompt_compactor) over typical
+email shapes. Reports estimated tokens before/after per email, whether the
+date-bearing sentence survived, and compaction throughput.
+
+Usage: python bench_prompt_compaction.py [iterations]
+"""
+import sys
+import time
+
+from app.services.prompt_compactor import PDF_MARKER, compact_email
+
+ITERATIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+FOOTER = (
+    "\n\nCONFIDENTIALITY NOTICE: This email and any attachments are intended solely for the addressee. "
+    "If you have received this message in error, please notify the sender and delete it.\n"
+    "Please consider the environment before printing this email.\n"
+)
+QUOTED = "".join(f"> Earlier message line {i} about the project plan and who owns which slide.\n" for i in range(60))
+TIMETABLE = "\n".join(
+    f"CS{300 + i}   Paper {i}   {'Room ' + str(i)}   Faculty member {i}   Elective   3 credits" for i in range(400)
+) + "\nCS301   Distributed Systems   14 March 2025   10:00 AM   Hall B\n"
+
+# (name, body_text, body_html, sentence that must survive)
+CORPUS = [
+    (
+        "reply-chain",
+        "Hi all,\nThe final review meeting is moved to Thursday 3pm in Lab 2.\n\nThanks,\nRahul\n-- \nRahul M\nTeaching Assistant, CSE\n"
+        "\nOn Mon, 10 Mar 2025 at 09:12, Prof. Rao <rao@university.edu> wrote:\n" + QUOTED + FOOTER,
+        None,
+        "Thursday 3pm",
+    ),
+    (
+        "html-only",
+        None,
+        "<html><head><style>p{color:red}</style></head><body>" + "<div><p>Newsletter filler paragraph.</p></div>" * 80
+        + "<table><tr><td>Assignment 4</td><td>Due 21 March 2025, 11:59 PM</td></tr></table><p>Unsubscribe | Privacy policy</p></body></html>",
+        "Due 21 March 2025",
+    ),
+    (
+        "pdf-dump",
+        "Please find the exam timetable attached." + FOOTER + f"\n\n{PDF_MARKER}\n" + TIMETABLE,
+        None,
+        "14 March 2025",
+    ),
+    (
+        "fyi-forward",
+        "FYI\n\nOn Tue, 11 Mar 2025, Exam Cell <exams@university.edu> wrote:\n> The mid-sem exam is on 18 March at 10am.\n",
+        None,
+        "18 March",
+    ),
+    (
+        "short",
+        "Quiz tomorrow at 9am, bring calculators.",
+        None,
+        "tomorrow at 9am",
+    ),
+]
+
+
+def run():
+    print(f"{'email':14s} {'tokens in':>10s} {'tokens out':>11s} {'saved':>7s}  date kept")
+    print("=" * 60)
+    total_in = total_out = 0
+    for name, text, html, must_keep in CORPUS:
+        result = compact_email(text, html)
+        total_in += result.original_tokens
+        total_out += result.tokens
+        kept = "yes" if must_keep in result.text else "NO"
+        print(f"{name:14s} {result.original_tokens:10d} {result.tokens:11d} {result.tokens_saved:7d}  {kept}")
+
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        for _, text, html, _ in CORPUS:
+            compact_email(text, html)
+    rate = ITERATIONS * len(CORPUS) / (time.perf_counter() - start)
+    print("=" * 60)
+    print(f"Total: {total_in} -> {total_out} tokens ({1 - total_out / total_in:.0%} saved), {rate:,.0f} emails/s")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,84 @@
+"""
+Benchmark: application startup. Each scenario runs in fresh interpreters and
+reports the median wall time, peak RSS and which heavy libraries ended up loaded:
+
+- app.main            importing the API (what uvicorn does before serving)
+- app.main (eager)    the same with the AI / Google / PDF stacks imported up front,
+                      i.e. the cost before they became lazy
+- api-only + schedule API_ONLY=true, import plus scheduling AI work for new emails
+- first AI call       import plus building the LLM provider (pays for langchain)
+
+Exits with status 1 if importing app.main, or scheduling in API-only mode, loads
+any of the heavy libraries, so a stray top-level import shows up as a failure.
+
+Usage: python bench_startup.py [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+HEAVY = ["langchain_google_genai", "dateparser", "googleapiclient.discovery", "google.oauth2.credentials", "httplib2", "pypdf"]
+
+SCHEDULE = """
+import asyncio
+from fastapi import BackgroundTasks
+from app.api.emails import schedule_ai_processing
+tasks = BackgroundTasks()
+asyncio.run(schedule_ai_processing(tasks, ["00000000-0000-0000-0000-000000000000"], "user"))
+assert not tasks.tasks, "API_ONLY scheduled AI work in the API process"
+"""
+
+# (name, code timed after interpreter start, extra env, must stay light)
+SCENARIOS = [
+    ("app.main", "import app.main", {}, True),
+    ("app.main (eager)", "import app.main\n" + "\n".join(f"import {m}" for m in HEAVY), {}, False),
+    ("api-only + schedule", "import app.main\n" + SCHEDULE, {"API_ONLY": "true", "JOB_QUEUE_BACKEND": "redis", "REDIS_URL": "redis://127.0.0.1:1/0"}, True),
+    ("first AI call", "import app.main\nfrom app.services.agent_service import agent_service\nagent_service.llm", {}, False),
+]
+
+CHILD = """
+import contextlib, io, json, resource, sys, time
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    exec(compile(sys.argv[1], "<scenario>", "exec"))
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "seconds": elapsed,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy": [m for m in json.loads(sys.argv[2]) if m in sys.modules],
+}))
+"""
+
+
+def measure(code: str, env: dict) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD, code, json.dumps(HEAVY)],
+        env={**os.environ, **env}, capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run():
+    failed = False
+    print(f"{'scenario':<22} {'median s':>9} {'min s':>7} {'peak RSS MB':>12}  heavy libraries loaded")
+    for name, code, env, light in SCENARIOS:
+        samples = [measure(code, env) for _ in range(RUNS)]
+        seconds = [s["seconds"] for s in samples]
+        heavy = samples[-1]["heavy"]
+        rss = max(s["rss_mb"] for s in samples)
+        print(f"{name:<22} {statistics.median(seconds):9.2f} {min(seconds):7.2f} {rss:12.0f}  {', '.join(heavy) or '-'}")
+        if light and heavy:
+            failed = True
+            print(f"  FAIL: {name} should not load {', '.join(heavy)}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    run()
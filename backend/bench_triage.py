@@ -0,0 +1,63 @@
+"""
+Benchmark: pre-LLM triage classifier against a labeled fixture set.
+
+Each case in fixtures/triage_emails.json carries the subject, snippet, sender,
+Gmail label ids and whether the email holds an event worth analyzing
+("relevant"). Optional "sender_history" is [analyzed, events] for the sender.
+
+Reports the skip rate (LLM calls saved), the false-negative rate (relevant
+emails wrongly skipped), per-rule skip counts and classifier throughput.
+
+Usage: python bench_triage.py [fixture_path]
+"""
+import json
+import sys
+import time
+from collections import Counter
+
+from app.services.triage_service import SenderReputation, triage_classifier
+
+FIXTURE = sys.argv[1] if len(sys.argv) > 1 else "fixtures/triage_emails.json"
+ITERATIONS = 1000
+
+
+def classify(case):
+    history = case.get("sender_history")
+    reputation = SenderReputation(*history) if history else None
+    return triage_classifier.classify(case["subject"], case["snippet"], case["sender"], case["label_ids"], reputation)
+
+
+def run():
+    with open(FIXTURE) as f:
+        cases = json.load(f)
+
+    reasons = Counter()
+    skipped = false_negatives = 0
+    relevant = sum(1 for case in cases if case["relevant"])
+    for case in cases:
+        decision = classify(case)
+        if not decision.skip:
+            continue
+        skipped += 1
+        reasons[decision.reason] += 1
+        if case["relevant"]:
+            false_negatives += 1
+            print(f"FALSE NEGATIVE ({decision.reason}): {case['subject']}")
+
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        for case in cases:
+            classify(case)
+    rate = ITERATIONS * len(cases) / (time.perf_counter() - start)
+
+    print(f"{len(cases)} labeled emails ({relevant} relevant, {len(cases) - relevant} irrelevant)")
+    print("=" * 60)
+    print(f"Skip rate          : {skipped / len(cases):6.1%} ({skipped} LLM calls saved)")
+    print(f"Irrelevant skipped : {(skipped - false_negatives) / max(1, len(cases) - relevant):6.1%}")
+    print(f"False-negative rate: {false_negatives / max(1, relevant):6.1%} ({false_negatives} relevant skipped)")
+    print(f"Skips by rule      : {dict(reasons)}")
+    print(f"Throughput         : {rate:,.0f} emails/s")
+
+
+if __name__ == "__main__":
+    run()
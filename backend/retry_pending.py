@@ -3,6 +3,8 @@ from app.core.database import SessionLocal
 from app.models.user import User
 from app.models.email import Email
 from app.services.gmail_service import GmailService
+from app.services.job_queue import ai_job_queue, PROCESS_EMAILS_JOB
+from app.core.config import settings
 from sqlalchemy import select, desc
 
 async def retry_pending():
@@ -22,7 +24,13 @@ async def retry_pending():
 
         print(f"Found {len(emails)} pending emails. Retrying...")
         ids = [str(e.id) for e in emails]
-        
+
+        if settings.JOB_QUEUE_BACKEND == "redis":
+            # Durable queue: let the workers pick it up (with retries / dead-lettering)
+            job_id = await ai_job_queue.enqueue(PROCESS_EMAILS_JOB, {"email_ids": ids, "user_id": str(user.id)})
+            print(f"Enqueued job {job_id}.")
+            return
+
         # Call background task directly
         await service.process_emails_background(ids, str(user.id))
         print("Retry batch completed.")